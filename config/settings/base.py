@@ -5,6 +5,7 @@ import ssl
 from pathlib import Path
 
 import environ
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
 # rockflint_web/
@@ -68,6 +69,7 @@ DJANGO_APPS = [
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.gis",
+    "django.contrib.postgres",
     "django.contrib.sessions",
     "django.contrib.sites",
     "django.contrib.messages",
@@ -252,6 +254,8 @@ EMAIL_BACKEND = env(
 )
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-timeout
 EMAIL_TIMEOUT = 5
+# Base URL of the customer-facing site, used for links in outgoing email
+FRONTEND_URL = env("FRONTEND_URL", default="http://localhost:3000")
 
 # ADMIN
 # ------------------------------------------------------------------------------
@@ -331,6 +335,50 @@ CELERY_WORKER_SEND_TASK_EVENTS = True
 CELERY_TASK_SEND_SENT_EVENT = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-hijack-root-logger
 CELERY_WORKER_HIJACK_ROOT_LOGGER = False
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-schedule
+CELERY_BEAT_SCHEDULE = {
+    "ads-expire-promotions": {
+        "task": "rockflint_web.ads.tasks.expire_promotions",
+        "schedule": 60.0,
+    },
+    "ads-flush-listing-views": {
+        "task": "rockflint_web.ads.tasks.flush_listing_views",
+        "schedule": 60.0,
+    },
+    "ads-decay-trending-scores": {
+        "task": "rockflint_web.ads.tasks.decay_trending_scores",
+        "schedule": 10 * 60.0,
+    },
+    "ads-refresh-price-rollups": {
+        "task": "rockflint_web.ads.tasks.refresh_price_rollups",
+        "schedule": 15 * 60.0,
+    },
+    "ads-refresh-similar-listings": {
+        "task": "rockflint_web.ads.tasks.refresh_similar_listings",
+        "schedule": 10 * 60.0,
+    },
+    "ads-rebuild-similar-listings": {
+        "task": "rockflint_web.ads.tasks.refresh_similar_listings",
+        "schedule": crontab(hour=3, minute=0),
+        "kwargs": {"full": True},
+    },
+    "ads-match-saved-searches": {
+        "task": "rockflint_web.ads.tasks.match_saved_searches",
+        "schedule": 5 * 60.0,
+    },
+    "ads-send-saved-search-digests": {
+        "task": "rockflint_web.ads.tasks.send_saved_search_digests",
+        "schedule": crontab(minute=0),
+    },
+    "agent-purge-vendor-exports": {
+        "task": "rockflint_web.agent.tasks.purge_vendor_exports",
+        "schedule": crontab(minute=15),
+    },
+    "ads-rebuild-favorite-neighbors": {
+        "task": "rockflint_web.ads.tasks.rebuild_favorite_neighbors",
+        "schedule": crontab(hour=2, minute=30),
+    },
+}
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool("DJANGO_ACCOUNT_ALLOW_REGISTRATION", True)
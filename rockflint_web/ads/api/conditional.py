@@ -0,0 +1,94 @@
+import hashlib
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.cache import quote_etag
+from django.utils.http import http_date
+from rest_framework import status
+
+
+def make_etag(request, *parts):
+    """Strong ETag over the validator parts, the URL and the response format."""
+    renderer = getattr(request, "accepted_renderer", None)
+    source = "|".join(
+        [
+            request.get_full_path(),
+            getattr(renderer, "format", ""),
+            *(str(part) for part in parts),
+        ],
+    )
+    return quote_etag(hashlib.sha1(source.encode()).hexdigest())  # noqa: S324
+
+
+def conditional_response(request, render, *, etag, last_modified=None):
+    """
+    Answer If-None-Match / If-Modified-Since with a 304 before ``render`` is
+    called; otherwise render and attach the validators.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=timestamp,
+    )
+    response = not_modified if not_modified is not None else render()
+    code = response.status_code
+    if status.is_success(code) or code == status.HTTP_304_NOT_MODIFIED:
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+    return response
+
+
+def aggregate_validators(*querysets):
+    """
+    (parts, last_modified) from one ``COUNT``/``MAX(updated)`` per queryset;
+    the count catches deletions that ``MAX(updated)`` cannot see.
+    """
+    parts = []
+    last_modified = None
+    for queryset in querysets:
+        row = queryset.order_by().aggregate(count=Count("pk"), last=Max("updated"))
+        parts.append(f"{row['count']}:{row['last'].isoformat() if row['last'] else ''}")
+        if row["last"] and (last_modified is None or row["last"] > last_modified):
+            last_modified = row["last"]
+    return parts, last_modified
+
+
+class ConditionalLookupMixin:
+    """
+    ETag / Last-Modified for read-only lookup viewsets, computed from
+    aggregates over the (unserialized) queryset.
+    """
+
+    def get_validator_querysets(self, queryset):
+        return [queryset]
+
+    def _conditional(self, request, queryset, render):
+        parts, last_modified = aggregate_validators(
+            *self.get_validator_querysets(queryset),
+        )
+        return conditional_response(
+            request,
+            render,
+            etag=make_etag(request, *parts),
+            last_modified=last_modified,
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        render = partial(super().list, request, *args, **kwargs)
+        return self._conditional(request, queryset, render)
+
+    def retrieve(self, request, *args, **kwargs):
+        # a missing object hashes to a different ETag and renders its 404
+        render = partial(super().retrieve, request, *args, **kwargs)
+        lookup = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        try:
+            queryset = self.get_queryset().filter(**{self.lookup_field: lookup})
+        except (TypeError, ValueError, ValidationError):
+            return render()
+        return self._conditional(request, queryset, render)
@@ -1,16 +1,70 @@
 import django_filters
 from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import D
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from rest_framework.filters import OrderingFilter
+from rest_framework.filters import SearchFilter
 
+from rockflint_web.ads.geo import location_geography
+from rockflint_web.ads.models import LISTING_SEARCH_CONFIG
 from rockflint_web.ads.models import Listing
 
 
+class ListingSearchFilter(SearchFilter):
+    """
+    Full-text ``?search=`` over ``Listing.search_vector`` (GIN indexed).
+
+    Matches are ranked by ``ts_rank`` right after the promoted-first key, so
+    promoted listings still lead and the best text matches follow.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = " ".join(self.get_search_terms(request))
+        if not terms:
+            return queryset
+        query = SearchQuery(
+            terms,
+            search_type="websearch",
+            config=LISTING_SEARCH_CONFIG,
+        )
+        # ts_rank is float4; as float8 the cursor value round-trips exactly,
+        # so rows tied with the page boundary are neither skipped nor repeated
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F("search_vector"), query), FloatField()),
+        )
+        ordering = list(queryset.query.order_by)
+        position = 1 if ordering[:1] == ["-promotion_rank"] else 0
+        ordering.insert(position, "-search_rank")
+        return queryset.order_by(*ordering)
+
+
+class ListingOrderingFilter(OrderingFilter):
+    """
+    Explicit ``?ordering=`` sorts within the promoted/regular groups instead of
+    replacing the promoted-first ordering built by the view.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param):
+            return queryset
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        return queryset.order_by("-promotion_rank", *ordering, "-id")
+
+
 class ListingFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     max_price = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
     latitude = django_filters.NumberFilter(method="filter_location")
     longitude = django_filters.NumberFilter(method="filter_location")
     radius_km = django_filters.NumberFilter(method="filter_location")
+    # nearest=true orders purely by distance (KNN) and drops the default radius
+    nearest = django_filters.BooleanFilter(method="filter_nearest")
 
     promoted = django_filters.BooleanFilter(method="filter_promoted")
 
@@ -29,18 +83,15 @@ class ListingFilter(django_filters.FilterSet):
         # promoted=true -> has active promotion and not expired
         # promoted=false -> normal listings only
         if value is True:
-            return queryset.filter(
-                promotion__active=True,
-                promotion__promoted_until__gt=django_filters.utils.timezone.now(),
-            )
+            return queryset.filter(promotion_rank__gt=0)
         if value is False:
-            return queryset.exclude(
-                promotion__active=True,
-                promotion__promoted_until__gt=django_filters.utils.timezone.now(),
-            )
+            return queryset.filter(promotion_rank=0)
         return queryset
 
     def filter_location(self, queryset, name, value):
+        # latitude, longitude and radius_km all route here; apply once
+        if name != "latitude":
+            return queryset
         data = self.data
         latitude = data.get("latitude")
         longitude = data.get("longitude")
@@ -52,6 +103,8 @@ class ListingFilter(django_filters.FilterSet):
             longitude_value = float(longitude)
         except (TypeError, ValueError):
             return queryset
+        if radius_km in (None, "") and self.form.cleaned_data.get("nearest"):
+            return queryset
         try:
             radius_value = float(radius_km) if radius_km not in (None, "") else 10.0
         except (TypeError, ValueError):
@@ -59,4 +112,11 @@ class ListingFilter(django_filters.FilterSet):
         if radius_value <= 0:
             return queryset
         point = Point(longitude_value, latitude_value, srid=4326)
-        return queryset.filter(location__distance_lte=(point, D(km=radius_value)))
+        # ST_DWithin on location::geography uses the GiST expression index
+        return queryset.alias(location_geography=location_geography()).filter(
+            location_geography__dwithin=(point, D(km=radius_value)),
+        )
+
+    def filter_nearest(self, queryset, name, value):
+        # ordering is applied by ListingViewSet.get_queryset
+        return queryset
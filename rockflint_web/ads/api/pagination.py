@@ -1,7 +1,193 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 12
     page_size_query_param = "page_size"
     max_page_size = 50
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return parse_datetime(value["dt"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def _resolve_value(obj, field):
+    value = obj
+    for part in field.split("__"):
+        value = getattr(value, part, None)
+        if value is None:
+            return None
+    return getattr(value, "pk", value)
+
+
+def keyset_filter(ordering, values):
+    """
+    Build a Q matching rows strictly after ``values`` in ``ordering``.
+
+    Follows PostgreSQL null placement: NULLS LAST for ascending columns and
+    NULLS FIRST for descending ones.
+    """
+    after = Q(pk__in=[])
+    equal = Q()
+    for field, value in zip(ordering, values, strict=True):
+        descending = field.startswith("-")
+        name = field.lstrip("-")
+        if value is None:
+            field_after = Q(**{f"{name}__isnull": False}) if descending else None
+            field_equal = Q(**{f"{name}__isnull": True})
+        else:
+            lookup = "lt" if descending else "gt"
+            field_after = Q(**{f"{name}__{lookup}": value})
+            if not descending:
+                field_after |= Q(**{f"{name}__isnull": True})
+            field_equal = Q(**{name: value})
+        if field_after is not None:
+            after |= equal & field_after
+        equal &= field_equal
+    return after
+
+
+class ListingCursorPagination(BasePagination):
+    """
+    Keyset pagination over the queryset's own ordering.
+
+    The cursor carries the sort key of the page boundary (``promotion_rank``,
+    optional ``distance``, ``created`` and ``id`` by default) so every page is
+    a bounded index range scan and no ``COUNT(*)`` is issued.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 12
+    page_size_query_param = "page_size"
+    max_page_size = 50
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        values, reverse = self.decode_cursor(request)
+        if reverse:
+            ordering = [self._flip(field) for field in self.ordering]
+        else:
+            ordering = self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = values is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = values is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = [
+            field for field in queryset.query.order_by if isinstance(field, str)
+        ]
+        if not {"id", "-id", "pk", "-pk"} & set(ordering):
+            ordering.append("-id")
+        return ordering
+
+    def _flip(self, field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            values = [_decode_value(value) for value in payload["v"]]
+            reverse = bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, obj, *, reverse):
+        values = [
+            _encode_value(_resolve_value(obj, field.lstrip("-")))
+            for field in self.ordering
+        ]
+        payload = json.dumps({"v": values, "r": int(reverse)}, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+        return encoded.rstrip("=")
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = self.encode_cursor(self.page[-1], reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = self.encode_cursor(self.page[0], reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            },
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
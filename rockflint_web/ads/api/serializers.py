@@ -1,21 +1,54 @@
 # ads/serializers.py
 from django.contrib.gis.geos import Point
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
+from rockflint_web.ads.bulk_actions import BULK_MAX_LISTINGS
+from rockflint_web.ads.bulk_actions import BULK_OPERATIONS
+from rockflint_web.ads.image_variants import variant_srcsets
+from rockflint_web.ads.models import LGA
 from rockflint_web.ads.models import Category
 from rockflint_web.ads.models import Feature
-from rockflint_web.ads.models import LGA
-from rockflint_web.ads.models import Offer
-from rockflint_web.ads.models import State
 from rockflint_web.ads.models import Listing
 from rockflint_web.ads.models import ListingImage
+from rockflint_web.ads.models import ListingSearchDocument
+from rockflint_web.ads.models import Offer
 from rockflint_web.ads.models import Review
+from rockflint_web.ads.models import SavedSearch
+from rockflint_web.ads.models import State
+from rockflint_web.ads.models import pick_primary_image
+from rockflint_web.ads.saved_searches import SAVED_SEARCH_PARAMS
+from rockflint_web.ads.search_documents import schedule_search_document_refresh
+
+from .filters import ListingFilter
+
+
+def storage_url(name):
+    return ListingImage._meta.get_field("image").storage.url(name)
+
+
+def image_srcsets(variants, request=None):
+    """``{"webp", "jpeg"}`` srcset strings of an image's variants, or None."""
+
+    def url(name):
+        if request is None:
+            return storage_url(name)
+        return request.build_absolute_uri(storage_url(name))
+
+    return variant_srcsets(variants, url)
 
 
 class ListingImageSerializer(serializers.ModelSerializer):
+    # None until the resized variants have been built
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ListingImage
-        fields = ("id", "image", "caption", "is_primary", "order")
+        fields = ("id", "image", "caption", "is_primary", "order", "srcset")
+
+    def get_srcset(self, obj):
+        return image_srcsets(obj.current_variants, self.context.get("request"))
 
 
 class FeatureSerializer(serializers.ModelSerializer):
@@ -55,8 +88,10 @@ class ListingSerializer(serializers.ModelSerializer):
     features = FeatureSerializer(many=True, read_only=True)
     category = CategorySerializer(read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
     latitude = serializers.SerializerMethodField()
     longitude = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Listing
@@ -74,6 +109,7 @@ class ListingSerializer(serializers.ModelSerializer):
             "features",
             "images",
             "primary_image",
+            "primary_image_srcset",
             "category",
             "offer",
             "state",
@@ -81,12 +117,22 @@ class ListingSerializer(serializers.ModelSerializer):
             "vendor",
             "latitude",
             "longitude",
+            "distance_km",
         ]
         read_only_fields = ("vendor",)
 
     def get_primary_image(self, obj):
         return obj.primary_image
 
+    def get_primary_image_srcset(self, obj):
+        # only from prefetched images, like Listing.primary_image
+        images = getattr(obj, "_prefetched_objects_cache", {}).get("images")
+        primary = pick_primary_image(images) if images is not None else None
+        if primary is None:
+            return None
+        # absolute, like images[].srcset
+        return image_srcsets(primary.current_variants, self.context.get("request"))
+
     def get_latitude(self, obj):
         if obj.location:
             return obj.location.y
@@ -97,6 +143,110 @@ class ListingSerializer(serializers.ModelSerializer):
             return obj.location.x
         return None
 
+    def get_distance_km(self, obj):
+        # only set when the request carried latitude/longitude
+        distance = getattr(obj, "distance", None)
+        if distance is None:
+            return None
+        return round(distance / 1000, 3)
+
+
+class ListingSearchDocumentSerializer(serializers.ModelSerializer):
+    """Renders a ListingSearchDocument in the same shape as ListingSerializer."""
+
+    id = serializers.IntegerField(source="listing_id", read_only=True)
+    features = serializers.JSONField(read_only=True)
+    images = serializers.SerializerMethodField()
+    primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
+    category = serializers.SerializerMethodField()
+    offer = serializers.IntegerField(source="offer_id", read_only=True)
+    state = serializers.IntegerField(source="state_id", read_only=True)
+    lga = serializers.IntegerField(source="lga_id", read_only=True)
+    vendor = serializers.IntegerField(source="vendor_id", read_only=True)
+
+    class Meta:
+        model = ListingSearchDocument
+        fields = [
+            field for field in ListingSerializer.Meta.fields if field != "distance_km"
+        ]
+
+    def _storage_url(self, name):
+        if not name:
+            return None
+        return storage_url(name)
+
+    def get_images(self, obj):
+        # same absolute URLs ListingImageSerializer builds
+        request = self.context.get("request")
+        images = []
+        for image in obj.images:
+            # documents built before variants existed have no "variants" key
+            entry = {key: value for key, value in image.items() if key != "variants"}
+            url = self._storage_url(image["image"])
+            if url and request is not None:
+                url = request.build_absolute_uri(url)
+            srcset = image_srcsets(image.get("variants"), request)
+            images.append({**entry, "image": url, "srcset": srcset})
+        return images
+
+    def get_primary_image(self, obj):
+        return self._storage_url(obj.primary_image)
+
+    def get_primary_image_srcset(self, obj):
+        for image in obj.images:
+            if image["image"] == obj.primary_image:
+                request = self.context.get("request")
+                return image_srcsets(image.get("variants"), request)
+        return None
+
+    def get_category(self, obj):
+        return {
+            "id": obj.category_id,
+            "name": obj.category_name,
+            "slug": obj.category_slug,
+        }
+
+
+def has_search_document(listing):
+    try:
+        listing.search_document  # noqa: B018
+    except ObjectDoesNotExist:
+        return False
+    return True
+
+
+class ListingPageSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        listings = list(data)
+        # batch-load relations for rows still missing a document so the
+        # fallback path costs a fixed number of queries per page
+        missing = [listing for listing in listings if not has_search_document(listing)]
+        if missing:
+            prefetch_related_objects(missing, "category", "images", "features")
+            schedule_search_document_refresh(listing.pk for listing in missing)
+        return super().to_representation(listings)
+
+
+class ListingListSerializer(ListingSerializer):
+    """
+    List representation served from the listing's search document; listings
+    whose document has not been built yet fall back to ListingSerializer.
+    """
+
+    class Meta(ListingSerializer.Meta):
+        list_serializer_class = ListingPageSerializer
+
+    def to_representation(self, instance):
+        if not has_search_document(instance):
+            return super().to_representation(instance)
+        data = ListingSearchDocumentSerializer(
+            instance.search_document,
+            context=self.context,
+        ).data
+        data["distance_km"] = self.get_distance_km(instance)
+        return data
+
 
 class ListingWriteSerializer(serializers.ModelSerializer):
     latitude = serializers.FloatField(required=False, allow_null=True)
@@ -161,3 +311,65 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ("id", "user", "listing", "title", "comment", "rating", "created")
         read_only_fields = ("user", "created")
+
+
+class ListingBulkActionSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_LISTINGS,
+    )
+    operation = serializers.ChoiceField(choices=BULK_OPERATIONS)
+    # set_price
+    price = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        min_value=0,
+        required=False,
+    )
+    # adjust_price, e.g. -5 or 12.5
+    percent = serializers.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        min_value=-99,
+        max_value=1000,
+        required=False,
+    )
+
+    def validate(self, attrs):
+        required = {"set_price": "price", "adjust_price": "percent"}
+        field = required.get(attrs["operation"])
+        if field and field not in attrs:
+            raise serializers.ValidationError(
+                {field: f"Required for {attrs['operation']}."},
+            )
+        attrs["ids"] = sorted(set(attrs["ids"]))
+        return attrs
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = ("id", "name", "query", "notify", "created")
+        read_only_fields = ("created",)
+
+    def validate_query(self, value):
+        if not isinstance(value, dict):
+            msg = "Must be an object of listing filter parameters."
+            raise serializers.ValidationError(msg)
+        unsupported = sorted(set(value) - set(SAVED_SEARCH_PARAMS))
+        if unsupported:
+            msg = f"Unsupported parameters: {', '.join(unsupported)}."
+            raise serializers.ValidationError(msg)
+        query = {
+            param: str(value[param])
+            for param in SAVED_SEARCH_PARAMS
+            if value.get(param) not in (None, "")
+        }
+        if ("latitude" in query) != ("longitude" in query):
+            msg = "latitude and longitude must be given together."
+            raise serializers.ValidationError(msg)
+        filterset = ListingFilter(data=query, queryset=Listing.objects.none())
+        if not filterset.is_valid():
+            raise serializers.ValidationError(filterset.errors)
+        return query
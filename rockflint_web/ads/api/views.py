@@ -1,61 +1,113 @@
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.geos import Point
-from django.db.models import Case
-from django.db.models import IntegerField
-from django.db.models import When
-from django.contrib.gis.db.models.functions import Distance
+import logging
+from functools import partial
+
 from django.contrib.gis.geos import Point
-from django.utils import timezone
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models import Max
+from django.http import Http404
+from django.http import HttpResponse
+from django_filters.rest_framework import DjangoFilterBackend
+from redis.exceptions import RedisError
 from rest_framework import permissions
+from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-
+from rest_framework.views import APIView
+
+from rockflint_web.ads.autocomplete import autocomplete
+from rockflint_web.ads.bootstrap import bootstrap_payload
+from rockflint_web.ads.bulk_actions import ListingsNotOwnedError
+from rockflint_web.ads.bulk_actions import PriceOutOfRangeError
+from rockflint_web.ads.bulk_actions import bulk_update_listings
+from rockflint_web.ads.cache import LISTING_RESPONSE_TIMEOUT
+from rockflint_web.ads.cache import listing_response_cache_key
+from rockflint_web.ads.clusters import MAX_ZOOM
+from rockflint_web.ads.clusters import InvalidBoundingBoxError
+from rockflint_web.ads.clusters import cluster_listings
+from rockflint_web.ads.clusters import parse_bbox
+from rockflint_web.ads.co_favorites import favorite_neighbor_ids
+from rockflint_web.ads.facets import listing_facets
+from rockflint_web.ads.geo import distance_from
+from rockflint_web.ads.listing_import import IMPORT_FORMATS
+from rockflint_web.ads.listing_import import ImportFormatError
+from rockflint_web.ads.listing_import import import_format
+from rockflint_web.ads.listing_import import import_listings
+from rockflint_web.ads.listing_views import record_listing_view
+from rockflint_web.ads.listing_views import visitor_id
+from rockflint_web.ads.models import LGA
 from rockflint_web.ads.models import Category
 from rockflint_web.ads.models import Favorite
 from rockflint_web.ads.models import Feature
 from rockflint_web.ads.models import Listing
 from rockflint_web.ads.models import ListingImage
-from rockflint_web.ads.models import LGA
 from rockflint_web.ads.models import Offer
+from rockflint_web.ads.models import Review
+from rockflint_web.ads.models import SavedSearch
 from rockflint_web.ads.models import State
+from rockflint_web.ads.price_stats import price_stats
+from rockflint_web.ads.price_stats import rollup_dimensions
+from rockflint_web.ads.price_stats import rollup_price_stats
+from rockflint_web.ads.recommendations import DEFAULT_PRICE_TOLERANCE
+from rockflint_web.ads.recommendations import SIMILAR_LISTINGS_STORED
+from rockflint_web.ads.recommendations import listings_in_order
 from rockflint_web.ads.recommendations import parse_price_tolerance
 from rockflint_web.ads.recommendations import similar_listings_for
-
+from rockflint_web.ads.recommendations import stored_similar_listings
+from rockflint_web.ads.tiles import TILE_TIMEOUT
+from rockflint_web.ads.tiles import render_tile
+from rockflint_web.ads.tiles import tile_cache_key
+from rockflint_web.ads.tiles import tile_exists
+from rockflint_web.ads.trending import trending_listing_ids
+
+from .conditional import ConditionalLookupMixin
+from .conditional import conditional_response
+from .conditional import make_etag
 from .filters import ListingFilter
+from .filters import ListingOrderingFilter
+from .filters import ListingSearchFilter
 from .pagination import DefaultPagination
+from .pagination import ListingCursorPagination
 from .permissions import IsVendorOwnerOrReadOnly
 from .serializers import CategorySerializer
 from .serializers import FeatureSerializer
 from .serializers import LGASerializer
+from .serializers import ListingBulkActionSerializer
 from .serializers import ListingImageSerializer
+from .serializers import ListingListSerializer
 from .serializers import ListingSerializer
 from .serializers import ListingWriteSerializer
 from .serializers import OfferSerializer
 from .serializers import ReviewSerializer
+from .serializers import SavedSearchSerializer
 from .serializers import StateSerializer
 
+logger = logging.getLogger(__name__)
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+
+class CategoryViewSet(ConditionalLookupMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = CategorySerializer
     queryset = Category.objects.all()
     permission_classes = [permissions.AllowAny]
 
 
-class OfferViewSet(viewsets.ReadOnlyModelViewSet):
+class OfferViewSet(ConditionalLookupMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = OfferSerializer
     queryset = Offer.objects.all()
     permission_classes = [permissions.AllowAny]
 
 
-class StateViewSet(viewsets.ReadOnlyModelViewSet):
+class StateViewSet(ConditionalLookupMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = StateSerializer
     queryset = State.objects.all()
     permission_classes = [permissions.AllowAny]
 
 
-class LGAViewSet(viewsets.ReadOnlyModelViewSet):
+class LGAViewSet(ConditionalLookupMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = LGASerializer
     permission_classes = [permissions.AllowAny]
 
@@ -66,13 +118,96 @@ class LGAViewSet(viewsets.ReadOnlyModelViewSet):
             return queryset.filter(state_id=state_id)
         return queryset
 
+    def get_validator_querysets(self, queryset):
+        # LGAs embed their state
+        return [queryset, State.objects.all()]
+
 
-class FeatureViewSet(viewsets.ReadOnlyModelViewSet):
+class FeatureViewSet(ConditionalLookupMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = FeatureSerializer
     queryset = Feature.objects.all()
     permission_classes = [permissions.AllowAny]
 
 
+class AutocompleteView(APIView):
+    """
+    /api/ads/autocomplete/?q=
+    Typeahead suggestions across states, LGAs, categories and listing titles.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get("q", "")
+        try:
+            limit = int(request.query_params.get("limit", 8))
+        except (TypeError, ValueError):
+            limit = 8
+        limit = max(1, min(limit, 20))
+        return Response({"query": query, "results": autocomplete(query, limit=limit)})
+
+
+class BootstrapView(APIView):
+    """
+    /api/ads/bootstrap/
+    All reference data (state -> LGA tree, categories, offers, features) in
+    one response. ``?v=<version>`` URLs are immutable and cached for a year.
+    """
+
+    permission_classes = [permissions.AllowAny]
+    immutable_max_age = 60 * 60 * 24 * 365
+    max_age = 60
+
+    def get(self, request):
+        data, digest = bootstrap_payload()
+        response = conditional_response(
+            request,
+            lambda: Response({"version": digest, **data}),
+            etag=make_etag(request, digest),
+        )
+        if request.query_params.get("v") == digest:
+            cache_control = f"public, max-age={self.immutable_max_age}, immutable"
+        else:
+            cache_control = f"public, max-age={self.max_age}"
+        response["Cache-Control"] = cache_control
+        return response
+
+
+class ListingTileView(APIView):
+    """
+    /api/ads/tiles/{z}/{x}/{y}.mvt
+    Mapbox Vector Tile of active listings (price, category, bedrooms and a
+    promoted flag per point), narrowed by the ``ListingFilter`` params.
+    """
+
+    permission_classes = [permissions.AllowAny]
+    content_type = "application/vnd.mapbox-vector-tile"
+    max_age = 60
+
+    def perform_content_negotiation(self, request, force=False):  # noqa: FBT002
+        # map clients ask for the tile type; errors still render as JSON
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, z, x, y):
+        if not tile_exists(z, x, y):
+            raise Http404
+        key = tile_cache_key(z, x, y, request.query_params)
+        tile = cache.get(key)
+        if tile is None:
+            filterset = ListingFilter(
+                request.query_params,
+                queryset=Listing.objects.active(),
+                request=request,
+            )
+            if not filterset.is_valid():
+                raise ValidationError(filterset.errors)
+            tile = render_tile(filterset.qs, z, x, y)
+            cache.set(key, tile, TILE_TIMEOUT)
+        response = HttpResponse(tile, content_type=self.content_type)
+        response["Cache-Control"] = f"public, max-age={self.max_age}"
+        return response
+
+
 class ListingViewSet(viewsets.ModelViewSet):
     """
     /api/listings/
@@ -82,18 +217,45 @@ class ListingViewSet(viewsets.ModelViewSet):
     serializer_class = ListingSerializer
     permission_classes = [IsVendorOwnerOrReadOnly]
     filterset_class = ListingFilter
+    filter_backends = [
+        DjangoFilterBackend,
+        ListingSearchFilter,
+        ListingOrderingFilter,
+    ]
     pagination_class = DefaultPagination
+    cursor_pagination_class = ListingCursorPagination
 
-    search_fields = ["title", "description", "address"]
     ordering_fields = ["price", "created", "bedrooms"]
     ordering = ["-created"]
+    clusters_max_age = 60
+    public_aggregate_actions = ["clusters", "facets", "price_stats"]
 
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
             return ListingWriteSerializer
+        if self.action == "list":
+            return ListingListSerializer
         return ListingSerializer
 
+    @property
+    def paginator(self):
+        # ?cursor=... (or ?pagination=cursor for the first page) switches to
+        # keyset pagination, which skips the COUNT(*) and OFFSET scans.
+        if not hasattr(self, "_paginator"):
+            request = getattr(self, "request", None)
+            params = request.query_params if request is not None else {}
+            if "cursor" in params or params.get("pagination") == "cursor":
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def base_queryset(self):
+        if self.action == "list":
+            # rows are rendered from their flat search document
+            return Listing.objects.select_related("search_document")
+        if self.action in ["reviews", "also_saved", *self.public_aggregate_actions]:
+            return Listing.objects.all()
         return Listing.objects.select_related(
             "vendor",
             "category",
@@ -118,20 +280,16 @@ class ListingViewSet(viewsets.ModelViewSet):
                 )
                 return queryset.distinct()
             return queryset.filter(active=True)
+        if self.action in self.public_aggregate_actions:
+            # vendors get the same (cached) aggregates as everyone else
+            return queryset.filter(active=True)
         return queryset
 
     def apply_promotion_ordering(self, queryset, include_distance=False):
-        now = timezone.now()
         ordering = list(self.ordering)
         if include_distance:
             ordering = ["distance", *ordering]
-        return queryset.annotate(
-            is_promoted=Case(
-                When(promotion__active=True, promotion__promoted_until__gt=now, then=1),
-                default=0,
-                output_field=IntegerField(),
-            ),
-        ).order_by("-is_promoted", *ordering)
+        return queryset.order_by("-promotion_rank", *ordering, "-id")
 
     def get_distance_point(self):
         latitude = self.request.query_params.get("latitude")
@@ -150,17 +308,97 @@ class ListingViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return [p() for p in self.permission_classes]
 
+    def wants_nearest(self):
+        value = self.request.query_params.get("nearest", "")
+        return value.lower() in ("true", "1")
+
     def get_queryset(self):
         queryset = self.base_queryset()
         queryset = self.apply_visibility_filters(queryset)
         point = self.get_distance_point()
         if point:
-            queryset = queryset.annotate(distance=Distance("location", point))
+            # metres, via the KNN operator on the indexed geography expression
+            queryset = queryset.annotate(distance=distance_from(point))
+            if self.wants_nearest():
+                return queryset.filter(location__isnull=False).order_by(
+                    "distance",
+                    "-id",
+                )
         return self.apply_promotion_ordering(
             queryset,
             include_distance=bool(point),
         )
 
+    def list(self, request, *args, **kwargs):
+        # vendors also see their own inactive listings, so only the public
+        # view of the catalogue is shared through the response cache
+        if self.user_can_view_inactive():
+            return super().list(request, *args, **kwargs)
+        key = listing_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, LISTING_RESPONSE_TIMEOUT)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        render = partial(super().retrieve, request, *args, **kwargs)
+        try:
+            row = (
+                self.apply_visibility_filters(Listing.objects.filter(pk=kwargs["pk"]))
+                # nested feature names and icons version the response too
+                .annotate(features_updated=Max("features__updated"))
+                .values_list(
+                    "updated",
+                    "category__updated",
+                    "features_updated",
+                    "state_id",
+                    "category_id",
+                )
+                .first()
+            )
+        except (TypeError, ValueError):
+            return render()
+        if row is None:
+            return render()
+        *versions, state_id, category_id = row
+        versions = [value for value in versions if value is not None]
+        # images, feature links and promotion changes touch Listing.updated
+        response = conditional_response(
+            request,
+            render,
+            etag=make_etag(request, *(value.isoformat() for value in versions)),
+            last_modified=max(versions),
+        )
+        record_listing_view(
+            int(kwargs["pk"]),
+            visitor_id(request),
+            state_id=state_id,
+            category_id=category_id,
+        )
+        return response
+
+    def get_limit(self, default=6, maximum=20):
+        try:
+            limit = int(self.request.query_params.get("limit") or default)
+        except (TypeError, ValueError):
+            limit = default
+        return max(1, min(limit, maximum))
+
+    def cached_public_data(self, namespace, build):
+        """
+        ``build(filtered_queryset)`` cached per normalized query string until
+        the next listing change; for actions that only expose active listings.
+        """
+        key = listing_response_cache_key(self.request, namespace=namespace)
+        data = cache.get(key)
+        if data is None:
+            data = build(self.filter_queryset(self.get_queryset()))
+            cache.set(key, data, LISTING_RESPONSE_TIMEOUT)
+        return data
+
     def perform_create(self, serializer):
         # Ensure vendor exists
         user = self.request.user
@@ -189,8 +427,73 @@ class ListingViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"])
     def reviews(self, request, pk=None):
         listing = self.get_object()
-        qs = listing.reviews.select_related("user").all()
-        return Response(ReviewSerializer(qs, many=True).data)
+        stats = Review.objects.filter(listing=listing).aggregate(
+            count=Count("pk"),
+            last_id=Max("pk"),
+            last=Max("created"),
+        )
+
+        def render():
+            qs = listing.reviews.select_related("user").all()
+            return Response(ReviewSerializer(qs, many=True).data)
+
+        return conditional_response(
+            request,
+            render,
+            etag=make_etag(request, stats["count"], stats["last_id"]),
+            last_modified=stats["last"],
+        )
+
+    @action(detail=False, methods=["get"])
+    def clusters(self, request):
+        """
+        /api/ads/listings/clusters/?bbox=min_lng,min_lat,max_lng,max_lat&zoom=
+        Map markers for the filtered listings: grid clusters with counts,
+        centroids and price ranges, or plain points when the box is sparse.
+        Request one tile-sized bbox per map tile so responses cache per tile.
+        """
+        try:
+            zoom = int(request.query_params.get("zoom", ""))
+        except ValueError as exc:
+            msg = "An integer zoom level is required."
+            raise ValidationError({"zoom": msg}) from exc
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValidationError({"zoom": f"zoom must be between 0 and {MAX_ZOOM}."})
+        try:
+            bbox = parse_bbox(request.query_params.get("bbox"))
+        except InvalidBoundingBoxError as exc:
+            raise ValidationError({"bbox": str(exc)}) from exc
+
+        data = self.cached_public_data(
+            "clusters",
+            lambda queryset: {"zoom": zoom, **cluster_listings(queryset, bbox, zoom)},
+        )
+        response = Response(data)
+        response["Cache-Control"] = f"public, max-age={self.clusters_max_age}"
+        return response
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        """
+        /api/ads/listings/facets/?<ListingFilter params>
+        Counts per category, offer, state, LGA, bedrooms and price bucket for
+        the current filters; lookup names come from /api/ads/bootstrap/.
+        """
+        return Response(self.cached_public_data("facets", listing_facets))
+
+    @action(detail=False, methods=["get"], url_path="price-stats")
+    def price_stats(self, request):
+        """
+        /api/ads/listings/price-stats/?<ListingFilter params>
+        Log-scaled price histogram plus min, max, median and p90. Requests
+        narrowed only by state/category/offer are served from PriceRollup.
+        """
+        dimensions = rollup_dimensions(request.query_params)
+        if dimensions is not None:
+            data = rollup_price_stats(dimensions)
+            if data is not None:
+                return Response(data)
+        return Response(self.cached_public_data("price-stats", price_stats))
 
     @action(detail=True, methods=["get"])
     def recommendations(self, request, pk=None):
@@ -198,20 +501,56 @@ class ListingViewSet(viewsets.ModelViewSet):
         price_tolerance = parse_price_tolerance(
             request.query_params.get("price_tolerance"),
         )
-        limit = request.query_params.get("limit")
+        limit_value = self.get_limit()
+        qs = None
+        if (
+            price_tolerance == DEFAULT_PRICE_TOLERANCE
+            and limit_value <= SIMILAR_LISTINGS_STORED
+        ):
+            qs = stored_similar_listings(listing, limit=limit_value)
+        if qs is None:
+            qs = similar_listings_for(
+                listing,
+                price_tolerance=price_tolerance,
+                limit=limit_value,
+            )
+        return Response(ListingSerializer(qs, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def trending(self, request):
+        """
+        /api/ads/listings/trending/?state=&category=
+        Active listings ranked by decayed views, favorites and reviews.
+        """
+        scope = {}
+        for param in ["state", "category"]:
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    scope[f"{param}_id"] = int(value)
+                except ValueError as exc:
+                    raise ValidationError({param: "Must be an integer id."}) from exc
+        limit = self.get_limit(default=12, maximum=50)
         try:
-            limit_value = int(limit) if limit else 6
-        except (TypeError, ValueError):
-            limit_value = 6
-        if limit_value < 1:
-            limit_value = 1
-        if limit_value > 20:
-            limit_value = 20
-        qs = similar_listings_for(
-            listing,
-            price_tolerance=price_tolerance,
-            limit=limit_value,
-        )
+            # over-fetch a little: deactivated listings decay out lazily
+            listing_ids = trending_listing_ids(**scope, limit=limit * 2)
+        except RedisError:
+            logger.warning("Trending scores are unavailable")
+            listing_ids = []
+        listings = [
+            listing for listing in listings_in_order(listing_ids) if listing.active
+        ]
+        return Response(ListingSerializer(listings[:limit], many=True).data)
+
+    @action(detail=True, methods=["get"], url_path="also-saved")
+    def also_saved(self, request, pk=None):
+        """
+        /api/ads/listings/{id}/also-saved/
+        "People who saved this also saved", from the nightly co-favorite store.
+        """
+        listing = self.get_object()
+        neighbor_ids = favorite_neighbor_ids(listing, limit=self.get_limit())
+        qs = listings_in_order(neighbor_ids)
         return Response(ListingSerializer(qs, many=True).data)
 
     @action(
@@ -226,6 +565,94 @@ class ListingViewSet(viewsets.ModelViewSet):
         serializer.save(user=request.user, listing=listing)
         return Response(serializer.data, status=201)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def bulk(self, request):
+        """
+        /api/ads/listings/bulk/ {"ids": [...], "operation": ..., "price" or
+        "percent"}
+        activate, deactivate, set_price, adjust_price or delete many of the
+        vendor's listings at once; the whole batch is refused if any id is
+        not the vendor's.
+        """
+        user = request.user
+        if not hasattr(user, "vendor"):
+            raise PermissionDenied("You must be a vendor to change listings.")
+        serializer = ListingBulkActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            changed = bulk_update_listings(
+                user.vendor,
+                data["ids"],
+                data["operation"],
+                price=data.get("price"),
+                percent=data.get("percent"),
+            )
+        except ListingsNotOwnedError as exc:
+            ids = ", ".join(map(str, exc.listing_ids))
+            msg = f"These listings are not yours or do not exist: {ids}."
+            raise PermissionDenied(msg) from exc
+        except PriceOutOfRangeError as exc:
+            msg = "The adjusted price of some listings would be too large."
+            raise ValidationError({"percent": msg}) from exc
+        return Response({"operation": data["operation"], "count": changed})
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[permissions.IsAuthenticated],
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
+        /api/ads/listings/import/ (multipart: file, optional format, dry_run)
+        Create the vendor's listings from a CSV or NDJSON inventory; invalid
+        rows are skipped and itemized in the report.
+        """
+        user = request.user
+        if not hasattr(user, "vendor"):
+            raise PermissionDenied("You must be a vendor to import listings.")
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Upload a CSV or NDJSON file."})
+        fmt = request.data.get("format") or import_format(
+            upload.name,
+            upload.content_type or "",
+        )
+        if fmt not in IMPORT_FORMATS:
+            msg = f"Must be one of: {', '.join(IMPORT_FORMATS)}."
+            raise ValidationError({"format": msg})
+        dry_run = str(request.data.get("dry_run", "")).lower() in ("true", "1")
+        try:
+            report = import_listings(user.vendor, upload, fmt, dry_run=dry_run)
+        except ImportFormatError as exc:
+            raise ValidationError({"file": str(exc)}) from exc
+        if report["imported"] and not dry_run:
+            return Response(report, status=status.HTTP_201_CREATED)
+        return Response(report)
+
+
+class SavedSearchViewSet(viewsets.ModelViewSet):
+    """
+    /api/ads/saved-searches/
+    The user's saved listing searches; ``notify`` turns the new-listing
+    digest on or off.
+    """
+
+    serializer_class = SavedSearchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
 
 class ListingImageViewSet(viewsets.ModelViewSet):
     """
@@ -1,6 +1,12 @@
+import contextlib
+
 from django.apps import AppConfig
 
 
 class AdsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "rockflint_web.ads"
+
+    def ready(self):
+        with contextlib.suppress(ImportError):
+            import rockflint_web.ads.signals  # noqa: F401
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import BooleanField
+from django.db.models import Case
+from django.db.models import When
+
+from rockflint_web.ads.models import LGA
+from rockflint_web.ads.models import Category
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import State
+
+MIN_QUERY_LENGTH = 2
+VOCABULARY_TTL_SECONDS = 300
+
+_vocabulary_lock = threading.Lock()
+_vocabulary = {"expires": 0.0, "entries": ()}
+
+
+def _load_vocabulary():
+    entries = [
+        {"type": "state", "id": state_id, "label": name}
+        for state_id, name in State.objects.values_list("id", "name")
+    ]
+    entries.extend(
+        {
+            "type": "lga",
+            "id": lga_id,
+            "label": f"{name}, {state_name}",
+            "state": state_id,
+        }
+        for lga_id, name, state_id, state_name in LGA.objects.values_list(
+            "id",
+            "name",
+            "state_id",
+            "state__name",
+        )
+    )
+    entries.extend(
+        {"type": "category", "id": category_id, "label": name, "slug": slug}
+        for category_id, name, slug in Category.objects.values_list(
+            "id",
+            "name",
+            "slug",
+        )
+    )
+    return tuple((entry["label"].lower(), entry) for entry in entries)
+
+
+def location_vocabulary():
+    """
+    States, LGAs and categories, cached per process for a few minutes.
+
+    The whole vocabulary is a few thousand rows, so matching it in memory is
+    cheaper than a query per keystroke.
+    """
+    now = time.monotonic()
+    if _vocabulary["expires"] > now:
+        return _vocabulary["entries"]
+    with _vocabulary_lock:
+        if _vocabulary["expires"] <= now:
+            _vocabulary["entries"] = _load_vocabulary()
+            _vocabulary["expires"] = now + VOCABULARY_TTL_SECONDS
+    return _vocabulary["entries"]
+
+
+def clear_location_vocabulary():
+    _vocabulary["expires"] = 0.0
+
+
+def _vocabulary_suggestions(term, limit):
+    # word-prefix matches first, then plain substring matches
+    prefix, contains = [], []
+    for label, entry in location_vocabulary():
+        if label.startswith(term) or f" {term}" in label:
+            prefix.append(entry)
+        elif term in label:
+            contains.append(entry)
+    return (prefix + contains)[:limit]
+
+
+def _listing_suggestions(term, limit):
+    # only the trigram operator filters, so the gin_trgm_ops index on title
+    # serves the lookup; prefix hits are merely ranked first among its rows
+    rows = (
+        Listing.objects.active()
+        .filter(title__trigram_word_similar=term)
+        .annotate(
+            prefix=Case(
+                When(title__istartswith=term, then=True),
+                default=False,
+                output_field=BooleanField(),
+            ),
+            similarity=TrigramWordSimilarity(term, "title"),
+        )
+        .order_by("-prefix", "-similarity", "-created")
+        .values("id", "title", "slug")[:limit]
+    )
+    return [
+        {"type": "listing", "id": row["id"], "label": row["title"], "slug": row["slug"]}
+        for row in rows
+    ]
+
+
+def autocomplete(query, *, limit=8):
+    term = " ".join((query or "").split()).lower()
+    if len(term) < MIN_QUERY_LENGTH:
+        return []
+    # locations and categories take at most half the slots unless listing
+    # titles leave room for more
+    places = _vocabulary_suggestions(term, limit)
+    listings = _listing_suggestions(term, limit - min(len(places), limit // 2))
+    return places[: limit - len(listings)] + listings
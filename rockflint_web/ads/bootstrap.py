@@ -0,0 +1,74 @@
+import hashlib
+import json
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from rockflint_web.ads.models import LGA
+from rockflint_web.ads.models import Category
+from rockflint_web.ads.models import Feature
+from rockflint_web.ads.models import Offer
+from rockflint_web.ads.models import State
+
+LOOKUP_VERSION_KEY = "ads:lookups:version"
+
+_payload_lock = threading.Lock()
+_payload = {"version": None, "data": None, "digest": None}
+
+
+def lookup_version():
+    """Opaque token shared by all workers; replaced whenever lookups change."""
+    version = cache.get(LOOKUP_VERSION_KEY)
+    if version is None:
+        cache.add(LOOKUP_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(LOOKUP_VERSION_KEY)
+    return version
+
+
+def bump_lookup_version():
+    transaction.on_commit(lambda: cache.delete(LOOKUP_VERSION_KEY))
+
+
+def build_bootstrap_data():
+    lgas_by_state = {}
+    for lga_id, name, state_id in LGA.objects.order_by("name").values_list(
+        "id",
+        "name",
+        "state_id",
+    ):
+        lgas_by_state.setdefault(state_id, []).append({"id": lga_id, "name": name})
+    return {
+        "states": [
+            {"id": state_id, "name": name, "lgas": lgas_by_state.get(state_id, [])}
+            for state_id, name in State.objects.order_by("name").values_list(
+                "id",
+                "name",
+            )
+        ],
+        "categories": list(Category.objects.values("id", "name", "slug")),
+        "offers": list(Offer.objects.order_by("name").values("id", "name", "slug")),
+        "features": list(
+            Feature.objects.order_by("name").values("id", "name", "icon"),
+        ),
+    }
+
+
+def bootstrap_payload():
+    """
+    (data, digest) of all reference data, memoized per process until the
+    shared lookup version changes. ``digest`` hashes the content itself.
+    """
+    version = lookup_version()
+    if _payload["version"] == version and version is not None:
+        return _payload["data"], _payload["digest"]
+    with _payload_lock:
+        if _payload["version"] != version or version is None:
+            data = build_bootstrap_data()
+            encoded = json.dumps(data, sort_keys=True, separators=(",", ":"))
+            digest = hashlib.sha1(encoded.encode()).hexdigest()  # noqa: S324
+            _payload["data"] = data
+            _payload["digest"] = digest
+            _payload["version"] = version
+        return _payload["data"], _payload["digest"]
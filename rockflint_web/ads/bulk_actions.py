@@ -0,0 +1,87 @@
+"""
+Set-based changes to many listings of one vendor at once.
+
+Ownership of the whole batch is checked (and the rows locked) with one
+query; the change itself is one UPDATE, followed by a single search
+document refresh, cache bump and tile invalidation for the batch.
+"""
+
+from decimal import ROUND_HALF_UP
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from rockflint_web.ads.cache import bump_listing_cache_generation
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import listing_price_limit
+from rockflint_web.ads.search_documents import schedule_search_document_refresh
+from rockflint_web.ads.tiles import invalidate_tiles
+
+BULK_OPERATIONS = ("activate", "deactivate", "set_price", "adjust_price", "delete")
+BULK_MAX_LISTINGS = 500
+
+
+class PriceOutOfRangeError(ValueError):
+    """An adjusted price would not fit in ``Listing.price``."""
+
+
+class ListingsNotOwnedError(ValueError):
+    """Some of the requested listings do not exist or belong to someone else."""
+
+    def __init__(self, listing_ids):
+        super().__init__(listing_ids)
+        self.listing_ids = listing_ids
+
+
+def _factor(percent):
+    return 1 + Decimal(percent) / 100
+
+
+def _changes(operation, price, percent):
+    if operation in ("activate", "deactivate"):
+        return {"active": operation == "activate"}
+    if operation == "set_price":
+        return {"price": price}
+    return {"price": Round(F("price") * _factor(percent), 2)}
+
+
+def bulk_update_listings(vendor, listing_ids, operation, *, price=None, percent=None):
+    """
+    Apply ``operation`` to ``listing_ids``, all or nothing. Raises
+    ListingsNotOwnedError (and changes nothing) unless every id is a listing of
+    ``vendor``, and PriceOutOfRangeError when an adjusted price would overflow
+    the column. Returns the number of listings changed.
+    """
+    with transaction.atomic():
+        rows = list(
+            Listing.objects.select_for_update()
+            .filter(pk__in=listing_ids, vendor=vendor)
+            .values_list("pk", "location", "price"),
+        )
+        owned = {pk: location for pk, location, _ in rows}
+        missing = sorted(set(listing_ids) - set(owned))
+        if missing:
+            raise ListingsNotOwnedError(missing)
+        if operation == "adjust_price":
+            # checked on the locked rows, so the UPDATE cannot overflow
+            highest = max(price for _, _, price in rows) * _factor(percent)
+            rounded = highest.quantize(Decimal("0.01"), ROUND_HALF_UP)
+            if rounded >= listing_price_limit():
+                raise PriceOutOfRangeError(highest)
+        listings = Listing.objects.filter(pk__in=owned)
+        if operation == "delete":
+            # the collector deletes dependent rows table by table; the
+            # post_delete receivers take care of caches and tiles
+            listings.delete()
+            return len(owned)
+        changed = listings.update(
+            **_changes(operation, price, percent),
+            updated=timezone.now(),
+        )
+        schedule_search_document_refresh(owned)
+        bump_listing_cache_generation()
+        invalidate_tiles(owned.values())
+    return changed
@@ -0,0 +1,48 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+
+LISTING_GENERATION_KEY = "ads:listings:generation"
+LISTING_RESPONSE_TIMEOUT = 60 * 60
+
+
+def listing_cache_generation():
+    generation = cache.get(LISTING_GENERATION_KEY)
+    if generation is None:
+        cache.add(LISTING_GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(LISTING_GENERATION_KEY, 1)
+    return generation
+
+
+def _bump_generation():
+    try:
+        cache.incr(LISTING_GENERATION_KEY)
+    except ValueError:
+        cache.add(LISTING_GENERATION_KEY, 2, timeout=None)
+
+
+def bump_listing_cache_generation():
+    """
+    Invalidate every cached listing response once the current transaction
+    commits, so no request can re-cache pre-commit data under the new
+    generation.
+    """
+    transaction.on_commit(_bump_generation)
+
+
+def normalized_query_string(query_params):
+    items = sorted(
+        (key, value)
+        for key, values in query_params.lists()
+        for value in values
+        if value != ""
+    )
+    return urlencode(items)
+
+
+def listing_response_cache_key(request, namespace="list"):
+    source = f"{request.get_host()}?{normalized_query_string(request.query_params)}"
+    digest = hashlib.sha1(source.encode()).hexdigest()  # noqa: S324
+    return f"ads:listings:{namespace}:{listing_cache_generation()}:{digest}"
@@ -0,0 +1,121 @@
+from django.contrib.gis.db.models import Collect
+from django.contrib.gis.db.models.functions import Centroid
+from django.contrib.gis.db.models.functions import SnapToGrid
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.geos import Polygon
+from django.db.models import Count
+from django.db.models import Max
+from django.db.models import Min
+
+from rockflint_web.ads.geo import GEOGRAPHY_SRID
+from rockflint_web.ads.geo import WEB_MERCATOR_MAX_LATITUDE
+from rockflint_web.ads.geo import WEB_MERCATOR_SRID
+from rockflint_web.ads.geo import tile_size_metres
+
+MAX_ZOOM = 22
+# grid cells per tile edge; 8 gives 32px cells on 256px tiles
+CELLS_PER_TILE = 8
+# bounding boxes holding at most this many listings come back as points
+POINT_THRESHOLD = 200
+
+
+class InvalidBoundingBoxError(ValueError):
+    pass
+
+
+def parse_bbox(value):
+    """
+    ``min_lng,min_lat,max_lng,max_lat`` into a Polygon (SRID 4326), with the
+    latitudes clamped to the Web Mercator world square.
+    """
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(","))
+    except (AttributeError, ValueError) as exc:
+        msg = "bbox must be min_lng,min_lat,max_lng,max_lat."
+        raise InvalidBoundingBoxError(msg) from exc
+    min_lat = max(min_lat, -WEB_MERCATOR_MAX_LATITUDE)
+    max_lat = min(max_lat, WEB_MERCATOR_MAX_LATITUDE)
+    if not (-180 <= min_lng < max_lng <= 180 and min_lat < max_lat):
+        msg = "bbox is empty or outside -180,-90,180,90."
+        raise InvalidBoundingBoxError(msg)
+    bbox = Polygon.from_bbox((min_lng, min_lat, max_lng, max_lat))
+    bbox.srid = GEOGRAPHY_SRID
+    return bbox
+
+
+def cell_size(zoom):
+    return tile_size_metres(zoom) / CELLS_PER_TILE
+
+
+def _point(listing):
+    return {
+        "id": listing["id"],
+        "slug": listing["slug"],
+        "title": listing["title"],
+        "price": listing["price"],
+        "latitude": listing["location"].y,
+        "longitude": listing["location"].x,
+    }
+
+
+def _points(queryset):
+    rows = queryset.order_by("id").values("id", "slug", "title", "price", "location")
+    return [_point(row) for row in rows]
+
+
+def cluster_listings(queryset, bbox, zoom):
+    """
+    Group the located listings of ``queryset`` inside ``bbox`` into a
+    Web Mercator grid aligned with the XYZ tiles of ``zoom``.
+
+    Cells never straddle a tile edge, so a tile-sized bbox always yields the
+    same cells and the response can be cached per tile. Sparse boxes (at most
+    ``POINT_THRESHOLD`` listings) and single-listing cells are returned as
+    points instead of clusters.
+    """
+    queryset = queryset.order_by().filter(
+        location__isnull=False,
+        location__intersects=bbox,
+    )
+    size = cell_size(zoom)
+    cells = list(
+        queryset.annotate(
+            # snapping to cell centres (a half-cell origin) makes every cell
+            # the square [k * size, (k + 1) * size); snapping to the grid
+            # lines themselves would centre cells on the tile edges
+            cell=SnapToGrid(
+                Transform("location", WEB_MERCATOR_SRID),
+                size,
+                size,
+                size / 2,
+                size / 2,
+            ),
+        )
+        .values("cell")
+        .annotate(
+            count=Count("id"),
+            first_id=Min("id"),
+            centroid=Centroid(Collect("location")),
+            min_price=Min("price"),
+            max_price=Max("price"),
+        )
+        .order_by("-count", "first_id"),
+    )
+    total = sum(cell["count"] for cell in cells)
+    if total <= POINT_THRESHOLD:
+        return {"count": total, "clusters": [], "points": _points(queryset)}
+
+    clusters = [
+        {
+            "count": cell["count"],
+            "latitude": cell["centroid"].y,
+            "longitude": cell["centroid"].x,
+            "min_price": cell["min_price"],
+            "max_price": cell["max_price"],
+        }
+        for cell in cells
+        if cell["count"] > 1
+    ]
+    singles = [cell["first_id"] for cell in cells if cell["count"] == 1]
+    points = _points(queryset.filter(pk__in=singles)) if singles else []
+    return {"count": total, "clusters": clusters, "points": points}
@@ -0,0 +1,138 @@
+"""
+Item-to-item collaborative filtering over ``Favorite``.
+
+The listing x listing co-occurrence matrix is never materialized: the
+favorites are copied once into temporary tables, then each chunk of source
+listings has its co-favorite counts aggregated, scored and cut to the top
+``NEIGHBORS_PER_LISTING`` inside PostgreSQL. Memory use is bounded by the
+chunk size whatever the number of favorites.
+"""
+
+from django.db import connection
+from django.db import transaction
+
+from rockflint_web.ads.models import Favorite
+from rockflint_web.ads.models import FavoriteNeighbor
+
+NEIGHBORS_PER_LISTING = 20
+NEIGHBOR_CHUNK_SIZE = 1000
+# pairs saved together by fewer users are noise
+MIN_CO_FAVORITES = 2
+# users saving more than this many listings add quadratic pairs but little
+# signal, so they are left out of the co-occurrence counts
+MAX_USER_FAVORITES = 500
+
+PREPARE_SQL = [
+    # only left over when an enclosing transaction ran the rebuild before
+    "DROP TABLE IF EXISTS co_favorite_items, co_favorite_saves",
+    """
+    CREATE TEMPORARY TABLE co_favorite_items ON COMMIT DROP AS
+    SELECT favorite.user_id, favorite.listing_id
+    FROM {favorite_table} AS favorite
+    WHERE favorite.user_id IN (
+        SELECT user_id FROM {favorite_table}
+        GROUP BY user_id
+        HAVING COUNT(*) BETWEEN 2 AND {max_user_favorites:d}
+    )
+    """,
+    "CREATE INDEX ON co_favorite_items (user_id, listing_id)",
+    "CREATE INDEX ON co_favorite_items (listing_id, user_id)",
+    """
+    CREATE TEMPORARY TABLE co_favorite_saves ON COMMIT DROP AS
+    SELECT listing_id, COUNT(*) AS saves
+    FROM co_favorite_items
+    GROUP BY listing_id
+    """,
+    "CREATE UNIQUE INDEX ON co_favorite_saves (listing_id)",
+    "ANALYZE co_favorite_items",
+    "ANALYZE co_favorite_saves",
+]
+
+NEXT_CHUNK_SQL = """
+SELECT listing_id FROM co_favorite_saves
+WHERE listing_id > %s
+ORDER BY listing_id
+LIMIT %s
+"""
+
+NEIGHBORS_SQL = """
+INSERT INTO {neighbor_table} (listing_id, neighbor_id, co_count, score, rank)
+SELECT listing_id, neighbor_id, co_count, score, rank
+FROM (
+    SELECT
+        source.listing_id,
+        other.listing_id AS neighbor_id,
+        COUNT(*) AS co_count,
+        COUNT(*) / sqrt(source_saves.saves * other_saves.saves) AS score,
+        row_number() OVER (
+            PARTITION BY source.listing_id
+            ORDER BY
+                COUNT(*) / sqrt(source_saves.saves * other_saves.saves) DESC,
+                other.listing_id DESC
+        ) AS rank
+    FROM co_favorite_items AS source
+    JOIN co_favorite_items AS other
+        ON other.user_id = source.user_id
+        AND other.listing_id <> source.listing_id
+    JOIN co_favorite_saves AS source_saves
+        ON source_saves.listing_id = source.listing_id
+    JOIN co_favorite_saves AS other_saves
+        ON other_saves.listing_id = other.listing_id
+    WHERE source.listing_id BETWEEN %(first)s AND %(last)s
+    GROUP BY
+        source.listing_id,
+        other.listing_id,
+        source_saves.saves,
+        other_saves.saves
+    HAVING COUNT(*) >= %(min_co_favorites)s
+) AS ranked
+WHERE rank <= %(neighbors)s
+"""
+
+
+def rebuild_favorite_neighbors():
+    """
+    Replace every FavoriteNeighbor row in one transaction, so readers switch
+    from the old neighbours to the new ones atomically. Returns the number of
+    rows written.
+    """
+    quote = connection.ops.quote_name
+    favorite_table = quote(Favorite._meta.db_table)
+    neighbor_table = quote(FavoriteNeighbor._meta.db_table)
+    written = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for statement in PREPARE_SQL:
+            cursor.execute(
+                statement.format(
+                    favorite_table=favorite_table,
+                    max_user_favorites=MAX_USER_FAVORITES,
+                ),
+            )
+        FavoriteNeighbor.objects.all().delete()
+        last = 0
+        while True:
+            cursor.execute(NEXT_CHUNK_SQL, [last, NEIGHBOR_CHUNK_SIZE])
+            chunk = [row[0] for row in cursor.fetchall()]
+            if not chunk:
+                break
+            cursor.execute(
+                NEIGHBORS_SQL.format(neighbor_table=neighbor_table),
+                {
+                    "first": chunk[0],
+                    "last": chunk[-1],
+                    "min_co_favorites": MIN_CO_FAVORITES,
+                    "neighbors": NEIGHBORS_PER_LISTING,
+                },
+            )
+            written += cursor.rowcount
+            last = chunk[-1]
+    return written
+
+
+def favorite_neighbor_ids(listing, *, limit=6):
+    """Ids of the active listings most often saved together with ``listing``."""
+    return list(
+        FavoriteNeighbor.objects.filter(listing=listing, neighbor__active=True)
+        .order_by("rank")
+        .values_list("neighbor_id", flat=True)[:limit],
+    )
@@ -0,0 +1,101 @@
+from django.db import connection
+
+# lower bounds of the price facet buckets; the last bucket is open-ended
+PRICE_FACET_BOUNDS = [
+    0,
+    100_000,
+    250_000,
+    500_000,
+    1_000_000,
+    2_500_000,
+    5_000_000,
+    10_000_000,
+    25_000_000,
+    50_000_000,
+    100_000_000,
+]
+
+# facet name -> column of the inner query
+FACET_COLUMNS = {
+    "category": "category_id",
+    "offer": "offer_id",
+    "state": "state_id",
+    "lga": "lga_id",
+    "bedrooms": "bedrooms",
+    "price": "price_bucket",
+}
+
+_columns = ", ".join(FACET_COLUMNS.values())
+_grouping_sets = ", ".join(f"({column})" for column in FACET_COLUMNS.values())
+
+FACET_SQL = f"""
+SELECT {_columns}, GROUPING({_columns}) AS grouping_id, COUNT(*) AS count
+FROM (
+    SELECT
+        listing.category_id,
+        listing.offer_id,
+        listing.state_id,
+        listing.lga_id,
+        listing.bedrooms,
+        width_bucket(listing.price, %s::numeric[]) AS price_bucket
+    FROM ({{listings}}) AS listing
+) AS facet_source
+GROUP BY GROUPING SETS ({_grouping_sets}, ())
+"""  # noqa: S608
+
+
+def _grouping_id(facet_index):
+    """GROUPING() bitmask of the rows grouped by the ``facet_index``-th column."""
+    width = len(FACET_COLUMNS)
+    return ((1 << width) - 1) ^ (1 << (width - 1 - facet_index))
+
+
+def _price_bucket(bucket):
+    upper = bucket if bucket < len(PRICE_FACET_BOUNDS) else None
+    return {
+        "min": PRICE_FACET_BOUNDS[bucket - 1],
+        "max": PRICE_FACET_BOUNDS[upper] if upper is not None else None,
+    }
+
+
+def listing_facets(queryset):
+    """
+    Counts per category, offer, state, LGA, bedroom count and price bucket
+    for ``queryset``, from one ``GROUPING SETS`` scan of the filtered rows.
+    """
+    listings = queryset.order_by().values(
+        "category_id",
+        "offer_id",
+        "state_id",
+        "lga_id",
+        "bedrooms",
+        "price",
+    )
+    sql, params = listings.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(FACET_SQL.format(listings=sql), [PRICE_FACET_BOUNDS, *params])
+        rows = cursor.fetchall()
+
+    names = list(FACET_COLUMNS)
+    by_grouping = {_grouping_id(index): name for index, name in enumerate(names)}
+    facets = {name: [] for name in names}
+    total = 0
+    for row in rows:
+        *values, grouping_id, count = row
+        name = by_grouping.get(grouping_id)
+        if name is None:
+            total = count  # the () grouping set
+            continue
+        value = values[names.index(name)]
+        if value is None or (name == "price" and value == 0):
+            continue
+        if name == "price":
+            facets[name].append({**_price_bucket(value), "count": count})
+        else:
+            facets[name].append({"value": value, "count": count})
+    for name, buckets in facets.items():
+        if name == "price":
+            buckets.sort(key=lambda bucket: bucket["min"])
+        else:
+            buckets.sort(key=lambda bucket: (-bucket["count"], bucket["value"]))
+    return {"count": total, "facets": facets}
@@ -0,0 +1,47 @@
+from django.contrib.gis.db.models import PointField
+from django.db.models import FloatField
+from django.db.models import Func
+from django.db.models import Value
+from django.db.models.functions import Cast
+
+GEOGRAPHY_SRID = 4326
+
+
+def geography_field():
+    return PointField(geography=True, srid=GEOGRAPHY_SRID)
+
+
+def location_geography(field="location"):
+    """
+    ``location::geography``. Listing has a GiST index on exactly this
+    expression, so ST_DWithin and ``<->`` against it are index-assisted.
+    """
+    return Cast(field, output_field=geography_field())
+
+
+def geography_value(point):
+    return Value(point, output_field=geography_field())
+
+
+class KNNDistance(Func):
+    """``a <-> b``: spheroid distance in metres, KNN-orderable through GiST."""
+
+    arg_joiner = " <-> "
+    template = "(%(expressions)s)"
+    output_field = FloatField()
+
+
+def distance_from(point, field="location"):
+    return KNNDistance(location_geography(field), geography_value(point))
+
+
+WEB_MERCATOR_SRID = 3857
+# half the width of the EPSG:3857 world square, in metres
+WEB_MERCATOR_EXTENT = 20037508.342789244
+# the latitude at which the Web Mercator world square ends
+WEB_MERCATOR_MAX_LATITUDE = 85.0511287798066
+
+
+def tile_size_metres(zoom):
+    """Edge length of one XYZ tile at ``zoom``, in EPSG:3857 metres."""
+    return 2 * WEB_MERCATOR_EXTENT / (2**zoom)
@@ -0,0 +1,168 @@
+"""
+Resized derivatives of listing images.
+
+Uploads are served as sent, often multi-megabyte phone photos. After each
+upload ``generate_image_variants`` (run by a Celery task) decodes the image
+once, downscales it step by step to the ``IMAGE_VARIANTS`` widths and stores
+a WebP and a JPEG copy of each next to the original. Their storage names and
+dimensions are kept on ``ListingImage.variants``, from which the serializers
+build ``srcset`` strings so list pages fetch a thumbnail of a few kilobytes.
+"""
+
+import io
+import logging
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image
+from PIL import ImageOps
+
+from rockflint_web.ads.cache import bump_listing_cache_generation
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import ListingImage
+from rockflint_web.ads.search_documents import schedule_search_document_refresh
+
+logger = logging.getLogger(__name__)
+
+# (name, width in pixels), smallest first; sources are never upscaled
+IMAGE_VARIANTS = (("thumbnail", 320), ("card", 640), ("full", 1600))
+# (key, Pillow format, save options); WebP first, as browsers should prefer it
+VARIANT_FORMATS = (
+    ("webp", "WEBP", {"quality": 75, "method": 4}),
+    ("jpeg", "JPEG", {"quality": 80, "optimize": True, "progressive": True}),
+)
+VARIANT_DIRECTORY = "listings/variants"
+# background for transparent uploads, JPEG has no alpha channel
+MATTE_COLOR = (255, 255, 255)
+
+
+def _rgb(image):
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        matte = Image.new("RGB", image.size, MATTE_COLOR)
+        matte.paste(image, mask=image.getchannel("A"))
+        return matte
+    return image.convert("RGB")
+
+
+def _scaled_size(size, width):
+    width = min(width, size[0])
+    return width, max(1, round(size[1] * width / size[0]))
+
+
+def render_variants(stream):
+    """
+    ``{name: (image, width, height)}`` for the ``IMAGE_VARIANTS`` of the
+    image in ``stream``, honouring its EXIF orientation.
+    """
+    with Image.open(stream) as source:
+        # let the JPEG decoder skip detail the largest variant cannot show
+        largest = max(width for _, width in IMAGE_VARIANTS)
+        source.draft("RGB", (largest, largest))
+        image = _rgb(ImageOps.exif_transpose(source))
+    rendered = {}
+    # each variant is downscaled from the next larger one, not the original
+    for name, width in reversed(IMAGE_VARIANTS):
+        size = _scaled_size(image.size, width)
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        rendered[name] = (image, *size)
+    return rendered
+
+
+def encode(image, pillow_format, options):
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def variant_names(variants):
+    return [
+        variant[fmt]
+        for variant in variants.values()
+        for fmt, _, _ in VARIANT_FORMATS
+        if variant.get(fmt)
+    ]
+
+
+def delete_variant_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def _store_variants(listing_image, rendered):
+    storage = listing_image.image.storage
+    # named after the upload, so a replaced image never reuses cached URLs
+    stem = PurePosixPath(listing_image.image.name).stem
+    directory = f"{VARIANT_DIRECTORY}/{listing_image.pk}"
+    variants = {}
+    for name, (image, width, height) in rendered.items():
+        variant = {"width": width, "height": height}
+        for fmt, pillow_format, options in VARIANT_FORMATS:
+            variant[fmt] = storage.save(
+                f"{directory}/{stem}-{name}.{fmt}",
+                ContentFile(encode(image, pillow_format, options)),
+            )
+        variants[name] = variant
+    return variants
+
+
+def generate_image_variants(image_id):
+    """
+    Build and store the variants of one ListingImage. Returns the number of
+    variants stored; 0 when the image is gone, unreadable or replaced while
+    its variants were being built.
+    """
+    listing_image = ListingImage.objects.filter(pk=image_id).first()
+    if listing_image is None or not listing_image.image:
+        return 0
+    source = listing_image.image.name
+    try:
+        with listing_image.image.open("rb") as stream:
+            rendered = render_variants(stream)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning("Cannot build variants of listing image %s", image_id)
+        return 0
+    variants = _store_variants(listing_image, rendered)
+    storage = listing_image.image.storage
+    # conditional on the upload, so a replacement racing this task keeps the
+    # variants its own task builds
+    stored = ListingImage.objects.filter(pk=image_id, image=source).update(
+        variants=variants,
+        variants_source=source,
+    )
+    if not stored:
+        delete_variant_files(storage, variant_names(variants))
+        return 0
+    current = set(variant_names(variants))
+    delete_variant_files(
+        storage,
+        [name for name in variant_names(listing_image.variants) if name not in current],
+    )
+    # the update skips the signals: refresh what embeds the image URLs
+    Listing.objects.filter(pk=listing_image.listing_id).update(updated=timezone.now())
+    schedule_search_document_refresh([listing_image.listing_id])
+    bump_listing_cache_generation()
+    return len(variants)
+
+
+def srcset(variants, fmt, url):
+    """
+    The ``srcset`` string of ``variants`` in ``fmt``, ``url`` turning storage
+    names into URLs; widths repeated by small sources are listed once.
+    """
+    candidates = {}
+    for variant in sorted(variants.values(), key=lambda variant: variant["width"]):
+        if variant.get(fmt):
+            candidates.setdefault(variant["width"], url(variant[fmt]))
+    return ", ".join(f"{target} {width}w" for width, target in candidates.items())
+
+
+def variant_srcsets(variants, url):
+    """``{fmt: srcset}`` for every format, or None before variants exist."""
+    if not variants:
+        return None
+    return {fmt: srcset(variants, fmt, url) for fmt, _, _ in VARIANT_FORMATS}
@@ -0,0 +1,516 @@
+"""
+Bulk listing import for agency inventories.
+
+Rows are streamed from CSV or NDJSON and validated in chunks against
+in-memory lookup maps (category, offer, state, LGA and feature names, slugs
+or ids), so validation issues no queries. Valid rows are written with
+``COPY`` into a temporary staging table, then merged into ``ads_listing``
+and its feature table with two set-based INSERTs in the same transaction.
+Invalid rows are skipped and reported with their row number.
+"""
+
+import codecs
+import csv
+import json
+import math
+from decimal import ROUND_HALF_UP
+from decimal import Decimal
+from decimal import InvalidOperation
+from itertools import batched
+
+from django.db import connection
+from django.db import transaction
+
+from rockflint_web.ads.cache import bump_listing_cache_generation
+from rockflint_web.ads.models import LGA
+from rockflint_web.ads.models import SLUG_SAVE_ATTEMPTS
+from rockflint_web.ads.models import Category
+from rockflint_web.ads.models import Feature
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import Offer
+from rockflint_web.ads.models import State
+from rockflint_web.ads.models import listing_price_limit
+from rockflint_web.ads.models import next_free_slug
+from rockflint_web.ads.models import slug_base
+from rockflint_web.ads.search_documents import schedule_search_document_refresh
+from rockflint_web.ads.tiles import invalidate_listing_tiles
+from rockflint_web.users.models import Vendor
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_CHUNK_SIZE = 1000
+# rows beyond this many failures are counted but not itemized
+MAX_REPORTED_ERRORS = 1000
+MAX_SMALL_INTEGER = 32767
+SLUG_MAX_LENGTH = 255
+# CSV cells listing several features separate them with this
+FEATURE_SEPARATOR = "|"
+
+STAGING_COLUMNS = (
+    "row_number",
+    "title",
+    "slug",
+    "description",
+    "price",
+    "rent_period",
+    "bedrooms",
+    "bathrooms",
+    "area",
+    "building_age_years",
+    "attributes",
+    "category_id",
+    "offer_id",
+    "state_id",
+    "lga_id",
+    "address",
+    "location",
+    "feature_ids",
+)
+
+PREPARE_SQL = [
+    # only left over when an enclosing transaction ran an import before
+    "DROP TABLE IF EXISTS listing_import_rows",
+    """
+    CREATE TEMPORARY TABLE listing_import_rows (
+        row_number integer NOT NULL,
+        title text NOT NULL,
+        slug text NOT NULL,
+        description text,
+        price numeric(14, 2) NOT NULL,
+        rent_period text,
+        bedrooms smallint,
+        bathrooms smallint,
+        area double precision,
+        building_age_years smallint,
+        attributes jsonb NOT NULL,
+        category_id bigint NOT NULL,
+        offer_id bigint NOT NULL,
+        state_id bigint NOT NULL,
+        lga_id bigint NOT NULL,
+        address text,
+        location geometry(Point, 4326),
+        feature_ids bigint[] NOT NULL,
+        listing_id bigint
+    ) ON COMMIT DROP
+    """,
+]
+
+COPY_SQL = "COPY listing_import_rows ({columns}) FROM STDIN"
+
+# rows whose slug was taken meanwhile by a listing saved outside the import
+# are skipped here, given a new slug and merged again
+MERGE_LISTINGS_SQL = """
+WITH inserted AS (
+    INSERT INTO {listing_table} (
+        vendor_id, title, slug, description, price, rent_period, bedrooms,
+        bathrooms, area, building_age_years, attributes, category_id,
+        offer_id, state_id, lga_id, address, location, primary_image_path,
+        active, promotion_rank, created, updated
+    )
+    SELECT
+        %s, title, slug, description, price, rent_period, bedrooms,
+        bathrooms, area, building_age_years, attributes, category_id,
+        offer_id, state_id, lga_id, address, location, '', true, 0, now(),
+        now()
+    FROM listing_import_rows
+    WHERE listing_id IS NULL
+    ORDER BY row_number
+    ON CONFLICT (vendor_id, slug) DO NOTHING
+    RETURNING id, slug
+)
+UPDATE listing_import_rows AS staged
+SET listing_id = inserted.id
+FROM inserted
+WHERE staged.slug = inserted.slug AND staged.listing_id IS NULL
+RETURNING staged.listing_id
+"""
+
+CONFLICTED_SQL = """
+SELECT row_number, title FROM listing_import_rows
+WHERE listing_id IS NULL
+ORDER BY row_number
+"""
+
+RESLUG_SQL = "UPDATE listing_import_rows SET slug = %s WHERE row_number = %s"
+
+MERGE_FEATURES_SQL = """
+INSERT INTO {feature_table} (listing_id, feature_id)
+SELECT DISTINCT staged.listing_id, feature.id
+FROM listing_import_rows AS staged
+CROSS JOIN LATERAL unnest(staged.feature_ids) AS feature(id)
+WHERE staged.listing_id IS NOT NULL
+"""
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be read as the requested format at all."""
+
+
+def import_format(name, content_type=""):
+    """Guess ``csv`` or ``ndjson`` from a file name or content type."""
+    name = (name or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type:
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    return None
+
+
+def _text_lines(stream):
+    # decode incrementally so the file is never read whole
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in stream:
+        pending += decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _csv_rows(stream):
+    reader = csv.DictReader(_text_lines(stream))
+    try:
+        for row_number, row in enumerate(reader, start=1):
+            # extra cells land under None, missing ones are None
+            yield (
+                row_number,
+                {
+                    key.strip().lower(): value
+                    for key, value in row.items()
+                    if key is not None and value is not None
+                },
+            )
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ImportFormatError(str(exc)) from exc
+
+
+def _ndjson_rows(stream):
+    row_number = 0
+    try:
+        for line in _text_lines(stream):
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row_number, row if isinstance(row, dict) else None
+    except UnicodeDecodeError as exc:
+        raise ImportFormatError(str(exc)) from exc
+
+
+def read_rows(stream, fmt):
+    """(row_number, dict or None) pairs; None marks an unparseable row."""
+    if fmt == "csv":
+        return _csv_rows(stream)
+    if fmt == "ndjson":
+        return _ndjson_rows(stream)
+    msg = f"Unknown import format {fmt!r}; use one of {', '.join(IMPORT_FORMATS)}."
+    raise ImportFormatError(msg)
+
+
+def _keyed(rows):
+    """{id, lowercased name, lowercased slug: row[0]} for (pk, *names) rows."""
+    mapping = {}
+    for pk, *names in rows:
+        mapping[str(pk)] = pk
+        for name in names:
+            if name:
+                mapping.setdefault(name.strip().lower(), pk)
+    return mapping
+
+
+class LookupMaps:
+    """Reference data resolved by id, name or slug without further queries."""
+
+    def __init__(self):
+        self.category = _keyed(Category.objects.values_list("pk", "name", "slug"))
+        self.offer = _keyed(Offer.objects.values_list("pk", "name", "slug"))
+        self.state = _keyed(State.objects.values_list("pk", "name"))
+        self.feature = _keyed(Feature.objects.values_list("pk", "name"))
+        # LGA names repeat across states, so they resolve per state
+        self.lga = {}
+        for pk, name, state_id in LGA.objects.values_list("pk", "name", "state_id"):
+            self.lga[(state_id, str(pk))] = pk
+            self.lga.setdefault((state_id, name.strip().lower()), pk)
+
+    def resolve(self, field, value):
+        return getattr(self, field).get(str(value).strip().lower())
+
+
+class InvalidRowError(ValueError):
+    """Carries the {field: message} errors of one input row."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _text(row, name, errors, *, max_length=None, required=False):
+    value = row.get(name)
+    if _blank(value):
+        if required:
+            errors[name] = "This field is required."
+        return None
+    value = str(value).strip()
+    if max_length and len(value) > max_length:
+        errors[name] = f"Ensure this field has no more than {max_length} characters."
+    return value
+
+
+def _number(row, name, errors, parse, *, minimum=0, maximum=None):  # noqa: PLR0913
+    value = row.get(name)
+    if _blank(value):
+        return None
+    try:
+        number = parse(str(value).strip())
+        # a signalling NaN raises here; a quiet one would pass every bound
+        valid = not math.isnan(number)
+    except (ValueError, InvalidOperation):
+        valid = False
+    if not valid:
+        errors[name] = "A valid number is required."
+        return None
+    too_large = maximum is not None and number > maximum
+    if not math.isfinite(number) or number < minimum or too_large:
+        errors[name] = "Value out of range."
+        return None
+    return number
+
+
+def _small_integer(value):
+    number = Decimal(value)
+    if number != number.to_integral_value():
+        raise ValueError(value)
+    return int(number)
+
+
+def _features(row, lookups, errors):
+    value = row.get("features")
+    if _blank(value):
+        return []
+    names = value if isinstance(value, list) else str(value).split(FEATURE_SEPARATOR)
+    feature_ids, unknown = [], []
+    for name in names:
+        if _blank(name):
+            continue
+        pk = lookups.resolve("feature", name)
+        if pk is None:
+            unknown.append(str(name).strip())
+        elif pk not in feature_ids:
+            feature_ids.append(pk)
+    if unknown:
+        errors["features"] = f"Unknown features: {', '.join(unknown)}."
+    return feature_ids
+
+
+def _attributes(row, errors):
+    value = row.get("attributes")
+    if _blank(value):
+        return "{}"
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = None
+    if not isinstance(value, dict):
+        errors["attributes"] = "Must be a JSON object."
+        return "{}"
+    return json.dumps(value)
+
+
+def _location(row, errors):
+    latitude = _number(row, "latitude", errors, float, minimum=-90, maximum=90)
+    longitude = _number(row, "longitude", errors, float, minimum=-180, maximum=180)
+    if "latitude" in errors or "longitude" in errors:
+        return None
+    if (latitude is None) != (longitude is None):
+        errors["location"] = "Both latitude and longitude are required."
+        return None
+    if latitude is None:
+        return None
+    return f"SRID=4326;POINT({longitude!r} {latitude!r})"
+
+
+def _price(row, errors):
+    price = _number(row, "price", errors, Decimal)
+    if price is not None:
+        limit = listing_price_limit()
+        # rounded before the check: 999999999999.995 becomes 10^12, which
+        # does not fit the column; far larger values are not rounded at all
+        if price < limit:
+            price = price.quantize(Decimal("0.01"), ROUND_HALF_UP)
+        if price < limit:
+            return price
+        errors["price"] = "Value out of range."
+        return None
+    if "price" not in errors:
+        errors["price"] = "This field is required."
+    return None
+
+
+def _lookup_ids(row, lookups, errors):
+    """``{category_id, offer_id, state_id, lga_id}`` resolved from names."""
+    ids = {}
+    for field in ["category", "offer", "state"]:
+        value = row.get(field)
+        ids[f"{field}_id"] = None
+        if _blank(value):
+            errors[field] = "This field is required."
+        else:
+            ids[f"{field}_id"] = lookups.resolve(field, value)
+            if ids[f"{field}_id"] is None:
+                errors[field] = f"Unknown {field} {str(value).strip()!r}."
+    lga = row.get("lga")
+    ids["lga_id"] = None
+    if _blank(lga):
+        errors["lga"] = "This field is required."
+    elif ids["state_id"] is not None:
+        ids["lga_id"] = lookups.lga.get((ids["state_id"], str(lga).strip().lower()))
+        if ids["lga_id"] is None:
+            errors["lga"] = f"Unknown LGA {str(lga).strip()!r} in this state."
+    return ids
+
+
+def clean_row(row, lookups):
+    """
+    The staging values of one input row, without ``row_number`` and ``slug``.
+    Raises InvalidRowError with a {field: message} dict.
+    """
+    if row is None:
+        raise InvalidRowError({"row": "Not a valid JSON object."})
+    errors = {}
+    values = {
+        "title": _text(row, "title", errors, max_length=255, required=True),
+        "description": _text(row, "description", errors),
+        "price": _price(row, errors),
+        "rent_period": _text(row, "rent_period", errors, max_length=20),
+        "address": _text(row, "address", errors, max_length=512),
+        "area": _number(row, "area", errors, float),
+        "attributes": _attributes(row, errors),
+        "location": _location(row, errors),
+        "feature_ids": _features(row, lookups, errors),
+    }
+    for name in ["bedrooms", "bathrooms", "building_age_years"]:
+        values[name] = _number(
+            row,
+            name,
+            errors,
+            _small_integer,
+            maximum=MAX_SMALL_INTEGER,
+        )
+    values.update(_lookup_ids(row, lookups, errors))
+    if errors:
+        raise InvalidRowError(errors)
+    return values
+
+
+class SlugAllocator:
+    """Vendor-unique slugs, numbered ``-2``, ``-3``... on collision."""
+
+    def __init__(self, taken):
+        self.taken = set(taken)
+
+    def reserve(self, slugs):
+        self.taken.update(slugs)
+
+    def allocate(self, title):
+        slug = next_free_slug(slug_base(title, SLUG_MAX_LENGTH, "listing"), self.taken)
+        self.taken.add(slug)
+        return slug
+
+
+def _report_failure(report, row_number, errors):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": row_number, "errors": errors})
+
+
+def _stage_rows(cursor, rows, lookups, slugs, report):
+    """COPY the valid rows into the staging table, reporting the others."""
+    copy_sql = COPY_SQL.format(columns=", ".join(STAGING_COLUMNS))
+    with cursor.copy(copy_sql) as copy:
+        for chunk in batched(rows, IMPORT_CHUNK_SIZE):
+            for row_number, row in chunk:
+                try:
+                    values = clean_row(row, lookups)
+                except InvalidRowError as exc:
+                    _report_failure(report, row_number, exc.errors)
+                    continue
+                values["row_number"] = row_number
+                values["slug"] = slugs.allocate(values["title"])
+                copy.write_row([values[column] for column in STAGING_COLUMNS])
+
+
+def _merge_listings(cursor, vendor, slugs, report):
+    """Insert the staged rows as listings; returns the new listing ids."""
+    merge_sql = MERGE_LISTINGS_SQL.format(
+        listing_table=connection.ops.quote_name(Listing._meta.db_table),
+    )
+    listing_ids = []
+    for attempt in range(1, SLUG_SAVE_ATTEMPTS + 1):
+        cursor.execute(merge_sql, [vendor.pk])
+        listing_ids += [row[0] for row in cursor.fetchall()]
+        cursor.execute(CONFLICTED_SQL)
+        conflicted = cursor.fetchall()
+        if not conflicted or attempt == SLUG_SAVE_ATTEMPTS:
+            break
+        slugs.reserve(
+            Listing.objects.filter(vendor=vendor).values_list("slug", flat=True),
+        )
+        cursor.executemany(
+            RESLUG_SQL,
+            [(slugs.allocate(title), number) for number, title in conflicted],
+        )
+    for row_number, _ in conflicted:
+        _report_failure(
+            report,
+            row_number,
+            {"slug": "Could not allocate a unique slug."},
+        )
+    cursor.execute(
+        MERGE_FEATURES_SQL.format(
+            feature_table=connection.ops.quote_name(
+                Listing.features.through._meta.db_table,
+            ),
+        ),
+    )
+    return listing_ids
+
+
+def import_listings(vendor, stream, fmt, *, dry_run=False):
+    """
+    Import every valid row of ``stream`` as an active listing of ``vendor``
+    in one transaction (rolled back with ``dry_run``). Returns
+    ``{imported, failed, errors}`` where ``errors`` itemizes up to
+    ``MAX_REPORTED_ERRORS`` failed rows as ``{row, errors}``.
+    """
+    rows = read_rows(stream, fmt)
+    report = {"imported": 0, "failed": 0, "errors": []}
+    with transaction.atomic(), connection.cursor() as cursor:
+        for statement in PREPARE_SQL:
+            cursor.execute(statement)
+        # serialize the imports of one vendor; listings saved concurrently
+        # through the API are handled by the ON CONFLICT merge
+        list(Vendor.objects.select_for_update().filter(pk=vendor.pk).values("pk"))
+        slugs = SlugAllocator(
+            Listing.objects.filter(vendor=vendor).values_list("slug", flat=True),
+        )
+        _stage_rows(cursor, rows, LookupMaps(), slugs, report)
+        listing_ids = _merge_listings(cursor, vendor, slugs, report)
+        report["imported"] = len(listing_ids)
+        if dry_run:
+            transaction.set_rollback(True)
+        elif listing_ids:
+            Listing.objects.filter(pk__in=listing_ids).update_search_vector()
+            schedule_search_document_refresh(listing_ids)
+            bump_listing_cache_generation()
+            invalidate_listing_tiles(listing_ids)
+    return report
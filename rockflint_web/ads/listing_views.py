@@ -0,0 +1,191 @@
+"""
+Listing view counting.
+
+Detail views only touch Redis: one pipeline holding a ``HINCRBY`` on the
+pending hash, a ``PFADD`` into the day's HyperLogLog of visitors and the
+trending score increments. ``flush_listing_views`` (a beat task) moves the
+pending deltas into ``ListingViewStat`` in batches.
+
+Only one flush runs at a time (``FLUSH_LOCK_KEY``), and replaying a batch is
+harmless: every claimed hash gets a token that the flush stamps on the rows
+it updates, so rows already carrying it are skipped when a crashed flush is
+finished by the next run.
+"""
+
+import hashlib
+import logging
+import uuid
+from datetime import date
+from datetime import timedelta
+from itertools import batched
+
+from django.db import connection
+from django.db import transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+from redis.exceptions import ResponseError
+
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import ListingViewStat
+from rockflint_web.ads.redis_client import redis_client
+from rockflint_web.ads.trending import VIEW_WEIGHT
+from rockflint_web.ads.trending import queue_engagement
+
+logger = logging.getLogger(__name__)
+
+PENDING_VIEWS_KEY = "ads:views:pending"
+FLUSHING_VIEWS_KEY = "ads:views:flushing"
+FLUSH_TOKEN_KEY = "ads:views:flushing-token"  # noqa: S105
+FLUSH_LOCK_KEY = "ads:views:flush-lock"
+# longer than any flush; a lock left by a killed worker expires by itself
+FLUSH_LOCK_TTL = 600
+# unique-visitor sketches outlive their day long enough for the last flush
+VISITORS_TTL = timedelta(days=2)
+FLUSH_BATCH_SIZE = 1000
+
+FLUSH_SQL = """
+UPDATE {table} AS stat
+SET views = stat.views + delta.views,
+    uniques = GREATEST(stat.uniques, delta.uniques),
+    flush_token = %s
+FROM (VALUES {values}) AS delta (listing_id, date, views, uniques)
+WHERE stat.listing_id = delta.listing_id AND stat.date = delta.date
+    AND stat.flush_token <> %s
+"""
+FLUSH_ROW_SQL = "(%s::bigint, %s::date, %s::integer, %s::integer)"
+# delete the lock only while it still holds our token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def visitors_key(listing_id, day):
+    return f"ads:views:visitors:{day.isoformat()}:{listing_id}"
+
+
+def visitor_id(request):
+    """Stable, anonymised visitor identity for the unique-visitor sketch."""
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    address = forwarded.split(",")[0].strip() or request.META.get("REMOTE_ADDR", "")
+    agent = request.META.get("HTTP_USER_AGENT", "")
+    digest = hashlib.sha1(f"{address}|{agent}".encode()).hexdigest()  # noqa: S324
+    return f"anon:{digest}"
+
+
+def record_listing_view(listing_id, visitor, *, state_id=None, category_id=None):
+    """
+    Count one view in Redis, and score it for the trending feeds when the
+    listing's scopes are given. Never raises, so it cannot fail a request.
+    """
+    day = timezone.localdate()
+    key = visitors_key(listing_id, day)
+    try:
+        pipe = redis_client().pipeline(transaction=False)
+        pipe.hincrby(PENDING_VIEWS_KEY, f"{listing_id}:{day.isoformat()}", 1)
+        pipe.pfadd(key, visitor)
+        pipe.expire(key, VISITORS_TTL)
+        if state_id is not None:
+            queue_engagement(pipe, listing_id, state_id, category_id, VIEW_WEIGHT)
+        pipe.execute()
+    except RedisError:
+        logger.warning("Could not record a view of listing %s", listing_id)
+
+
+def _claim_pending(client):
+    """
+    Atomically move the pending hash aside so new views keep accumulating,
+    and return its flush token; None when nothing is pending. A hash left by
+    a crashed flush is finished first, under its original token.
+    """
+    if client.exists(FLUSHING_VIEWS_KEY):
+        token = client.get(FLUSH_TOKEN_KEY)
+        if token is None:
+            token = uuid.uuid4().hex.encode()
+            client.set(FLUSH_TOKEN_KEY, token)
+        return token.decode()
+    token = uuid.uuid4().hex
+    pipe = client.pipeline(transaction=True)
+    pipe.rename(PENDING_VIEWS_KEY, FLUSHING_VIEWS_KEY)
+    pipe.set(FLUSH_TOKEN_KEY, token)
+    try:
+        pipe.execute()
+    except ResponseError:  # nothing pending
+        return None
+    return token
+
+
+def _write_batch(entries, token):
+    """
+    Apply one batch of (listing_id, day, views, uniques) to ListingViewStat,
+    skipping the rows that already absorbed the flush ``token``.
+    """
+    listing_ids = {entry[0] for entry in entries}
+    existing = set(
+        Listing.objects.filter(pk__in=listing_ids).values_list("pk", flat=True),
+    )
+    entries = [entry for entry in entries if entry[0] in existing]
+    if not entries:
+        return 0
+    ListingViewStat.objects.bulk_create(
+        [ListingViewStat(listing_id=entry[0], date=entry[1]) for entry in entries],
+        ignore_conflicts=True,
+    )
+    table = connection.ops.quote_name(ListingViewStat._meta.db_table)
+    statement = FLUSH_SQL.format(
+        table=table,
+        values=", ".join([FLUSH_ROW_SQL] * len(entries)),
+    )
+    params = [token, *(value for entry in entries for value in entry), token]
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+    return len(entries)
+
+
+def flush_listing_views():
+    """Fold the pending view deltas into ListingViewStat; returns rows touched."""
+    client = redis_client()
+    lock = uuid.uuid4().hex
+    if not client.set(FLUSH_LOCK_KEY, lock, nx=True, ex=FLUSH_LOCK_TTL):
+        return 0  # another flush is running
+    try:
+        return _flush_pending(client)
+    finally:
+        client.eval(RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, lock)
+
+
+def _flush_pending(client):
+    token = _claim_pending(client)
+    if token is None:
+        return 0
+    pending = client.hgetall(FLUSHING_VIEWS_KEY)
+    flushed = 0
+    for fields in batched(sorted(pending), FLUSH_BATCH_SIZE):
+        entries = []
+        for field in fields:
+            listing_id, day = field.decode().split(":")
+            entries.append((int(listing_id), date.fromisoformat(day)))
+        pipe = client.pipeline(transaction=False)
+        for listing_id, day in entries:
+            pipe.pfcount(visitors_key(listing_id, day))
+        uniques = pipe.execute()
+        rows = [
+            (listing_id, day, int(pending[field]), unique_count)
+            for (listing_id, day), field, unique_count in zip(
+                entries,
+                fields,
+                uniques,
+                strict=True,
+            )
+        ]
+        with transaction.atomic():
+            flushed += _write_batch(rows, token)
+        # only forget a batch once it is committed; should that fail, the
+        # token keeps the replay from counting it twice
+        client.hdel(FLUSHING_VIEWS_KEY, *fields)
+    client.delete(FLUSHING_VIEWS_KEY, FLUSH_TOKEN_KEY)
+    return flushed
@@ -0,0 +1,102 @@
+import time
+
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import transaction
+
+from rockflint_web.ads.geo import distance_from
+from rockflint_web.ads.geo import location_geography
+from rockflint_web.ads.models import Listing
+
+SEED_SQL = """
+INSERT INTO ads_listing (
+    vendor_id, title, slug, category_id, offer_id, state_id, lga_id, price,
+    attributes, active, promotion_rank, primary_image_path, created, updated,
+    location
+)
+SELECT
+    %(vendor)s, 'Benchmark listing ' || n, 'benchmark-listing-' || n,
+    %(category)s, %(offer)s, %(state)s, %(lga)s, (random() * 1e8)::numeric(14, 2),
+    '{}'::jsonb, true, 0, '', now(), now(),
+    ST_SetSRID(
+        ST_MakePoint(2.7 + random() * 11.9, 4.3 + random() * 9.6),
+        4326
+    )
+FROM generate_series(1, %(rows)s) AS n
+"""
+
+INDEX_NAME = "ads_listing_location_geog_gist"
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN ANALYZE the listing radius and nearest queries, optionally "
+        "after seeding synthetic listings spread over Nigeria. Seeded rows are "
+        "rolled back unless --keep is passed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=0)
+        parser.add_argument("--radius-km", type=float, default=10.0)
+        parser.add_argument("--limit", type=int, default=12)
+        parser.add_argument("--keep", action="store_true")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["rows"]:
+                self.seed(options["rows"])
+            point = Point(3.3792, 6.5244, srid=4326)  # Lagos
+            radius = (
+                Listing.objects.active()
+                .alias(location_geography=location_geography())
+                .filter(
+                    location_geography__dwithin=(point, D(km=options["radius_km"])),
+                )
+                .annotate(distance=distance_from(point))
+                .order_by("-promotion_rank", "distance", "-created", "-id")
+                .values("id")[: options["limit"]]
+            )
+            nearest = (
+                Listing.objects.active()
+                .filter(location__isnull=False)
+                .annotate(distance=distance_from(point))
+                .order_by("distance", "-id")
+                .values("id")[: options["limit"]]
+            )
+            self.explain("radius", radius)
+            self.explain("nearest", nearest)
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def seed(self, rows):
+        template = Listing.objects.order_by("pk").first()
+        if template is None:
+            msg = "Seeding needs one existing listing to borrow foreign keys from."
+            raise CommandError(msg)
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SEED_SQL,
+                {
+                    "vendor": template.vendor_id,
+                    "category": template.category_id,
+                    "offer": template.offer_id,
+                    "state": template.state_id,
+                    "lga": template.lga_id,
+                    "rows": rows,
+                },
+            )
+            cursor.execute("ANALYZE ads_listing")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Seeded {rows} listings in {elapsed:.1f}s")
+
+    def explain(self, label, queryset):
+        plan = queryset.explain(analyze=True, buffers=True)
+        used_index = INDEX_NAME in plan
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {label} =="))
+        self.stdout.write(plan)
+        style = self.style.SUCCESS if used_index else self.style.WARNING
+        self.stdout.write(style(f"{INDEX_NAME} used: {used_index}"))
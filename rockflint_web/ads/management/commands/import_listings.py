@@ -0,0 +1,56 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from rockflint_web.ads.listing_import import IMPORT_FORMATS
+from rockflint_web.ads.listing_import import ImportFormatError
+from rockflint_web.ads.listing_import import import_format
+from rockflint_web.ads.listing_import import import_listings
+from rockflint_web.users.models import Vendor
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import a vendor's listings from a CSV or NDJSON file through a "
+        "COPY staging table. Invalid rows are skipped and reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--vendor", type=int, required=True, help="Vendor id")
+        parser.add_argument("--format", choices=IMPORT_FORMATS)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        fmt = options["format"] or import_format(path.name)
+        if fmt is None:
+            msg = "Cannot tell the format from the file name; pass --format."
+            raise CommandError(msg)
+        try:
+            vendor = Vendor.objects.get(pk=options["vendor"])
+        except Vendor.DoesNotExist as exc:
+            msg = f"Vendor {options['vendor']} does not exist."
+            raise CommandError(msg) from exc
+        try:
+            with path.open("rb") as stream:
+                report = import_listings(
+                    vendor,
+                    stream,
+                    fmt,
+                    dry_run=options["dry_run"],
+                )
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc)) from exc
+
+        for failure in report["errors"]:
+            self.stderr.write(f"row {failure['row']}: {json.dumps(failure['errors'])}")
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {report['imported']} listings, "
+                f"{report['failed']} rows failed.",
+            ),
+        )
@@ -0,0 +1,38 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations
+
+BACKFILL_SQL = """
+UPDATE ads_listing AS listing
+SET search_vector =
+    setweight(to_tsvector('english', coalesce(listing.title, '')), 'A')
+    || setweight(
+        to_tsvector(
+            'english',
+            concat_ws(' ', listing.address, lga.name, state.name)
+        ),
+        'B'
+    )
+    || setweight(to_tsvector('english', coalesce(listing.description, '')), 'C')
+FROM ads_lga AS lga, ads_state AS state
+WHERE lga.id = listing.lga_id AND state.id = listing.state_id;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0003_listing_location"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="search_vector",
+            field=SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=GinIndex(fields=["search_vector"], name="ads_listing_search_gin"),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
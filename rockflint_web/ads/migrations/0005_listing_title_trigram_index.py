@@ -0,0 +1,21 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0004_listing_search_vector"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="listing",
+            index=GinIndex(
+                fields=["title"],
+                name="ads_listing_title_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0005_listing_title_trigram_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListingSearchDocument",
+            fields=[
+                (
+                    "listing",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="ads.listing",
+                    ),
+                ),
+                ("vendor_id", models.BigIntegerField()),
+                ("title", models.CharField(max_length=255)),
+                ("slug", models.SlugField(blank=True, max_length=255)),
+                ("description", models.TextField(blank=True, null=True)),
+                ("price", models.DecimalField(decimal_places=2, max_digits=14)),
+                ("rent_period", models.CharField(blank=True, max_length=20, null=True)),
+                ("bedrooms", models.PositiveSmallIntegerField(blank=True, null=True)),
+                ("bathrooms", models.PositiveSmallIntegerField(blank=True, null=True)),
+                ("area", models.FloatField(blank=True, null=True)),
+                ("attributes", models.JSONField(blank=True, default=dict)),
+                ("category_id", models.BigIntegerField()),
+                ("category_name", models.CharField(max_length=255)),
+                ("category_slug", models.SlugField(blank=True, max_length=255)),
+                ("offer_id", models.BigIntegerField()),
+                ("state_id", models.BigIntegerField()),
+                ("state_name", models.CharField(max_length=255)),
+                ("lga_id", models.BigIntegerField()),
+                ("lga_name", models.CharField(max_length=255)),
+                ("primary_image", models.CharField(blank=True, max_length=255)),
+                ("images", models.JSONField(blank=True, default=list)),
+                (
+                    "feature_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                ("features", models.JSONField(blank=True, default=list)),
+                ("promoted_until", models.DateTimeField(blank=True, null=True)),
+                ("latitude", models.FloatField(blank=True, null=True)),
+                ("longitude", models.FloatField(blank=True, null=True)),
+                ("active", models.BooleanField(default=True)),
+                ("created", models.DateTimeField()),
+                ("refreshed", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["feature_ids"],
+                        name="ads_searchdoc_features_gin",
+                    ),
+                ],
+            },
+        ),
+    ]
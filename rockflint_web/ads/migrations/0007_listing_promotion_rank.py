@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db import models
+
+BACKFILL_SQL = """
+UPDATE ads_listing AS listing
+SET promotion_rank = 1
+FROM ads_promotedlisting AS promotion
+WHERE promotion.listing_id = listing.id
+  AND promotion.active
+  AND promotion.promoted_until > now();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0006_listingsearchdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="promotion_rank",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                fields=["active", "-promotion_rank", "-created"],
+                name="ads_listing_promo_rank_idx",
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db import models
+
+BACKFILL_SQL = """
+UPDATE ads_listing AS listing
+SET primary_image_path = image.image
+FROM (
+    SELECT DISTINCT ON (listing_id) listing_id, image
+    FROM ads_listingimage
+    ORDER BY listing_id, is_primary DESC, "order", id
+) AS image
+WHERE image.listing_id = listing.id;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0007_listing_promotion_rank"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="primary_image_path",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,23 @@
+import django.utils.timezone
+from django.db import migrations
+from django.db import models
+
+
+def updated_field():
+    return models.DateTimeField(auto_now=True, default=django.utils.timezone.now)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0008_listing_primary_image_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name=model_name,
+            name="updated",
+            field=updated_field(),
+            preserve_default=False,
+        )
+        for model_name in ("category", "feature", "lga", "offer", "state")
+    ]
@@ -0,0 +1,26 @@
+import django.contrib.gis.db.models.fields
+import django.db.models.functions.comparison
+from django.contrib.postgres.indexes import GistIndex
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0009_lookup_updated"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listing",
+            index=GistIndex(
+                django.db.models.functions.comparison.Cast(
+                    "location",
+                    output_field=django.contrib.gis.db.models.fields.PointField(
+                        geography=True,
+                        srid=4326,
+                    ),
+                ),
+                name="ads_listing_location_geog_gist",
+            ),
+        ),
+    ]
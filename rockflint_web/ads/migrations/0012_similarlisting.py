@@ -0,0 +1,64 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0011_pricerollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarListing",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("rank", models.PositiveSmallIntegerField()),
+                (
+                    "computed",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "listing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_entries",
+                        to="ads.listing",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="ads.listing",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["listing", "rank"],
+                "indexes": [
+                    models.Index(
+                        fields=["similar"],
+                        name="ads_similarlisting_similar_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("listing", "rank"),
+                        name="ads_similarlisting_rank_unique",
+                    ),
+                ],
+            },
+        ),
+    ]
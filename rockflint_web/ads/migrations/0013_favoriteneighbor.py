@@ -0,0 +1,54 @@
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0012_similarlisting"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FavoriteNeighbor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("co_count", models.PositiveIntegerField()),
+                ("score", models.FloatField()),
+                ("rank", models.PositiveSmallIntegerField()),
+                (
+                    "listing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="favorite_neighbors",
+                        to="ads.listing",
+                    ),
+                ),
+                (
+                    "neighbor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="ads.listing",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["listing", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("listing", "rank"),
+                        name="ads_favoriteneighbor_rank_unique",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0015_savedsearch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listingimage",
+            name="variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="listingimage",
+            name="variants_source",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+    ]
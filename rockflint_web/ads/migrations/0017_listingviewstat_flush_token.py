@@ -0,0 +1,16 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ads", "0016_listingimage_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listingviewstat",
+            name="flush_token",
+            field=models.CharField(blank=True, default="", max_length=32),
+        ),
+    ]
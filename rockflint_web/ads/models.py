@@ -1,47 +1,117 @@
 # Create your models here.
 # ads/models.py
-import uuid
+from decimal import Decimal
 
 from django.contrib.auth import get_user_model
 from django.contrib.gis.db.models import PointField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GistIndex
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MaxValueValidator
+from django.core.validators import MinValueValidator
+from django.db import IntegrityError
 from django.db import models
+from django.db import transaction
 from django.db.models import JSONField
+from django.db.models import OuterRef
 from django.db.models import Q
-from django.core.validators import MaxValueValidator
-from django.core.validators import MinValueValidator
+from django.db.models import Subquery
 from django.template.defaultfilters import slugify
 from django.urls import reverse
 from django.utils import timezone
 
+from rockflint_web.ads.geo import location_geography
 from rockflint_web.users.models import Vendor
 
 User = get_user_model()
 
+LISTING_SEARCH_CONFIG = "english"
+
+
+# "-" plus up to six digits of collision suffix
+SLUG_SUFFIX_ROOM = 7
+SLUG_SAVE_ATTEMPTS = 5
+
 
-def unique_slugify(instance, value, slug_field_name="slug"):
+def slug_base(value, max_length, fallback="item"):
+    return slugify(value)[: max_length - SLUG_SUFFIX_ROOM].strip("-") or fallback
+
+
+def next_free_slug(base, taken):
+    """``base``, else the first of ``base-2``, ``base-3``... not in ``taken``."""
+    if base not in taken:
+        return base
+    counter = 2
+    while f"{base}-{counter}" in taken:
+        counter += 1
+    return f"{base}-{counter}"
+
+
+def unique_slugify(instance, value, slug_field_name="slug", scope=()):
     """
-    Generate a unique slug for instance.model based on value
-    Appends short uuid suffix if needed.
+    A slug for ``instance`` built from ``value``, free among the rows that
+    share its ``scope`` fields (those of the uniqueness constraint). One query
+    fetches every taken slug starting with the base; a concurrent writer
+    taking the same slug is handled by UniqueSlugMixin retrying the save.
     """
-    slug_base = slugify(value)
-    slug = slug_base
-    Klass = instance.__class__
-    counter = 0
-    while (
-        Klass.objects.filter(**{slug_field_name: slug}).exclude(pk=instance.pk).exists()
-    ):
-        counter += 1
-        slug = f"{slug_base}-{uuid.uuid4().hex[:6]}"
-        if counter > 5:
-            # fallback: append timestamp
-            slug = f"{slug_base}-{int(timezone.now().timestamp())}"
-            break
-    return slug
+    opts = instance._meta
+    field = opts.get_field(slug_field_name)
+    base = slug_base(value, field.max_length, fallback=opts.model_name)
+    scope_filter = {
+        name: getattr(instance, opts.get_field(name).attname) for name in scope
+    }
+    taken = (
+        instance.__class__._default_manager.filter(
+            **{f"{slug_field_name}__startswith": base},
+            **scope_filter,
+        )
+        .exclude(pk=instance.pk)
+        .values_list(slug_field_name, flat=True)
+    )
+    return next_free_slug(base, set(taken))
 
 
-class Category(models.Model):
+def _is_slug_conflict(error):
+    diag = getattr(error.__cause__, "diag", None)
+    return "slug" in (getattr(diag, "constraint_name", None) or "")
+
+
+class UniqueSlugMixin:
+    """
+    Fills an empty ``slug`` from ``slug_source`` on save, unique within
+    ``slug_scope``. Instead of pre-checking candidates, the save is retried
+    with a freshly allocated slug when it loses a race on the constraint.
+    """
+
+    slug_source = "name"
+    slug_scope = ()
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            super().save(*args, **kwargs)
+            return
+        for attempt in range(SLUG_SAVE_ATTEMPTS):
+            self.slug = unique_slugify(
+                self,
+                getattr(self, self.slug_source),
+                scope=self.slug_scope,
+            )
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+            except IntegrityError as exc:
+                if attempt + 1 == SLUG_SAVE_ATTEMPTS or not _is_slug_conflict(exc):
+                    raise
+            else:
+                return
+
+
+class Category(UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -50,22 +120,29 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = unique_slugify(self, self.name)
-        super().save(*args, **kwargs)
 
+class LoadedNameMixin:
+    """Remembers the name loaded from the database, to detect renames."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_name = instance.__dict__.get("name")  # noqa: SLF001
+        return instance
 
-class State(models.Model):
+
+class State(LoadedNameMixin, models.Model):
     name = models.CharField(max_length=255, unique=True)
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
-class LGA(models.Model):
+class LGA(LoadedNameMixin, models.Model):
     state = models.ForeignKey(State, on_delete=models.CASCADE, related_name="lgas")
     name = models.CharField(max_length=255)
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ("state", "name")
@@ -75,18 +152,14 @@ class LGA(models.Model):
         return f"{self.name}, {self.state.name}"
 
 
-class Offer(models.Model):
+class Offer(UniqueSlugMixin, models.Model):
     """
     E.g., 'For Sale', 'For Rent', 'Lease'
     """
 
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=120, unique=True, blank=True)
-
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = unique_slugify(self, self.name)
-        super().save(*args, **kwargs)
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -99,15 +172,41 @@ class Feature(models.Model):
 
     name = models.CharField(max_length=100, unique=True)
     icon = models.CharField(max_length=100, blank=True, null=True)  # optional for UI
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
+def listing_search_vector():
+    """
+    Weighted tsvector expression for Listing rows: title (A), address and
+    location names (B), description (C). Usable in ``QuerySet.update()``.
+    """
+    state_name = Subquery(
+        State.objects.filter(pk=OuterRef("state_id")).values("name")[:1],
+    )
+    lga_name = Subquery(LGA.objects.filter(pk=OuterRef("lga_id")).values("name")[:1])
+    return (
+        SearchVector("title", weight="A", config=LISTING_SEARCH_CONFIG)
+        + SearchVector(
+            "address",
+            lga_name,
+            state_name,
+            weight="B",
+            config=LISTING_SEARCH_CONFIG,
+        )
+        + SearchVector("description", weight="C", config=LISTING_SEARCH_CONFIG)
+    )
+
+
 class ListingQuerySet(models.QuerySet):
     def active(self):
         return self.filter(active=True)
 
+    def update_search_vector(self):
+        return self.update(search_vector=listing_search_vector())
+
 
 class ListingManager(models.Manager):
     def get_queryset(self):
@@ -117,7 +216,7 @@ class ListingManager(models.Manager):
         return self.get_queryset().active()
 
 
-class Listing(models.Model):
+class Listing(UniqueSlugMixin, models.Model):
     """Refactored listing (previously Ads)"""
 
     vendor = models.ForeignKey(
@@ -166,16 +265,31 @@ class Listing(models.Model):
 
     # amenities / features
     features = models.ManyToManyField(Feature, blank=True, related_name="listings")
+    # storage name of the primary (or first) image, see sync_primary_image()
+    primary_image_path = models.CharField(max_length=255, blank=True, default="")
+
+    # full-text search document, maintained by save()/update_search_vector()
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
 
     # control + metadata
     active = models.BooleanField(default=True, db_index=True)
+    # 1 while an active, unexpired PromotedListing exists; kept in sync by
+    # PromotedListing.save()/delete and the expire_promotions beat task
+    promotion_rank = models.PositiveSmallIntegerField(default=0)
     created = models.DateTimeField(auto_now_add=True, db_index=True)
     updated = models.DateTimeField(auto_now=True)
-    # optional: integrate hit count lib or own view model
-    # hit_count_generic = GenericRelation(HitCount, object_id_field='object_pk', related_query_name='hit_count_generic_relation')
+    # view counts live in ListingViewStat, buffered through ads/listing_views.py
 
     objects = ListingManager()
 
+    # slugs are unique per vendor, see the vendor/slug constraint
+    slug_source = "title"
+    slug_scope = ("vendor",)
+
+    SEARCH_VECTOR_SOURCES = frozenset(
+        {"title", "address", "description", "state", "lga"},
+    )
+
     class Meta:
         ordering = ["-created"]
         indexes = [
@@ -183,6 +297,18 @@ class Listing(models.Model):
             models.Index(fields=["category", "state", "lga"]),
             models.Index(fields=["price"]),
             models.Index(fields=["active"]),
+            models.Index(
+                fields=["active", "-promotion_rank", "-created"],
+                name="ads_listing_promo_rank_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="ads_listing_search_gin"),
+            GinIndex(
+                fields=["title"],
+                name="ads_listing_title_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+            # radius (ST_DWithin) and nearest (<->) queries, see ads/geo.py
+            GistIndex(location_geography(), name="ads_listing_location_geog_gist"),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -197,18 +323,38 @@ class Listing(models.Model):
     def get_absolute_url(self):
         return reverse("listings:detail", args=[self.pk, self.slug])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the map tiles a moved listing leaves behind are invalidated too
+        instance._loaded_location = instance.__dict__.get("location")  # noqa: SLF001
+        return instance
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = unique_slugify(self, self.title)
         super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or self.SEARCH_VECTOR_SOURCES & set(update_fields):
+            Listing.objects.filter(pk=self.pk).update_search_vector()
 
     @property
     def primary_image(self):
-        img = self.images.filter(is_primary=True).first()
-        if img:
-            return img.image.url
-        first = self.images.first()
-        return first.image.url if first else None
+        # prefer prefetched images; otherwise the denormalized path avoids a
+        # query per listing
+        images = getattr(self, "_prefetched_objects_cache", {}).get("images")
+        if images is not None:
+            image = pick_primary_image(images)
+            return image.image.url if image else None
+        if self.primary_image_path:
+            return ListingImage._meta.get_field("image").storage.url(
+                self.primary_image_path,
+            )
+        return None
+
+
+def listing_price_limit():
+    """The smallest price ``Listing.price`` (NUMERIC) can no longer hold."""
+    field = Listing._meta.get_field("price")
+    return Decimal(10) ** (field.max_digits - field.decimal_places)
 
 
 class ListingImage(models.Model):
@@ -221,6 +367,11 @@ class ListingImage(models.Model):
     caption = models.CharField(max_length=255, blank=True)
     is_primary = models.BooleanField(default=False, db_index=True)
     order = models.PositiveSmallIntegerField(default=0, db_index=True)
+    # resized copies built by ads.image_variants:
+    # {"thumbnail": {"width", "height", "webp", "jpeg"}, ...} with storage names
+    variants = JSONField(default=dict, blank=True)
+    # storage name of the upload the variants were built from
+    variants_source = models.CharField(max_length=255, blank=True, default="")
 
     class Meta:
         ordering = ["order", "-is_primary", "id"]
@@ -240,10 +391,38 @@ class ListingImage(models.Model):
                 pk=self.pk,
             ).update(is_primary=False)
         super().save(*args, **kwargs)
+        sync_primary_image(self.listing_id)
 
     def __str__(self):
         return f"Image for {self.listing.title}"
 
+    @property
+    def current_variants(self):
+        """The variants, unless they were built from a since-replaced upload."""
+        if self.image and self.variants_source == self.image.name:
+            return self.variants
+        return {}
+
+
+def pick_primary_image(images):
+    """The primary image of an ordered image list, else the first one."""
+    images = list(images)
+    for image in images:
+        if image.is_primary:
+            return image
+    return images[0] if images else None
+
+
+def sync_primary_image(listing_id):
+    """Copy the listing's current primary image into primary_image_path."""
+    path = (
+        ListingImage.objects.filter(listing_id=listing_id)
+        .order_by("-is_primary", "order", "id")
+        .values_list("image", flat=True)
+        .first()
+    )
+    Listing.objects.filter(pk=listing_id).update(primary_image_path=path or "")
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="favorites")
@@ -299,3 +478,331 @@ class PromotedListing(models.Model):
 
     def __str__(self):
         return f"Promoted: {self.listing.title} until {self.promoted_until}"
+
+    @property
+    def is_live(self):
+        return self.active and self.promoted_until > timezone.now()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Listing.objects.filter(pk=self.listing_id).update(
+            promotion_rank=1 if self.is_live else 0,
+        )
+
+
+class ListingSearchDocument(models.Model):
+    """
+    Flat copy of everything the listing list endpoint renders, so a page of
+    results needs no joins to images, features, category or promotion.
+
+    Rebuilt asynchronously (see ``ads/search_documents.py``) whenever a
+    listing, its images, features or promotion change.
+    """
+
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+    )
+    vendor_id = models.BigIntegerField()
+    title = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=255, blank=True)
+    description = models.TextField(blank=True, null=True)
+    price = models.DecimalField(max_digits=14, decimal_places=2)
+    rent_period = models.CharField(max_length=20, blank=True, null=True)
+    bedrooms = models.PositiveSmallIntegerField(blank=True, null=True)
+    bathrooms = models.PositiveSmallIntegerField(blank=True, null=True)
+    area = models.FloatField(blank=True, null=True)
+    attributes = JSONField(default=dict, blank=True)
+
+    category_id = models.BigIntegerField()
+    category_name = models.CharField(max_length=255)
+    category_slug = models.SlugField(max_length=255, blank=True)
+    offer_id = models.BigIntegerField()
+    state_id = models.BigIntegerField()
+    state_name = models.CharField(max_length=255)
+    lga_id = models.BigIntegerField()
+    lga_name = models.CharField(max_length=255)
+
+    primary_image = models.CharField(max_length=255, blank=True)
+    # [{"id", "image", "caption", "is_primary", "order", "variants"}, ...]
+    images = JSONField(default=list, blank=True)
+    feature_ids = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    # [{"id", "name", "icon"}, ...]
+    features = JSONField(default=list, blank=True)
+    promoted_until = models.DateTimeField(blank=True, null=True)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+
+    active = models.BooleanField(default=True)
+    created = models.DateTimeField()
+    refreshed = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["feature_ids"], name="ads_searchdoc_features_gin"),
+        ]
+
+    def __str__(self):
+        return f"Search document for listing {self.listing_id}"
+
+
+class PriceRollup(models.Model):
+    """
+    Precomputed price statistics of the active listings for one
+    (state, category, offer) combination; a NULL dimension means "any".
+
+    Rebuilt wholesale by ``ads.tasks.refresh_price_rollups`` (see
+    ``ads/price_stats.py``) so unfiltered price sliders skip the listing scan.
+    """
+
+    state = models.ForeignKey(
+        State,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    offer = models.ForeignKey(
+        Offer,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    listing_count = models.PositiveIntegerField()
+    min_price = models.DecimalField(max_digits=14, decimal_places=2)
+    max_price = models.DecimalField(max_digits=14, decimal_places=2)
+    median_price = models.FloatField()
+    p90_price = models.FloatField()
+    # one count per PRICE_HISTOGRAM_BUCKETS bucket
+    histogram = ArrayField(models.PositiveIntegerField(), default=list)
+    refreshed = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["state", "category", "offer"],
+                name="ads_pricerollup_dims_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Price rollup {self.state_id}/{self.category_id}/{self.offer_id}"
+
+
+class SimilarListing(models.Model):
+    """
+    Precomputed "similar listings" of a listing, ``rank`` 1 being the best
+    match. Filled in chunks by ``ads.tasks.refresh_similar_listings``.
+    """
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="similar_entries",
+    )
+    similar = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    computed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["listing", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["listing", "rank"],
+                name="ads_similarlisting_rank_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["similar"], name="ads_similarlisting_similar_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} ~ {self.similar_id} (#{self.rank})"
+
+
+class FavoriteNeighbor(models.Model):
+    """
+    "People who saved this also saved": the top co-favorited listings of a
+    listing, ``rank`` 1 first. Rebuilt nightly by
+    ``ads.tasks.rebuild_favorite_neighbors``.
+    """
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="favorite_neighbors",
+    )
+    neighbor = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    # users who saved both listings
+    co_count = models.PositiveIntegerField()
+    # co_count / sqrt(saves(listing) * saves(neighbor))
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ["listing", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["listing", "rank"],
+                name="ads_favoriteneighbor_rank_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} -> {self.neighbor_id} (#{self.rank})"
+
+
+class ListingViewStat(models.Model):
+    """Daily detail-page views and (approximate) unique visitors of a listing."""
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="view_stats",
+    )
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    # HyperLogLog estimate, about 1% standard error
+    uniques = models.PositiveIntegerField(default=0)
+    # token of the last view flush folded in, see ads/listing_views.py
+    flush_token = models.CharField(max_length=32, blank=True, default="")
+
+    class Meta:
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["listing", "date"],
+                name="ads_listingviewstat_day_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} on {self.date}: {self.views} views"
+
+
+class SavedSearch(models.Model):
+    """
+    A ``ListingFilter`` query a user is alerted about. The bucket columns
+    (state, category, offer and the price range) are copied out of ``query``
+    on save so ``ads/saved_searches.py`` can index searches without parsing
+    every query.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="saved_searches",
+    )
+    name = models.CharField(max_length=120, blank=True)
+    # ListingFilter query parameters, see saved_searches.SAVED_SEARCH_PARAMS
+    query = JSONField(default=dict)
+    notify = models.BooleanField(default=True)
+    state = models.ForeignKey(
+        State,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    offer = models.ForeignKey(
+        Offer,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    min_price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        null=True,
+        blank=True,
+    )
+    max_price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        null=True,
+        blank=True,
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def __str__(self):
+        return self.name or f"Saved search {self.pk}"
+
+    @staticmethod
+    def _query_value(query, name, cast):
+        value = query.get(name)
+        return cast(value) if value not in (None, "") else None
+
+    def save(self, *args, **kwargs):
+        query = self.query or {}
+        self.state_id = self._query_value(query, "state", int)
+        self.category_id = self._query_value(query, "category", int)
+        self.offer_id = self._query_value(query, "offer", int)
+        self.min_price = self._query_value(query, "min_price", Decimal)
+        self.max_price = self._query_value(query, "max_price", Decimal)
+        super().save(*args, **kwargs)
+
+
+class SavedSearchMatch(models.Model):
+    """A new listing found by a saved search; pending until its digest is sent."""
+
+    saved_search = models.ForeignKey(
+        SavedSearch,
+        on_delete=models.CASCADE,
+        related_name="matches",
+    )
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    matched = models.DateTimeField(default=timezone.now)
+    notified = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-matched"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["saved_search", "listing"],
+                name="ads_savedsearchmatch_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["saved_search"],
+                condition=Q(notified__isnull=True),
+                name="ads_savedsearchmatch_pending",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.saved_search_id} matched {self.listing_id}"
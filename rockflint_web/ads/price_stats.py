@@ -0,0 +1,205 @@
+import math
+
+from django.db import connection
+from django.db import transaction
+
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import PriceRollup
+
+# log-spaced histogram from 10k to 10bn NGN; prices outside fall into the
+# first or last bucket
+PRICE_HISTOGRAM_MIN = 10_000
+PRICE_HISTOGRAM_MAX = 10_000_000_000
+PRICE_HISTOGRAM_BUCKETS = 24
+# query params that a rollup row can answer on its own
+ROLLUP_DIMENSIONS = ("state", "category", "offer")
+
+PRICE_BUCKET_SQL = (
+    "LEAST(GREATEST(width_bucket(ln(price), "
+    f"{math.log(PRICE_HISTOGRAM_MIN)!r}, {math.log(PRICE_HISTOGRAM_MAX)!r}, "
+    f"{PRICE_HISTOGRAM_BUCKETS}), 1), {PRICE_HISTOGRAM_BUCKETS})"
+)
+
+PRICE_STATS_SQL = f"""
+WITH prices AS (
+    SELECT listing.price FROM ({{listings}}) AS listing WHERE listing.price > 0
+),
+histogram AS (
+    SELECT {PRICE_BUCKET_SQL} AS bucket, COUNT(*) AS count FROM prices GROUP BY 1
+)
+SELECT
+    COUNT(*),
+    MIN(price),
+    MAX(price),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY price),
+    percentile_cont(0.9) WITHIN GROUP (ORDER BY price),
+    (SELECT array_agg(ARRAY[bucket, count]) FROM histogram)
+FROM prices
+"""  # noqa: S608
+
+PRICE_ROLLUP_SQL = f"""
+WITH prices AS (
+    SELECT listing.*, {PRICE_BUCKET_SQL} AS bucket
+    FROM ({{listings}}) AS listing
+),
+stats AS (
+    SELECT
+        state_id,
+        category_id,
+        offer_id,
+        COUNT(*) AS count,
+        MIN(price) AS min_price,
+        MAX(price) AS max_price,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY price) AS median_price,
+        percentile_cont(0.9) WITHIN GROUP (ORDER BY price) AS p90_price
+    FROM prices
+    GROUP BY CUBE (state_id, category_id, offer_id)
+),
+bucket_counts AS (
+    SELECT state_id, category_id, offer_id, bucket, COUNT(*) AS count
+    FROM prices
+    GROUP BY bucket, CUBE (state_id, category_id, offer_id)
+),
+histograms AS (
+    SELECT
+        state_id,
+        category_id,
+        offer_id,
+        array_agg(ARRAY[bucket, count]) AS histogram
+    FROM bucket_counts
+    GROUP BY state_id, category_id, offer_id
+)
+SELECT
+    stats.state_id,
+    stats.category_id,
+    stats.offer_id,
+    stats.count,
+    stats.min_price,
+    stats.max_price,
+    stats.median_price,
+    stats.p90_price,
+    histograms.histogram
+FROM stats
+JOIN histograms
+    ON histograms.state_id IS NOT DISTINCT FROM stats.state_id
+    AND histograms.category_id IS NOT DISTINCT FROM stats.category_id
+    AND histograms.offer_id IS NOT DISTINCT FROM stats.offer_id
+"""  # noqa: S608
+
+
+def histogram_bounds():
+    """The PRICE_HISTOGRAM_BUCKETS + 1 bucket edges, rounded to whole naira."""
+    ratio = PRICE_HISTOGRAM_MAX / PRICE_HISTOGRAM_MIN
+    return [
+        round(PRICE_HISTOGRAM_MIN * ratio ** (index / PRICE_HISTOGRAM_BUCKETS))
+        for index in range(PRICE_HISTOGRAM_BUCKETS + 1)
+    ]
+
+
+def _bucket_counts(pairs):
+    counts = [0] * PRICE_HISTOGRAM_BUCKETS
+    for bucket, count in pairs or []:
+        counts[bucket - 1] = count
+    return counts
+
+
+def _payload(count, min_price, max_price, median, p90, counts):  # noqa: PLR0913
+    bounds = histogram_bounds()
+    return {
+        "count": count,
+        "min": min_price,
+        "max": max_price,
+        "median": median,
+        "p90": p90,
+        "histogram": [
+            {"min": bounds[index], "max": bounds[index + 1], "count": bucket}
+            for index, bucket in enumerate(counts)
+        ],
+    }
+
+
+def price_stats(queryset):
+    """Histogram, min, max, median and p90 of the prices in ``queryset``."""
+    listings = queryset.order_by().values("price")
+    sql, params = listings.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(PRICE_STATS_SQL.format(listings=sql), params)
+        count, min_price, max_price, median, p90, pairs = cursor.fetchone()
+    return _payload(count, min_price, max_price, median, p90, _bucket_counts(pairs))
+
+
+def rollup_dimensions(query_params):
+    """
+    ``{"state": id, ...}`` when the query only narrows by rollup dimensions
+    (one integer each), else None.
+    """
+    dimensions = {}
+    for key, raw_values in query_params.lists():
+        values = [value for value in raw_values if value != ""]
+        if not values or key == "format":
+            continue
+        if key not in ROLLUP_DIMENSIONS or len(values) > 1:
+            return None
+        try:
+            dimensions[key] = int(values[0])
+        except ValueError:
+            return None
+    return dimensions
+
+
+def rollup_price_stats(dimensions):
+    """Stats from the precomputed rollup, or None when it has no such row."""
+    lookup = {f"{name}_id": dimensions.get(name) for name in ROLLUP_DIMENSIONS}
+    rollup = PriceRollup.objects.filter(**lookup).first()
+    if rollup is None:
+        return None
+    return _payload(
+        rollup.listing_count,
+        rollup.min_price,
+        rollup.max_price,
+        rollup.median_price,
+        rollup.p90_price,
+        rollup.histogram,
+    )
+
+
+def refresh_price_rollups():
+    """Replace every PriceRollup from one CUBE aggregation of active listings."""
+    listings = (
+        Listing.objects.active()
+        .order_by()
+        .filter(price__gt=0)
+        .values("state_id", "category_id", "offer_id", "price")
+    )
+    sql, params = listings.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(PRICE_ROLLUP_SQL.format(listings=sql), params)
+        rows = cursor.fetchall()
+    rollups = [
+        PriceRollup(
+            state_id=state_id,
+            category_id=category_id,
+            offer_id=offer_id,
+            listing_count=count,
+            min_price=min_price,
+            max_price=max_price,
+            median_price=median,
+            p90_price=p90,
+            histogram=_bucket_counts(pairs),
+        )
+        for (
+            state_id,
+            category_id,
+            offer_id,
+            count,
+            min_price,
+            max_price,
+            median,
+            p90,
+            pairs,
+        ) in rows
+    ]
+    with transaction.atomic():
+        PriceRollup.objects.all().delete()
+        PriceRollup.objects.bulk_create(rollups)
+    return len(rollups)
@@ -1,13 +1,24 @@
 from decimal import Decimal
 from decimal import InvalidOperation
+from itertools import batched
 
-from django.db.models import F
-from django.db.models.functions import Abs
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 
 from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import SimilarListing
+from rockflint_web.ads.similarity import category_vectors
+from rockflint_web.ads.similarity import rank_similar
 
+DEFAULT_PRICE_TOLERANCE = Decimal("0.20")
+# neighbours stored per listing; also the largest limit served from the table
+SIMILAR_LISTINGS_STORED = 20
+SIMILARITY_CHUNK_SIZE = 500
+SIMILARITY_WATERMARK_KEY = "ads:similar:watermark"
 
-def parse_price_tolerance(value, default=Decimal("0.20")):
+
+def parse_price_tolerance(value, default=DEFAULT_PRICE_TOLERANCE):
     if value in (None, ""):
         return default
     try:
@@ -21,26 +32,107 @@ def parse_price_tolerance(value, default=Decimal("0.20")):
     return tolerance
 
 
-def similar_listings_for(listing, *, price_tolerance=Decimal("0.20"), limit=6):
+def listings_in_order(listing_ids):
+    listings = (
+        Listing.objects.select_related("vendor", "category", "offer", "state", "lga")
+        .prefetch_related("images", "features")
+        .in_bulk(listing_ids)
+    )
+    return [listings[pk] for pk in listing_ids if pk in listings]
+
+
+def similar_listings_for(listing, *, price_tolerance=DEFAULT_PRICE_TOLERANCE, limit=6):
+    """
+    Active listings of the same category priced within ``price_tolerance``,
+    ranked by the multi-signal score of ``ads/similarity.py``.
+    """
     if listing.price is None:
-        return Listing.objects.none()
+        return []
+    ranked = rank_similar(
+        listing,
+        price_tolerance=parse_price_tolerance(price_tolerance),
+        limit=limit,
+    )
+    return listings_in_order([pk for pk, _score in ranked])
 
-    tolerance = parse_price_tolerance(price_tolerance)
-    lower_bound = listing.price * (Decimal("1.00") - tolerance)
-    upper_bound = listing.price * (Decimal("1.00") + tolerance)
-    if lower_bound < 0:
-        lower_bound = Decimal("0.00")
 
-    return (
-        Listing.objects.active()
-        .select_related("vendor", "category", "offer", "state", "lga")
-        .prefetch_related("images", "features")
-        .filter(
-            category=listing.category,
-            price__gte=lower_bound,
-            price__lte=upper_bound,
-        )
-        .exclude(pk=listing.pk)
-        .annotate(price_delta=Abs(F("price") - listing.price))
-        .order_by("price_delta", "-created")[:limit]
+def stored_similar_listings(listing, *, limit=6):
+    """
+    The precomputed neighbours of ``listing`` that are still active, in rank
+    order, or None when nothing is stored for it.
+    """
+    similar_ids = list(
+        SimilarListing.objects.filter(listing=listing, similar__active=True)
+        .order_by("rank")
+        .values_list("similar_id", flat=True)[:limit],
     )
+    if not similar_ids:
+        return None
+    return listings_in_order(similar_ids)
+
+
+def store_similar_listings(listing_ids):
+    """Recompute the SimilarListing rows of ``listing_ids`` chunk by chunk."""
+    stored = 0
+    for chunk in batched(listing_ids, SIMILARITY_CHUNK_SIZE):
+        listings = Listing.objects.filter(pk__in=chunk).prefetch_related("features")
+        # score against up-to-date snapshots, not the worker's cached ones
+        for category_id in {listing.category_id for listing in listings}:
+            category_vectors(category_id, max_age=0)
+        computed = timezone.now()
+        rows = [
+            SimilarListing(
+                listing=listing,
+                similar_id=similar_id,
+                score=score,
+                rank=rank,
+                computed=computed,
+            )
+            for listing in listings
+            if listing.price is not None
+            for rank, (similar_id, score) in enumerate(
+                rank_similar(
+                    listing,
+                    price_tolerance=DEFAULT_PRICE_TOLERANCE,
+                    limit=SIMILAR_LISTINGS_STORED,
+                ),
+                start=1,
+            )
+        ]
+        with transaction.atomic():
+            SimilarListing.objects.filter(listing_id__in=chunk).delete()
+            SimilarListing.objects.bulk_create(rows)
+        stored += len(rows)
+    return stored
+
+
+def refresh_similar_listings(*, full=False):
+    """
+    Recompute the neighbours of every active listing (``full`` or first run)
+    or only of listings changed since the previous run, plus the listings
+    whose stored neighbours changed. Returns the number of rows written.
+    """
+    started = timezone.now()
+    since = None if full else cache.get(SIMILARITY_WATERMARK_KEY)
+    if since is None:
+        SimilarListing.objects.exclude(listing__active=True).delete()
+        listing_ids = (
+            Listing.objects.active()
+            .order_by("pk")
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=SIMILARITY_CHUNK_SIZE)
+        )
+    else:
+        changed = set(
+            Listing.objects.filter(updated__gte=since).values_list("pk", flat=True),
+        )
+        changed.update(
+            SimilarListing.objects.filter(similar__updated__gte=since).values_list(
+                "listing_id",
+                flat=True,
+            ),
+        )
+        listing_ids = sorted(changed)
+    stored = store_similar_listings(listing_ids)
+    cache.set(SIMILARITY_WATERMARK_KEY, started, timeout=None)
+    return stored
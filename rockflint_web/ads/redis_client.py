@@ -0,0 +1,15 @@
+import functools
+import ssl
+
+import redis
+from django.conf import settings
+
+
+@functools.cache
+def redis_client():
+    """
+    Process-wide client for the counters and sorted sets that need real Redis
+    commands (the Django cache API only offers get/set/incr).
+    """
+    options = {"ssl_cert_reqs": ssl.CERT_NONE} if settings.REDIS_SSL else {}
+    return redis.Redis.from_url(settings.REDIS_URL, **options)
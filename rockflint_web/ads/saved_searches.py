@@ -0,0 +1,276 @@
+"""
+New-listing alerts for saved searches.
+
+``match_saved_searches`` looks at the listings created since its previous run.
+Rather than running every saved search against them, the searches are inverted
+into buckets keyed by (state, category, offer), ``None`` standing for "any",
+and each bucket is sorted by minimum price. A listing only visits the eight
+buckets its own keys fall into and, inside each, only the searches whose
+lower price bound it clears; the remaining criteria are checked in Python on
+that short candidate list.
+
+Matches are stored as SavedSearchMatch rows and mailed as one digest per user
+by ``send_digest_batch``.
+"""
+
+import math
+from bisect import bisect_right
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby
+from itertools import product
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import SavedSearch
+from rockflint_web.ads.models import SavedSearchMatch
+
+# the ListingFilter parameters a saved search may hold
+SAVED_SEARCH_PARAMS = (
+    "state",
+    "category",
+    "offer",
+    "lga",
+    "bedrooms",
+    "min_price",
+    "max_price",
+    "latitude",
+    "longitude",
+    "radius_km",
+)
+MATCH_WATERMARK_KEY = "ads:saved-searches:watermark"
+# re-read listings created this long before the previous run, so rows
+# committed late by long transactions are not missed; repeats are ignored
+MATCH_OVERLAP = timedelta(minutes=5)
+MATCH_CHUNK_SIZE = 1000
+DIGEST_BATCH_SIZE = 100
+DIGEST_LISTINGS_PER_SEARCH = 10
+# ListingFilter's radius when only latitude and longitude are given
+DEFAULT_RADIUS_KM = 10.0
+EARTH_RADIUS_KM = 6371.0088
+
+MATCH_COLUMNS = (
+    "id",
+    "state_id",
+    "category_id",
+    "offer_id",
+    "lga_id",
+    "price",
+    "bedrooms",
+    "location",
+    "created",
+    "vendor__user_id",
+)
+NO_LOWER_BOUND = Decimal("-Infinity")
+
+
+def _lower_bound(search):
+    return NO_LOWER_BOUND if search.min_price is None else search.min_price
+
+
+class SearchIndex:
+    """Saved searches inverted into (state, category, offer) price buckets."""
+
+    def __init__(self, searches):
+        buckets = {}
+        for search in searches:
+            key = (search.state_id, search.category_id, search.offer_id)
+            buckets.setdefault(key, []).append(search)
+        self.buckets = {}
+        for key, bucket in buckets.items():
+            bucket.sort(key=_lower_bound)
+            self.buckets[key] = ([_lower_bound(search) for search in bucket], bucket)
+
+    def candidates(self, state_id, category_id, offer_id, price):
+        """Searches whose bucket and price range admit a listing."""
+        for key in product((state_id, None), (category_id, None), (offer_id, None)):
+            if key not in self.buckets:
+                continue
+            lower_bounds, searches = self.buckets[key]
+            for search in searches[: bisect_right(lower_bounds, price)]:
+                if search.max_price is None or search.max_price >= price:
+                    yield search
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _within_radius(query, location):
+    latitude = _float(query.get("latitude"))
+    longitude = _float(query.get("longitude"))
+    if latitude is None or longitude is None:
+        return True
+    radius_km = _float(query.get("radius_km"))
+    if radius_km is None:
+        radius_km = DEFAULT_RADIUS_KM
+    if radius_km <= 0:
+        return True
+    if location is None:
+        return False
+    lat1, lat2 = math.radians(latitude), math.radians(location.y)
+    cosines = math.cos(lat1) * math.cos(lat2)
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + cosines * math.sin(math.radians(location.x - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(a), 1.0)) <= radius_km
+
+
+def search_matches(search, listing):
+    """The criteria ``SearchIndex`` does not cover, for one ``MATCH_COLUMNS`` row."""
+    if listing["created"] < search.created:
+        return False
+    if listing["vendor__user_id"] == search.user_id:
+        return False
+    query = search.query
+    for param, column in [("lga", "lga_id"), ("bedrooms", "bedrooms")]:
+        value = query.get(param)
+        if value not in (None, "") and int(value) != listing[column]:
+            return False
+    return _within_radius(query, listing["location"])
+
+
+def match_listings(index, listings):
+    """SavedSearchMatch rows (unsaved) for ``MATCH_COLUMNS`` rows."""
+    return [
+        SavedSearchMatch(saved_search=search, listing_id=listing["id"])
+        for listing in listings
+        for search in index.candidates(
+            listing["state_id"],
+            listing["category_id"],
+            listing["offer_id"],
+            listing["price"],
+        )
+        if search_matches(search, listing)
+    ]
+
+
+def match_saved_searches():
+    """
+    Record the saved-search matches of listings created since the previous
+    run. The first run only sets the watermark, so existing listings are never
+    announced. Returns the number of new matches recorded.
+    """
+    started = timezone.now()
+    since = cache.get(MATCH_WATERMARK_KEY)
+    if since is None:
+        cache.set(MATCH_WATERMARK_KEY, started, timeout=None)
+        return 0
+    listings = list(
+        Listing.objects.active()
+        .filter(created__gte=since - MATCH_OVERLAP)
+        .order_by("pk")
+        .values(*MATCH_COLUMNS),
+    )
+    found = 0
+    if listings:
+        index = SearchIndex(
+            SavedSearch.objects.filter(notify=True).only(
+                "user_id",
+                "query",
+                "state_id",
+                "category_id",
+                "offer_id",
+                "min_price",
+                "max_price",
+                "created",
+            ),
+        )
+        for start in range(0, len(listings), MATCH_CHUNK_SIZE):
+            chunk = listings[start : start + MATCH_CHUNK_SIZE]
+            # the overlap re-reads listings matched last run; ignore_conflicts
+            # drops those repeats, so count the rows actually added
+            stored = SavedSearchMatch.objects.filter(
+                listing_id__in=[listing["id"] for listing in chunk],
+            )
+            before = stored.count()
+            SavedSearchMatch.objects.bulk_create(
+                match_listings(index, chunk),
+                ignore_conflicts=True,
+            )
+            found += stored.count() - before
+    cache.set(MATCH_WATERMARK_KEY, started, timeout=None)
+    return found
+
+
+def pending_digest_user_ids():
+    return list(
+        SavedSearchMatch.objects.filter(notified__isnull=True)
+        .order_by("saved_search__user_id")
+        .values_list("saved_search__user_id", flat=True)
+        .distinct(),
+    )
+
+
+def _listing_line(listing):
+    url = f"{settings.FRONTEND_URL}/listings/{listing.pk}/{listing.slug}"
+    return (
+        f"- {listing.title}: {listing.price:,.0f} "
+        f"({listing.lga.name}, {listing.state.name})\n  {url}"
+    )
+
+
+def digest_message(user, matches):
+    """One plain-text email covering every pending match of ``user``."""
+    sections = []
+    for _, grouped in groupby(matches, key=lambda match: match.saved_search_id):
+        found = list(grouped)
+        lines = [
+            _listing_line(match.listing) for match in found[:DIGEST_LISTINGS_PER_SEARCH]
+        ]
+        hidden = len(found) - DIGEST_LISTINGS_PER_SEARCH
+        if hidden > 0:
+            lines.append(f"...and {hidden} more.")
+        sections.append("\n".join([f"{found[0].saved_search}:", *lines]))
+    count = len(matches)
+    return EmailMessage(
+        f"{count} new listing{'s' if count != 1 else ''} for your saved searches",
+        "\n\n".join(sections),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+
+
+def send_digest_batch(user_ids):
+    """
+    Mail the pending matches of ``user_ids``, one digest per user over one
+    connection, and mark them notified. Rows are locked with SKIP LOCKED so
+    overlapping batches never mail a match twice; if sending fails nothing is
+    marked and the next run retries. Returns the number of emails sent.
+    """
+    with transaction.atomic():
+        pending = list(
+            SavedSearchMatch.objects.filter(
+                notified__isnull=True,
+                saved_search__user_id__in=user_ids,
+            )
+            .select_related("saved_search__user", "listing__state", "listing__lga")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("saved_search__user_id", "saved_search_id", "-listing__created"),
+        )
+        messages = []
+        for _, grouped in groupby(
+            pending,
+            key=lambda match: match.saved_search.user_id,
+        ):
+            # matches of listings deactivated since are dropped silently
+            user_matches = [match for match in grouped if match.listing.active]
+            if user_matches and user_matches[0].saved_search.user.email:
+                user = user_matches[0].saved_search.user
+                messages.append(digest_message(user, user_matches))
+        if messages:
+            get_connection().send_messages(messages)
+        SavedSearchMatch.objects.filter(pk__in=[match.pk for match in pending]).update(
+            notified=timezone.now(),
+        )
+    return len(messages)
@@ -0,0 +1,117 @@
+from itertools import batched
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+
+from rockflint_web.ads.cache import bump_listing_cache_generation
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import ListingSearchDocument
+from rockflint_web.ads.models import pick_primary_image
+
+REFRESH_CHUNK_SIZE = 500
+
+DOCUMENT_FIELDS = [
+    field.name
+    for field in ListingSearchDocument._meta.concrete_fields
+    if not field.primary_key and field.name != "refreshed"
+]
+
+
+def _image_entry(image):
+    return {
+        "id": image.id,
+        "image": image.image.name,
+        "caption": image.caption,
+        "is_primary": image.is_primary,
+        "order": image.order,
+        "variants": image.current_variants,
+    }
+
+
+def build_search_document(listing):
+    """
+    Build (unsaved) the search document for a listing fetched with
+    ``images``/``features`` prefetched and ``promotion`` selected.
+    """
+    images = list(listing.images.all())
+    primary = pick_primary_image(images)
+    features = list(listing.features.all())
+    try:
+        promotion = listing.promotion
+    except ObjectDoesNotExist:
+        promotion = None
+
+    return ListingSearchDocument(
+        listing=listing,
+        vendor_id=listing.vendor_id,
+        title=listing.title,
+        slug=listing.slug,
+        description=listing.description,
+        price=listing.price,
+        rent_period=listing.rent_period,
+        bedrooms=listing.bedrooms,
+        bathrooms=listing.bathrooms,
+        area=listing.area,
+        attributes=listing.attributes,
+        category_id=listing.category_id,
+        category_name=listing.category.name,
+        category_slug=listing.category.slug,
+        offer_id=listing.offer_id,
+        state_id=listing.state_id,
+        state_name=listing.state.name,
+        lga_id=listing.lga_id,
+        lga_name=listing.lga.name,
+        primary_image=primary.image.name if primary and primary.image else "",
+        images=[_image_entry(image) for image in images],
+        feature_ids=[feature.id for feature in features],
+        features=[
+            {"id": feature.id, "name": feature.name, "icon": feature.icon}
+            for feature in features
+        ],
+        promoted_until=(
+            promotion.promoted_until if promotion and promotion.active else None
+        ),
+        latitude=listing.location.y if listing.location else None,
+        longitude=listing.location.x if listing.location else None,
+        active=listing.active,
+        created=listing.created,
+    )
+
+
+def refresh_search_documents(listing_ids):
+    """
+    Upsert the search documents of ``listing_ids`` (any iterable) in chunks.
+
+    Ids of deleted listings are skipped; their documents cascade away.
+    """
+    refreshed = 0
+    for chunk in batched(listing_ids, REFRESH_CHUNK_SIZE):
+        listings = (
+            Listing.objects.filter(pk__in=chunk)
+            .select_related("category", "state", "lga", "promotion")
+            .prefetch_related("images", "features")
+        )
+        documents = [build_search_document(listing) for listing in listings]
+        ListingSearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=["listing"],
+            update_fields=[*DOCUMENT_FIELDS, "refreshed"],
+        )
+        refreshed += len(documents)
+    if refreshed:
+        # responses rendered from the previous documents are now stale
+        bump_listing_cache_generation()
+    return refreshed
+
+
+def schedule_search_document_refresh(listing_ids):
+    """Queue a refresh once the current transaction commits."""
+    from rockflint_web.ads.tasks import refresh_listing_search_documents
+
+    listing_ids = sorted({pk for pk in listing_ids if pk is not None})
+    if not listing_ids:
+        return
+    transaction.on_commit(
+        lambda: refresh_listing_search_documents.delay(listing_ids),
+    )
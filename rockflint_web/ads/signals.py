@@ -0,0 +1,173 @@
+# ads/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .autocomplete import clear_location_vocabulary
+from .bootstrap import bump_lookup_version
+from .cache import bump_listing_cache_generation
+from .image_variants import delete_variant_files
+from .image_variants import variant_names
+from .models import LGA
+from .models import Category
+from .models import Favorite
+from .models import Feature
+from .models import Listing
+from .models import ListingImage
+from .models import Offer
+from .models import PromotedListing
+from .models import Review
+from .models import State
+from .models import sync_primary_image
+from .search_documents import schedule_search_document_refresh
+from .tasks import generate_listing_image_variants
+from .tasks import refresh_location_search_vectors
+from .tasks import refresh_related_search_documents
+from .tiles import invalidate_listing_tiles
+from .tiles import invalidate_tiles
+from .trending import FAVORITE_WEIGHT
+from .trending import REVIEW_WEIGHT
+from .trending import record_engagement
+
+
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=LGA)
+def location_renamed(sender, instance, created, **kwargs):
+    loaded_name = getattr(instance, "_loaded_name", None)
+    instance._loaded_name = instance.name  # noqa: SLF001
+    if created or instance.name == loaded_name:
+        return
+    field = sender._meta.model_name
+    transaction.on_commit(
+        lambda: refresh_location_search_vectors.delay(field, instance.pk),
+    )
+
+
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=LGA)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=State)
+@receiver(post_delete, sender=LGA)
+@receiver(post_delete, sender=Category)
+def reset_location_vocabulary(sender, **kwargs):
+    clear_location_vocabulary()
+
+
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=LGA)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Offer)
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=State)
+@receiver(post_delete, sender=LGA)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Offer)
+@receiver(post_delete, sender=Feature)
+def lookups_changed(sender, **kwargs):
+    bump_lookup_version()
+
+
+@receiver(post_delete, sender=PromotedListing)
+def reset_promotion_rank(sender, instance, **kwargs):
+    Listing.objects.filter(pk=instance.listing_id).update(promotion_rank=0)
+
+
+@receiver(post_delete, sender=ListingImage)
+def resync_primary_image(sender, instance, **kwargs):
+    sync_primary_image(instance.listing_id)
+
+
+@receiver(post_save, sender=ListingImage)
+def queue_image_variants(sender, instance, **kwargs):
+    # new uploads and replaced images; caption or order edits keep variants
+    if instance.image and instance.variants_source != instance.image.name:
+        transaction.on_commit(
+            lambda: generate_listing_image_variants.delay(instance.pk),
+        )
+
+
+@receiver(post_delete, sender=ListingImage)
+def delete_image_variants(sender, instance, **kwargs):
+    storage = instance.image.storage
+    names = variant_names(instance.variants)
+    if names:
+        transaction.on_commit(lambda: delete_variant_files(storage, names))
+
+
+# ---------- Listing change propagation ----------
+
+
+def touch_listings(listing_ids):
+    # Listing.updated versions the whole detail representation (ETags)
+    Listing.objects.filter(pk__in=listing_ids).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Listing)
+def listing_saved(sender, instance, **kwargs):
+    schedule_search_document_refresh([instance.pk])
+    bump_listing_cache_generation()
+    invalidate_tiles([getattr(instance, "_loaded_location", None), instance.location])
+    instance._loaded_location = instance.location  # noqa: SLF001
+
+
+@receiver(post_delete, sender=Listing)
+def listing_deleted(sender, instance, **kwargs):
+    bump_listing_cache_generation()
+    invalidate_tiles([instance.location])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Review)
+def engagement_created(sender, instance, created, **kwargs):
+    if created:
+        weight = FAVORITE_WEIGHT if sender is Favorite else REVIEW_WEIGHT
+        record_engagement(instance.listing, weight)
+
+
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+@receiver(post_save, sender=PromotedListing)
+@receiver(post_delete, sender=PromotedListing)
+def listing_child_changed(sender, instance, **kwargs):
+    touch_listings([instance.listing_id])
+    schedule_search_document_refresh([instance.listing_id])
+    bump_listing_cache_generation()
+    if sender is PromotedListing:
+        # tiles carry the promoted flag, not images
+        invalidate_listing_tiles([instance.listing_id])
+
+
+@receiver(m2m_changed, sender=Listing.features.through)
+def listing_features_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # post_clear has no pk_set: note the listings losing the feature now
+        instance._cleared_listing_ids = list(  # noqa: SLF001
+            instance.listings.values_list("pk", flat=True),
+        )
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if action == "post_clear" and reverse:
+        listing_ids = instance.__dict__.pop("_cleared_listing_ids", [])
+    else:
+        listing_ids = (pk_set or []) if reverse else [instance.pk]
+    bump_listing_cache_generation()
+    touch_listings(listing_ids)
+    schedule_search_document_refresh(listing_ids)
+    invalidate_listing_tiles(listing_ids)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=LGA)
+@receiver(post_save, sender=Feature)
+def lookup_renamed(sender, instance, created, **kwargs):
+    if created:
+        return
+    bump_listing_cache_generation()
+    field = "features" if sender is Feature else sender._meta.model_name
+    transaction.on_commit(
+        lambda: refresh_related_search_documents.delay(field, instance.pk),
+    )
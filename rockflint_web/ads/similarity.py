@@ -0,0 +1,270 @@
+"""
+In-process, vectorized similarity scoring for listing recommendations.
+
+Each worker keeps a columnar NumPy snapshot of the active listings of every
+category it has been asked about. Snapshots are refreshed incrementally (only
+rows whose ``updated`` moved) at most every ``REFRESH_INTERVAL`` seconds, so
+scoring a listing is array math over its category instead of a SQL sort.
+"""
+
+import math
+import threading
+import time
+import warnings
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from rockflint_web.ads.models import Listing
+
+REFRESH_INTERVAL = 60
+# re-read rows updated this long before the last sync, so rows committed late
+# by long transactions are not missed
+SYNC_OVERLAP = timedelta(minutes=5)
+EARTH_RADIUS_KM = 6371.0088
+# proximity halves roughly every 17 km
+PROXIMITY_SCALE_KM = 25.0
+
+WEIGHT_NUMERIC = 0.5
+WEIGHT_PROXIMITY = 0.3
+WEIGHT_FEATURES = 0.2
+# relative weights inside the normalized attribute distance
+NUMERIC_WEIGHTS = np.array([3.0, 1.0, 0.5, 0.5])  # price, bed, bath, area
+# distance contributed by an attribute missing on either side
+MISSING_DISTANCE = 1.0
+
+LISTING_COLUMNS = ("id", "price", "location", "bedrooms", "bathrooms", "area")
+
+_lock = threading.Lock()
+_categories = {}
+
+
+def _log(values):
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(values > 0, np.log(values), np.nan)
+
+
+def _feature_words(feature_ids):
+    return max(feature_ids, default=0) // 64 + 1
+
+
+def _feature_bitsets(ids, features_by_listing, words):
+    bitsets = np.zeros((len(ids), words), dtype=np.uint64)
+    for row, listing_id in enumerate(ids):
+        for feature_id in features_by_listing.get(listing_id, ()):
+            bitsets[row, feature_id // 64] |= np.uint64(1 << (feature_id % 64))
+    return bitsets
+
+
+def _widen(bitsets, words):
+    if bitsets.shape[1] >= words:
+        return bitsets
+    return np.pad(bitsets, ((0, 0), (0, words - bitsets.shape[1])))
+
+
+def _listing_features(listing_ids):
+    through = Listing.features.through.objects.filter(listing_id__in=listing_ids)
+    features = {}
+    for listing_id, feature_id in through.values_list("listing_id", "feature_id"):
+        features.setdefault(listing_id, []).append(feature_id)
+    return features
+
+
+def _numeric_matrix(rows):
+    # log price and log1p area make ratios, not absolute gaps, comparable
+    matrix = np.array(
+        [
+            [np.nan if value is None else float(value) for value in row[1:2] + row[3:6]]
+            for row in rows
+        ],
+        dtype=np.float64,
+    ).reshape(len(rows), 4)
+    matrix[:, 0] = _log(matrix[:, 0])
+    matrix[:, 3] = np.log1p(matrix[:, 3])
+    return matrix
+
+
+def _columns(rows, features_by_listing, words):
+    """Column arrays for ``LISTING_COLUMNS`` rows."""
+    ids = [row[0] for row in rows]
+    return {
+        "ids": np.array(ids, dtype=np.int64),
+        "price": np.array(
+            [np.nan if row[1] is None else float(row[1]) for row in rows],
+            dtype=np.float64,
+        ),
+        "latitude": np.radians(
+            np.array([row[2].y if row[2] else np.nan for row in rows], dtype=float),
+        ),
+        "longitude": np.radians(
+            np.array([row[2].x if row[2] else np.nan for row in rows], dtype=float),
+        ),
+        "numeric": _numeric_matrix(rows),
+        "features": _feature_bitsets(ids, features_by_listing, words),
+    }
+
+
+def _words_for(features_by_listing):
+    return _feature_words(
+        [pk for features in features_by_listing.values() for pk in features],
+    )
+
+
+class CategoryVectors:
+    """Columnar snapshot of the active listings of one category."""
+
+    def __init__(self, category_id):
+        self.category_id = category_id
+        self.synced_at = None
+        self.checked_at = -math.inf
+        self._publish(_columns([], {}, 1))
+
+    def _publish(self, columns):
+        numeric = columns["numeric"]
+        scale = np.ones(numeric.shape[1])
+        if len(numeric):
+            with np.errstate(invalid="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                scale = np.nanstd(numeric, axis=0)
+        columns["scale"] = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+        # one attribute swap keeps concurrent readers on a consistent snapshot
+        self.columns = columns
+
+    def load(self):
+        self.synced_at = timezone.now()
+        listings = Listing.objects.filter(category_id=self.category_id, active=True)
+        rows = list(listings.order_by("pk").values_list(*LISTING_COLUMNS))
+        features_by_listing = _listing_features([row[0] for row in rows])
+        self._publish(
+            _columns(rows, features_by_listing, _words_for(features_by_listing)),
+        )
+
+    def refresh(self):
+        """Merge rows changed since the last sync; reload if rows went missing."""
+        if self.synced_at is None:
+            self.load()
+            return
+        started = timezone.now()
+        changed = list(
+            Listing.objects.filter(
+                category_id=self.category_id,
+                updated__gte=self.synced_at - SYNC_OVERLAP,
+            ).values_list(*LISTING_COLUMNS, "active"),
+        )
+        if changed:
+            self._merge(changed)
+        active = Listing.objects.filter(category_id=self.category_id, active=True)
+        if active.count() != len(self.columns["ids"]):
+            # deletions and listings moved to another category
+            self.load()
+            return
+        self.synced_at = started
+
+    def _merge(self, changed):
+        current = self.columns
+        keep = ~np.isin(current["ids"], [row[0] for row in changed])
+        rows = [row[:-1] for row in changed if row[-1]]
+        features_by_listing = _listing_features([row[0] for row in rows])
+        words = max(current["features"].shape[1], _words_for(features_by_listing))
+        fresh = _columns(rows, features_by_listing, words)
+        kept = {name: current[name][keep] for name in fresh}
+        kept["features"] = _widen(kept["features"], words)
+        self._publish(
+            {name: np.concatenate([kept[name], fresh[name]]) for name in fresh},
+        )
+
+    def score(self, source, *, price_tolerance=None):
+        """
+        (ids, scores) of every candidate other than ``source``, where
+        ``source`` comes from ``listing_vector``. ``price_tolerance`` keeps
+        only candidates priced within that fraction of the source price.
+        """
+        columns = self.columns
+        mask = columns["ids"] != source["id"]
+        if price_tolerance is not None and source["price"] is not None:
+            tolerance = float(price_tolerance)
+            lower = max(source["price"] * (1 - tolerance), 0.0)
+            upper = source["price"] * (1 + tolerance)
+            mask &= (columns["price"] >= lower) & (columns["price"] <= upper)
+        ids = columns["ids"][mask]
+        if not len(ids):
+            return ids, np.zeros(0)
+
+        gaps = np.abs(columns["numeric"][mask] - source["numeric"]) / columns["scale"]
+        gaps = np.nan_to_num(gaps, nan=MISSING_DISTANCE)
+        distance = gaps @ NUMERIC_WEIGHTS / NUMERIC_WEIGHTS.sum()
+        scores = WEIGHT_NUMERIC / (1 + distance)
+
+        if not math.isnan(source["latitude"]):
+            latitude = columns["latitude"][mask]
+            half_dlat = (latitude - source["latitude"]) / 2
+            half_dlon = (columns["longitude"][mask] - source["longitude"]) / 2
+            cosines = np.cos(latitude) * math.cos(source["latitude"])
+            a = np.sin(half_dlat) ** 2 + cosines * np.sin(half_dlon) ** 2
+            km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+            scores += WEIGHT_PROXIMITY * np.nan_to_num(np.exp(-km / PROXIMITY_SCALE_KM))
+
+        features = columns["features"][mask]
+        wanted = _widen(source["features"][np.newaxis, :], features.shape[1])[0]
+        features = _widen(features, wanted.shape[0])
+        shared = np.bitwise_count(features & wanted).sum(axis=1)
+        either = np.bitwise_count(features | wanted).sum(axis=1)
+        scores += WEIGHT_FEATURES * np.divide(
+            shared,
+            either,
+            out=np.zeros(len(ids)),
+            where=either > 0,
+        )
+        return ids, scores
+
+
+def listing_vector(listing, feature_ids=None):
+    """The scoring inputs of one listing (active or not)."""
+    if feature_ids is None:
+        feature_ids = [feature.pk for feature in listing.features.all()]
+    row = tuple(getattr(listing, column) for column in LISTING_COLUMNS)
+    columns = _columns([row], {listing.pk: feature_ids}, _feature_words(feature_ids))
+    return {
+        "id": listing.pk,
+        "price": float(listing.price) if listing.price is not None else None,
+        "latitude": float(columns["latitude"][0]),
+        "longitude": float(columns["longitude"][0]),
+        "numeric": columns["numeric"][0],
+        "features": columns["features"][0],
+    }
+
+
+def category_vectors(category_id, *, max_age=REFRESH_INTERVAL):
+    """The worker's snapshot of ``category_id``, at most ``max_age`` seconds old."""
+    vectors = _categories.get(category_id)
+    if vectors is not None and time.monotonic() - vectors.checked_at < max_age:
+        return vectors
+    with _lock:
+        vectors = _categories.setdefault(category_id, CategoryVectors(category_id))
+        if time.monotonic() - vectors.checked_at >= max_age:
+            vectors.refresh()
+            vectors.checked_at = time.monotonic()
+    return vectors
+
+
+def clear_similarity_vectors():
+    with _lock:
+        _categories.clear()
+
+
+def rank_similar(listing, *, price_tolerance=None, limit=6, feature_ids=None):
+    """[(listing_id, score), ...] best first, ties broken by newest id."""
+    vectors = category_vectors(listing.category_id)
+    ids, scores = vectors.score(
+        listing_vector(listing, feature_ids),
+        price_tolerance=price_tolerance,
+    )
+    if not len(ids):
+        return []
+    if len(ids) > limit:
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        ids, scores = ids[top], scores[top]
+    order = np.lexsort((-ids, -scores))
+    return [(int(ids[index]), float(scores[index])) for index in order]
@@ -0,0 +1,160 @@
+from celery import shared_task
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump_listing_cache_generation
+from .co_favorites import rebuild_favorite_neighbors as build_favorite_neighbors
+from .image_variants import generate_image_variants
+from .listing_views import flush_listing_views as flush_pending_listing_views
+from .models import Listing
+from .models import ListingImage
+from .models import PromotedListing
+from .price_stats import refresh_price_rollups as rebuild_price_rollups
+from .recommendations import refresh_similar_listings as recompute_similar_listings
+from .saved_searches import DIGEST_BATCH_SIZE
+from .saved_searches import match_saved_searches as match_new_listings
+from .saved_searches import pending_digest_user_ids
+from .saved_searches import send_digest_batch
+from .search_documents import REFRESH_CHUNK_SIZE
+from .search_documents import refresh_search_documents
+from .search_documents import schedule_search_document_refresh
+from .tiles import invalidate_listing_tiles
+from .trending import decay_trending_scores as decay_scores
+from .trending import rebuild_trending_scores as rebuild_scores
+
+RELATED_DOCUMENT_FIELDS = {"category", "state", "lga", "features"}
+
+
+@shared_task()
+def refresh_listing_search_documents(listing_ids):
+    """Rebuild the search documents of the given listings."""
+    return refresh_search_documents(listing_ids)
+
+
+@shared_task()
+def refresh_related_search_documents(field, pk):
+    """Rebuild the documents of every listing pointing at a renamed lookup row."""
+    if field not in RELATED_DOCUMENT_FIELDS:
+        return 0
+    listing_ids = Listing.objects.filter(**{field: pk}).values_list("pk", flat=True)
+    return refresh_search_documents(listing_ids.iterator(chunk_size=REFRESH_CHUNK_SIZE))
+
+
+@shared_task()
+def refresh_location_search_vectors(field, pk):
+    """Recompute the search vectors of the listings in a renamed state or LGA."""
+    if field not in ("state", "lga"):
+        return 0
+    return Listing.objects.filter(**{field: pk}).update_search_vector()
+
+
+@shared_task()
+def rebuild_listing_search_documents():
+    """Backfill or repair every search document."""
+    listing_ids = Listing.objects.values_list("pk", flat=True)
+    return refresh_search_documents(listing_ids.iterator(chunk_size=REFRESH_CHUNK_SIZE))
+
+
+@shared_task()
+def expire_promotions():
+    """
+    Deactivate promotions past ``promoted_until`` and drop the matching
+    listings out of the promoted rank, in two set-based UPDATEs.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        expired = PromotedListing.objects.filter(active=True, promoted_until__lte=now)
+        listing_ids = set(expired.values_list("listing_id", flat=True))
+        expired.update(active=False)
+        # also catches ranks left behind by out-of-band promotion edits
+        stale = Listing.objects.filter(promotion_rank__gt=0).exclude(
+            promotion__active=True,
+            promotion__promoted_until__gt=now,
+        )
+        listing_ids.update(stale.values_list("pk", flat=True))
+        Listing.objects.filter(pk__in=listing_ids).update(promotion_rank=0)
+        schedule_search_document_refresh(listing_ids)
+        if listing_ids:
+            bump_listing_cache_generation()
+            invalidate_listing_tiles(listing_ids)
+    return len(listing_ids)
+
+
+@shared_task()
+def refresh_price_rollups():
+    """Recompute the per (state, category, offer) price statistics."""
+    return rebuild_price_rollups()
+
+
+@shared_task()
+def refresh_similar_listings(*, full=False):
+    """Incrementally (or, with ``full``, completely) refresh SimilarListing."""
+    return recompute_similar_listings(full=full)
+
+
+@shared_task()
+def rebuild_favorite_neighbors():
+    """Nightly rebuild of the "people who saved this also saved" store."""
+    return build_favorite_neighbors()
+
+
+@shared_task()
+def flush_listing_views():
+    """Move buffered Redis view counts into ListingViewStat."""
+    return flush_pending_listing_views()
+
+
+@shared_task()
+def decay_trending_scores():
+    """Apply the time decay to every trending scope."""
+    return decay_scores()
+
+
+@shared_task()
+def rebuild_trending_scores():
+    """Rebuild the trending scopes from the engagement tables."""
+    return rebuild_scores()
+
+
+@shared_task()
+def match_saved_searches():
+    """Record which saved searches the newly created listings match."""
+    return match_new_listings()
+
+
+@shared_task()
+def send_saved_search_digests():
+    """Queue one digest batch per ``DIGEST_BATCH_SIZE`` users with new matches."""
+    user_ids = pending_digest_user_ids()
+    for start in range(0, len(user_ids), DIGEST_BATCH_SIZE):
+        batch = user_ids[start : start + DIGEST_BATCH_SIZE]
+        send_saved_search_digest_batch.delay(batch)
+    return len(user_ids)
+
+
+@shared_task()
+def send_saved_search_digest_batch(user_ids):
+    """Mail the pending saved-search matches of ``user_ids``."""
+    return send_digest_batch(user_ids)
+
+
+@shared_task()
+def generate_listing_image_variants(image_id):
+    """Build the resized WebP/JPEG variants of an uploaded listing image."""
+    return generate_image_variants(image_id)
+
+
+@shared_task()
+def rebuild_listing_image_variants():
+    """Queue variant builds for every image without up-to-date variants."""
+    image_ids = (
+        ListingImage.objects.exclude(image="")
+        .exclude(variants_source=F("image"))
+        .values_list("pk", flat=True)
+    )
+    queued = 0
+    for image_id in image_ids.iterator(chunk_size=REFRESH_CHUNK_SIZE):
+        generate_listing_image_variants.delay(image_id)
+        queued += 1
+    return queued
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from rockflint_web.ads.models import LGA
+from rockflint_web.ads.models import Category
+from rockflint_web.ads.models import Feature
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import ListingImage
+from rockflint_web.ads.models import ListingSearchDocument
+from rockflint_web.ads.models import Offer
+from rockflint_web.ads.models import PromotedListing
+from rockflint_web.ads.models import State
+from rockflint_web.ads.search_documents import refresh_search_documents
+from rockflint_web.users.models import Vendor
+from rockflint_web.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def listing():
+    state = State.objects.create(name="Lagos")
+    lga = LGA.objects.create(state=state, name="Ikeja")
+    vendor = Vendor.objects.create(user=UserFactory(), company_name="Test Co")
+    listing = Listing.objects.create(
+        vendor=vendor,
+        title="Two bedroom flat",
+        category=Category.objects.create(name="Apartment"),
+        offer=Offer.objects.create(name="For Rent"),
+        state=state,
+        lga=lga,
+        price=1200,
+    )
+    listing.features.add(Feature.objects.create(name="Pool"))
+    image = SimpleUploadedFile("photo.jpg", b"filecontent", content_type="image/jpeg")
+    ListingImage.objects.create(listing=listing, image=image, is_primary=True)
+    return listing
+
+
+def test_refresh_builds_flat_document(listing):
+    promoted_until = timezone.now() + timedelta(days=3)
+    PromotedListing.objects.create(listing=listing, promoted_until=promoted_until)
+
+    assert refresh_search_documents([listing.pk]) == 1
+
+    document = ListingSearchDocument.objects.get(listing=listing)
+    assert document.state_name == "Lagos"
+    assert document.lga_name == "Ikeja"
+    assert document.category_name == "Apartment"
+    assert document.feature_ids == list(listing.features.values_list("id", flat=True))
+    assert document.primary_image == listing.images.get().image.name
+    assert document.promoted_until == promoted_until
+
+
+def test_list_renders_document_like_listing_serializer(listing):
+    client = APIClient()
+    url = reverse("ads:listings-list")
+    live = client.get(url)
+
+    refresh_search_documents([listing.pk])
+    cache.clear()
+    served = client.get(url)
+
+    assert served.status_code == status.HTTP_200_OK
+    assert served.data["results"] == live.data["results"]
+
+
+def test_clearing_feature_listings_refreshes_them(
+    listing,
+    settings,
+    django_capture_on_commit_callbacks,
+):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    refresh_search_documents([listing.pk])
+    updated = Listing.objects.get(pk=listing.pk).updated
+
+    with django_capture_on_commit_callbacks(execute=True):
+        listing.features.get().listings.clear()
+
+    assert Listing.objects.get(pk=listing.pk).updated > updated
+    assert ListingSearchDocument.objects.get(listing=listing).feature_ids == []
@@ -0,0 +1,291 @@
+import io
+from datetime import timedelta
+
+import fakeredis
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIRequestFactory
+
+from rockflint_web.ads import listing_views
+from rockflint_web.ads.api.serializers import ListingImageSerializer
+from rockflint_web.ads.api.serializers import ListingSerializer
+from rockflint_web.ads.listing_views import record_listing_view
+from rockflint_web.ads.models import LGA
+from rockflint_web.ads.models import Category
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import ListingImage
+from rockflint_web.ads.models import ListingViewStat
+from rockflint_web.ads.models import Offer
+from rockflint_web.ads.models import PromotedListing
+from rockflint_web.ads.models import SavedSearch
+from rockflint_web.ads.models import SavedSearchMatch
+from rockflint_web.ads.models import SimilarListing
+from rockflint_web.ads.models import State
+from rockflint_web.ads.recommendations import similar_listings_for
+from rockflint_web.ads.recommendations import stored_similar_listings
+from rockflint_web.ads.tasks import expire_promotions
+from rockflint_web.ads.tasks import flush_listing_views
+from rockflint_web.ads.tasks import generate_listing_image_variants
+from rockflint_web.ads.tasks import match_saved_searches
+from rockflint_web.ads.tasks import refresh_location_search_vectors
+from rockflint_web.ads.tasks import refresh_similar_listings
+from rockflint_web.ads.tasks import send_saved_search_digest_batch
+from rockflint_web.users.models import Vendor
+from rockflint_web.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def listing_factory():
+    state = State.objects.create(name="Test State")
+    lga = LGA.objects.create(state=state, name="Test LGA")
+    category = Category.objects.create(name="Apartment")
+    offer = Offer.objects.create(name="For Rent")
+    vendor = Vendor.objects.create(user=UserFactory(), company_name="Test Co")
+
+    def create(title="Test Listing", **kwargs):
+        fields = {
+            "vendor": vendor,
+            "title": title,
+            "category": category,
+            "offer": offer,
+            "state": state,
+            "lga": lga,
+            "price": 1200,
+            **kwargs,
+        }
+        return Listing.objects.create(**fields)
+
+    return create
+
+
+def test_promotion_rank_follows_promotion(listing_factory):
+    listing = listing_factory()
+    promotion = PromotedListing.objects.create(
+        listing=listing,
+        promoted_until=timezone.now() + timedelta(days=1),
+    )
+    listing.refresh_from_db()
+    assert listing.promotion_rank == 1
+
+    promotion.delete()
+    listing.refresh_from_db()
+    assert listing.promotion_rank == 0
+
+
+def test_expire_promotions_demotes_expired_listings(listing_factory):
+    expired = listing_factory(title="Expired")
+    live = listing_factory(title="Live")
+    PromotedListing.objects.create(
+        listing=expired,
+        promoted_until=timezone.now() + timedelta(days=1),
+    )
+    PromotedListing.objects.create(
+        listing=live,
+        promoted_until=timezone.now() + timedelta(days=1),
+    )
+    PromotedListing.objects.filter(listing=expired).update(
+        promoted_until=timezone.now() - timedelta(minutes=1),
+    )
+
+    assert expire_promotions() == 1
+
+    expired.refresh_from_db()
+    live.refresh_from_db()
+    assert expired.promotion_rank == 0
+    assert not PromotedListing.objects.get(listing=expired).active
+    assert live.promotion_rank == 1
+
+
+def test_refresh_similar_listings_matches_live_and_tracks_changes(listing_factory):
+    source = listing_factory(title="Source", price=1000)
+    near = listing_factory(title="Near", price=1100)
+    far = listing_factory(title="Far", price=1150)
+    mansion = listing_factory(title="Mansion", price=5000)
+    listing_factory(title="Villa", price=5100)
+
+    assert refresh_similar_listings(full=True) > 0
+    assert stored_similar_listings(source) == list(similar_listings_for(source))
+    assert [item.pk for item in stored_similar_listings(source)] == [near.pk, far.pk]
+
+    far.price = 1010
+    far.save()
+    SimilarListing.objects.filter(listing=mansion).delete()
+    refresh_similar_listings()
+
+    assert [item.pk for item in stored_similar_listings(source)] == [far.pk, near.pk]
+    # unrelated listings are not recomputed incrementally
+    assert not SimilarListing.objects.filter(listing=mansion).exists()
+
+
+@pytest.fixture
+def view_counters(monkeypatch):
+    # a private in-memory Redis, never the shared one
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(listing_views, "redis_client", lambda: client)
+    return client
+
+
+def test_flush_listing_views_accumulates_daily_stats(listing_factory, view_counters):
+    listing = listing_factory()
+    for visitor in ["user:1", "user:2", "user:1"]:
+        record_listing_view(listing.pk, visitor)
+
+    assert flush_listing_views() == 1
+    stat = ListingViewStat.objects.get(listing=listing, date=timezone.localdate())
+    assert (stat.views, stat.uniques) == (3, 2)
+
+    record_listing_view(listing.pk, "user:3")
+    record_listing_view(listing.pk + 1000, "user:3")  # deleted listing
+    assert flush_listing_views() == 1
+    stat.refresh_from_db()
+    assert (stat.views, stat.uniques) == (4, 3)
+    assert flush_listing_views() == 0
+
+
+def test_flush_listing_views_is_exclusive_and_replay_safe(
+    listing_factory,
+    view_counters,
+    monkeypatch,
+):
+    listing = listing_factory()
+    record_listing_view(listing.pk, "user:1")
+    record_listing_view(listing.pk, "user:2")
+
+    view_counters.set(listing_views.FLUSH_LOCK_KEY, "other-worker")
+    assert flush_listing_views() == 0
+    view_counters.delete(listing_views.FLUSH_LOCK_KEY)
+
+    # the batch commits, then the worker dies before forgetting it
+    def crash(*args):
+        raise ConnectionError
+
+    with monkeypatch.context() as patched:
+        patched.setattr(view_counters, "hdel", crash)
+        with pytest.raises(ConnectionError):
+            flush_listing_views()
+
+    flush_listing_views()
+    stat = ListingViewStat.objects.get(listing=listing, date=timezone.localdate())
+    assert stat.views == 2
+    assert not view_counters.exists(listing_views.FLUSHING_VIEWS_KEY)
+
+
+def test_saved_search_digest_covers_new_matches(listing_factory, mailoutbox):
+    category = Category.objects.get(name="Apartment")
+    user = UserFactory()
+    budget = SavedSearch.objects.create(
+        user=user,
+        name="Budget flats",
+        query={"category": str(category.pk), "max_price": "2000"},
+    )
+    large = SavedSearch.objects.create(
+        user=user,
+        name="Large homes",
+        query={"min_price": "5000", "bedrooms": "3"},
+    )
+    SavedSearch.objects.create(
+        user=UserFactory(),
+        query={"category": str(category.pk)},
+        notify=False,
+    )
+    assert (budget.category_id, budget.max_price) == (category.pk, 2000)
+    assert match_saved_searches() == 0  # first run only sets the watermark
+
+    cheap = listing_factory("Cheap", price=1500)
+    listing_factory("Pricey", price=3000)
+    mansion = listing_factory("Mansion", price=9000, bedrooms=3)
+    listing_factory("Villa", price=9000, bedrooms=2)
+    assert match_saved_searches() == 2
+    # the overlap window re-reads them, without duplicates or recounting
+    assert match_saved_searches() == 0
+    matches = SavedSearchMatch.objects.values_list("saved_search_id", "listing_id")
+    assert set(matches) == {(budget.pk, cheap.pk), (large.pk, mansion.pk)}
+
+    assert send_saved_search_digest_batch([user.pk]) == 1
+    assert send_saved_search_digest_batch([user.pk]) == 0
+    (message,) = mailoutbox
+    assert message.to == [user.email]
+    assert "Budget flats:\n- Cheap" in message.body
+    assert "Large homes:\n- Mansion" in message.body
+
+
+def test_only_location_renames_refresh_search_vectors(
+    listing_factory,
+    monkeypatch,
+    settings,
+    django_capture_on_commit_callbacks,
+):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    listing = listing_factory()
+    queued = []
+    monkeypatch.setattr(
+        refresh_location_search_vectors,
+        "delay",
+        lambda *args: queued.append(args),
+    )
+    state = State.objects.get(pk=listing.state_id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        state.save()
+    assert queued == []
+
+    state.name = "Lagos Island"
+    with django_capture_on_commit_callbacks(execute=True):
+        state.save()
+        state.save()
+    assert queued == [("state", state.pk)]
+    assert not Listing.objects.filter(search_vector="island").exists()
+
+    assert refresh_location_search_vectors(*queued[0]) == 1
+    assert Listing.objects.filter(search_vector="island").exists()
+
+
+def test_listing_slugs_are_unique_per_vendor(listing_factory):
+    first = listing_factory()
+    second = listing_factory()
+    other_vendor = Vendor.objects.create(user=UserFactory(), company_name="Other Co")
+    other = listing_factory(vendor=other_vendor)
+
+    assert first.slug == "test-listing"
+    assert second.slug == "test-listing-2"
+    assert other.slug == "test-listing"
+
+
+def test_image_variants_are_resized_and_exposed_as_srcset(listing_factory):
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), "navy").save(buffer, "JPEG")
+    image = ListingImage.objects.create(
+        listing=listing_factory(),
+        image=SimpleUploadedFile("photo.jpg", buffer.getvalue()),
+    )
+    assert ListingImageSerializer(image).data["srcset"] is None
+
+    assert generate_listing_image_variants(image.pk) == 3
+
+    image.refresh_from_db()
+    sizes = {
+        name: (variant["width"], variant["height"])
+        for name, variant in image.variants.items()
+    }
+    # the 800px source is not upscaled to the full width
+    assert sizes == {"thumbnail": (320, 240), "card": (640, 480), "full": (800, 600)}
+    storage = image.image.storage
+    with storage.open(image.variants["thumbnail"]["webp"]) as thumbnail:
+        assert Image.open(thumbnail).format == "WEBP"
+    srcset = ListingImageSerializer(image).data["srcset"]
+    assert srcset["webp"].endswith(".webp 800w")
+    assert [entry.split()[-1] for entry in srcset["jpeg"].split(", ")] == [
+        "320w",
+        "640w",
+        "800w",
+    ]
+
+    # the listing's primary srcset uses the same absolute URLs as its images
+    request = APIRequestFactory().get("/")
+    listing = Listing.objects.prefetch_related("images").get(pk=image.listing_id)
+    data = ListingSerializer(listing, context={"request": request}).data
+    assert data["primary_image_srcset"] == data["images"][0]["srcset"]
@@ -1,15 +1,37 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import fakeredis
 import pytest
+from django.contrib.gis.geos import Point
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from rockflint_web.ads import listing_views
+from rockflint_web.ads import trending
+from rockflint_web.ads.autocomplete import clear_location_vocabulary
+from rockflint_web.ads.cache import bump_listing_cache_generation
+from rockflint_web.ads.clusters import cluster_listings
+from rockflint_web.ads.clusters import parse_bbox
+from rockflint_web.ads.listing_views import record_listing_view
+from rockflint_web.ads.models import LGA
 from rockflint_web.ads.models import Category
+from rockflint_web.ads.models import Favorite
+from rockflint_web.ads.models import Feature
 from rockflint_web.ads.models import Listing
 from rockflint_web.ads.models import ListingImage
-from rockflint_web.ads.models import LGA
 from rockflint_web.ads.models import Offer
+from rockflint_web.ads.models import PromotedListing
 from rockflint_web.ads.models import State
+from rockflint_web.ads.price_stats import PRICE_HISTOGRAM_BUCKETS
+from rockflint_web.ads.price_stats import refresh_price_rollups
+from rockflint_web.ads.tasks import rebuild_favorite_neighbors
+from rockflint_web.ads.tiles import tiles_for_point
 from rockflint_web.users.models import Vendor
 from rockflint_web.users.tests.factories import UserFactory
 
@@ -120,3 +142,702 @@ def test_listing_images_scoped_to_vendor(api_client, listing_dependencies):
     assert response.status_code == status.HTTP_200_OK
     data = response.data.get("results", response.data)
     assert len(data) == 1
+
+
+def test_listing_cursor_pagination_keeps_promoted_first(
+    api_client,
+    listing_dependencies,
+):
+    vendor = create_vendor(UserFactory())
+    listings = [
+        create_listing(vendor, listing_dependencies, title=f"Listing {index}")
+        for index in range(5)
+    ]
+    PromotedListing.objects.create(
+        listing=listings[0],
+        promoted_until=timezone.now() + timedelta(days=7),
+    )
+
+    url = reverse("ads:listings-list")
+    response = api_client.get(url, {"pagination": "cursor", "page_size": 2})
+    assert response.status_code == status.HTTP_200_OK
+    assert "count" not in response.data
+    assert response.data["previous"] is None
+
+    seen = [item["id"] for item in response.data["results"]]
+    next_url = response.data["next"]
+    while next_url:
+        response = api_client.get(next_url)
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(item["id"] for item in response.data["results"])
+        next_url = response.data["next"]
+
+    assert seen[0] == listings[0].id
+    assert sorted(seen) == sorted(listing.id for listing in listings)
+    assert len(seen) == len(set(seen))
+
+
+def test_listing_cursor_pagination_rejects_bad_cursor(api_client):
+    response = api_client.get(reverse("ads:listings-list"), {"cursor": "garbage"})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_listing_nearest_orders_by_distance(api_client, listing_dependencies):
+    vendor = create_vendor(UserFactory())
+    far = create_listing(vendor, listing_dependencies, title="Abuja flat")
+    far.location = Point(7.4951, 9.0579, srid=4326)
+    far.save()
+    near = create_listing(vendor, listing_dependencies, title="Ikeja flat")
+    near.location = Point(3.3515, 6.6018, srid=4326)
+    near.save()
+    create_listing(vendor, listing_dependencies, title="Unplaced flat")
+
+    response = api_client.get(
+        reverse("ads:listings-list"),
+        {"latitude": 6.5244, "longitude": 3.3792, "nearest": "true"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data["results"]
+    assert [item["id"] for item in results] == [near.id, far.id]
+    assert 0 < results[0]["distance_km"] < results[1]["distance_km"]
+
+    response = api_client.get(
+        reverse("ads:listings-list"),
+        {"latitude": 6.5244, "longitude": 3.3792, "radius_km": 20},
+    )
+    assert [item["id"] for item in response.data["results"]] == [near.id]
+
+
+def test_listing_clusters_group_dense_cells(
+    api_client,
+    listing_dependencies,
+    monkeypatch,
+    django_capture_on_commit_callbacks,
+):
+    vendor = create_vendor(UserFactory())
+    for index, (lng, lat) in enumerate([(3.35, 6.60), (3.351, 6.601), (7.49, 9.05)]):
+        listing = create_listing(vendor, listing_dependencies, title=f"Flat {index}")
+        listing.location = Point(lng, lat, srid=4326)
+        listing.price = 1000 * (index + 1)
+        listing.save()
+    url = reverse("ads:listings-clusters")
+    params = {"bbox": "2.5,4,15,14", "zoom": 6}
+
+    response = api_client.get(url, params)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["count"] == 3
+    assert response.data["clusters"] == []
+    assert len(response.data["points"]) == 3
+
+    monkeypatch.setattr("rockflint_web.ads.clusters.POINT_THRESHOLD", 0)
+    with django_capture_on_commit_callbacks(execute=True):
+        bump_listing_cache_generation()
+    response = api_client.get(url, {**params, "min_price": 1500})
+    assert response.data["count"] == 2
+    assert response.data["clusters"] == []
+    assert len(response.data["points"]) == 2
+
+    response = api_client.get(url, params)
+    [cluster] = response.data["clusters"]
+    assert cluster["count"] == 2
+    assert (cluster["min_price"], cluster["max_price"]) == (1000, 2000)
+    assert [point["title"] for point in response.data["points"]] == ["Flat 2"]
+
+    response = api_client.get(url, {"bbox": "nonsense", "zoom": 6})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_listing_cluster_cells_do_not_straddle_tile_edges(
+    listing_dependencies,
+    monkeypatch,
+):
+    monkeypatch.setattr("rockflint_web.ads.clusters.POINT_THRESHOLD", 0)
+    vendor = create_vendor(UserFactory())
+    # longitude 0 is a tile edge at every zoom; at zoom 10 a cell is ~4.9 km
+    for index, lng in enumerate([0.0001, 0.04, -0.0001]):
+        listing = create_listing(vendor, listing_dependencies, title=f"Flat {index}")
+        listing.location = Point(lng, 0.01, srid=4326)
+        listing.save()
+    listings = Listing.objects.all()
+
+    both_tiles = cluster_listings(listings, parse_bbox("-1,-1,1,1"), 10)
+    east_tile = cluster_listings(listings, parse_bbox("0,-1,1,1"), 10)
+
+    assert both_tiles["clusters"] == east_tile["clusters"]
+    [cluster] = east_tile["clusters"]
+    assert cluster["count"] == 2
+    assert [point["title"] for point in both_tiles["points"]] == ["Flat 2"]
+
+
+def test_listing_tile_is_cached_until_a_listing_moves(
+    api_client,
+    listing_dependencies,
+    django_capture_on_commit_callbacks,
+):
+    vendor = create_vendor(UserFactory())
+    listing = create_listing(vendor, listing_dependencies)
+    lagos = Point(3.3792, 6.5244, srid=4326)
+    with django_capture_on_commit_callbacks(execute=True):
+        listing.location = lagos
+        listing.save()
+    z, x, y = next(tile for tile in tiles_for_point(lagos) if tile[0] == 10)
+    url = reverse("ads:listing-tile", kwargs={"z": z, "x": x, "y": y})
+
+    response = api_client.get(url, HTTP_ACCEPT="application/vnd.mapbox-vector-tile")
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "application/vnd.mapbox-vector-tile"
+    assert response.content
+    assert not api_client.get(url, {"min_price": 5000}).content
+
+    with CaptureQueriesContext(connection) as queries:
+        assert api_client.get(url).content == response.content
+    assert not [query for query in queries if "ST_AsMVT" in query["sql"]]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        listing.location = Point(7.4951, 9.0579, srid=4326)
+        listing.save()
+    assert not api_client.get(url).content
+
+    missing = reverse("ads:listing-tile", kwargs={"z": 1, "x": 2, "y": 0})
+    assert api_client.get(missing).status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_listing_facets_count_the_filtered_set(api_client, listing_dependencies):
+    category, offer, state, lga = listing_dependencies
+    other = Category.objects.create(name="Duplex")
+    vendor = create_vendor(UserFactory())
+    for title, listing_category, bedrooms, price in [
+        ("One", category, 2, 90_000),
+        ("Two", category, 3, 300_000),
+        ("Three", other, 3, 300_000),
+    ]:
+        listing = create_listing(vendor, listing_dependencies, title=title)
+        listing.category = listing_category
+        listing.bedrooms = bedrooms
+        listing.price = price
+        listing.save()
+    create_listing(vendor, listing_dependencies, title="Hidden", active=False)
+    url = reverse("ads:listings-facets")
+
+    response = api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.data
+    assert data["count"] == 3
+    assert data["facets"]["category"] == [
+        {"value": category.id, "count": 2},
+        {"value": other.id, "count": 1},
+    ]
+    assert data["facets"]["bedrooms"] == [
+        {"value": 3, "count": 2},
+        {"value": 2, "count": 1},
+    ]
+    assert data["facets"]["state"] == [{"value": state.id, "count": 3}]
+    assert data["facets"]["price"] == [
+        {"min": 0, "max": 100_000, "count": 1},
+        {"min": 250_000, "max": 500_000, "count": 2},
+    ]
+
+    response = api_client.get(url, {"bedrooms": 3, "category": other.id})
+    assert response.data["count"] == 1
+    assert response.data["facets"]["offer"] == [{"value": offer.id, "count": 1}]
+
+
+def test_listing_price_stats_live_and_from_rollups(
+    api_client,
+    listing_dependencies,
+):
+    category, offer, state, lga = listing_dependencies
+    vendor = create_vendor(UserFactory())
+    for index, price in enumerate([50_000, 200_000, 1_000_000, 5_000_000]):
+        listing = create_listing(vendor, listing_dependencies, title=f"Flat {index}")
+        listing.price = price
+        listing.bedrooms = 2 if index < 2 else 4
+        listing.save()
+    url = reverse("ads:listings-price-stats")
+
+    response = api_client.get(url, {"bedrooms": 4})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["count"] == 2
+    assert (response.data["min"], response.data["max"]) == (1_000_000, 5_000_000)
+    assert response.data["median"] == 3_000_000
+    assert len(response.data["histogram"]) == PRICE_HISTOGRAM_BUCKETS
+    assert sum(bucket["count"] for bucket in response.data["histogram"]) == 2
+
+    live = api_client.get(url, {"state": state.id}).data
+    assert refresh_price_rollups() > 0
+    with CaptureQueriesContext(connection) as queries:
+        rolled_up = api_client.get(url, {"state": state.id}).data
+    assert not [query for query in queries if '"ads_listing"' in query["sql"]]
+    assert rolled_up["count"] == live["count"] == 4
+    assert rolled_up["histogram"] == live["histogram"]
+    assert rolled_up["p90"] == pytest.approx(live["p90"])
+
+
+def test_recommendations_rank_by_location_and_features(
+    api_client,
+    listing_dependencies,
+):
+    vendor = create_vendor(UserFactory())
+    pool = Feature.objects.create(name="Pool")
+    gym = Feature.objects.create(name="Gym")
+    lagos = Point(3.3792, 6.5244, srid=4326)
+    source = create_listing(vendor, listing_dependencies, title="Source")
+    twin = create_listing(vendor, listing_dependencies, title="Twin")
+    distant = create_listing(vendor, listing_dependencies, title="Distant")
+    for listing, location in [
+        (source, lagos),
+        (twin, Point(3.38, 6.53, srid=4326)),
+        (distant, Point(7.4951, 9.0579, srid=4326)),
+    ]:
+        listing.location = location
+        listing.save()
+    source.features.set([pool, gym])
+    twin.features.set([pool, gym])
+
+    url = reverse("ads:listings-recommendations", kwargs={"pk": source.pk})
+    response = api_client.get(url, {"price_tolerance": "0.5"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["id"] for item in response.data] == [twin.id, distant.id]
+
+
+def test_also_saved_serves_co_favorited_listings(api_client, listing_dependencies):
+    vendor = create_vendor(UserFactory())
+    first, paired, once, inactive = (
+        create_listing(vendor, listing_dependencies, title=title)
+        for title in ["First", "Paired", "Once", "Inactive"]
+    )
+    savers = [UserFactory() for _ in range(3)]
+    for user, listings in zip(
+        savers,
+        [[first, paired, once, inactive], [first, paired, inactive], [paired]],
+        strict=True,
+    ):
+        for listing in listings:
+            Favorite.objects.create(user=user, listing=listing)
+    inactive.active = False
+    inactive.save()
+
+    assert rebuild_favorite_neighbors() > 0
+    url = reverse("ads:listings-also-saved", kwargs={"pk": first.pk})
+    response = api_client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    # "once" was saved with "first" by a single user only
+    assert [item["id"] for item in response.data] == [paired.id]
+
+
+@pytest.fixture
+def trending_scores(monkeypatch):
+    # a private in-memory Redis, never the shared one
+    client = fakeredis.FakeRedis()
+    for module in [listing_views, trending]:
+        monkeypatch.setattr(module, "redis_client", lambda: client)
+    return client
+
+
+def test_trending_ranks_by_engagement(
+    api_client,
+    listing_dependencies,
+    trending_scores,
+    django_capture_on_commit_callbacks,
+):
+    vendor = create_vendor(UserFactory())
+    quiet, viewed, saved, hidden = (
+        create_listing(vendor, listing_dependencies, title=title)
+        for title in ["Quiet", "Viewed", "Saved", "Hidden"]
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        Favorite.objects.create(user=UserFactory(), listing=saved)
+        Favorite.objects.create(user=UserFactory(), listing=hidden)
+        hidden.active = False
+        hidden.save()
+    for visitor in ["user:1", "user:2"]:
+        record_listing_view(
+            viewed.pk,
+            visitor,
+            state_id=viewed.state_id,
+            category_id=viewed.category_id,
+        )
+
+    url = reverse("ads:listings-trending")
+    response = api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["id"] for item in response.data] == [saved.id, viewed.id]
+
+    response = api_client.get(url, {"state": quiet.state_id, "limit": 1})
+    assert [item["id"] for item in response.data] == [saved.id]
+    response = api_client.get(url, {"category": "abc"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_saved_search_validates_its_query(api_client, listing_dependencies):
+    category, _, state, _ = listing_dependencies
+    user = UserFactory()
+    api_client.force_authenticate(user=user)
+    url = reverse("ads:saved-searches-list")
+
+    response = api_client.post(url, {"query": {"ordering": "price"}}, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = api_client.post(url, {"query": {"state": 0}}, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    query = {"state": state.pk, "category": category.pk, "min_price": 500}
+    response = api_client.post(url, {"query": query}, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+    search = user.saved_searches.get()
+    assert search.query == {key: str(value) for key, value in query.items()}
+    assert (search.state, search.category, search.min_price) == (state, category, 500)
+
+
+def test_bulk_import_copies_valid_rows_and_reports_the_rest(
+    api_client,
+    listing_dependencies,
+):
+    category, offer, state, lga = listing_dependencies
+    pool = Feature.objects.create(name="Pool")
+    user = UserFactory()
+    vendor = create_vendor(user)
+    create_listing(vendor, listing_dependencies, title="Garden Flat")
+    rows = [
+        "title,price,category,offer,state,lga,features,latitude,longitude",
+        f"Garden Flat,2500,{category.name},{offer.slug},{state.name},{lga.name},"
+        "pool,6.5,3.4",
+        f"Garden Flat,2600,{category.pk},{offer.pk},{state.pk},{lga.pk},,,",
+        f"Broken,abc,{category.name},{offer.name},{state.name},Nowhere,Sauna,6.5,",
+    ]
+    upload = SimpleUploadedFile(
+        "inventory.csv",
+        "\n".join(rows).encode(),
+        content_type="text/csv",
+    )
+    api_client.force_authenticate(user=user)
+
+    response = api_client.post(
+        reverse("ads:listings-bulk-import"),
+        {"file": upload},
+        format="multipart",
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert (response.data["imported"], response.data["failed"]) == (2, 1)
+    (failure,) = response.data["errors"]
+    assert failure["row"] == 3
+    assert set(failure["errors"]) == {"price", "lga", "features", "location"}
+    imported = Listing.objects.filter(vendor=vendor).exclude(price=1200)
+    assert sorted(imported.values_list("slug", flat=True)) == [
+        "garden-flat-2",
+        "garden-flat-3",
+    ]
+    first = imported.get(price=2500)
+    assert list(first.features.all()) == [pool]
+    assert first.location.coords == (3.4, 6.5)
+    assert Listing.objects.filter(search_vector="garden").count() == 3
+
+
+def test_bulk_import_rejects_prices_the_column_cannot_hold(
+    api_client,
+    listing_dependencies,
+):
+    category, offer, state, lga = listing_dependencies
+    user = UserFactory()
+    vendor = create_vendor(user)
+    prices = ["999999999999.99", "1e12", "999999999999.995", "NaN", "sNaN"]
+    rows = ["title,price,category,offer,state,lga"] + [
+        f"Flat {price},{price},{category.pk},{offer.pk},{state.pk},{lga.pk}"
+        for price in prices
+    ]
+    upload = SimpleUploadedFile(
+        "inventory.csv",
+        "\n".join(rows).encode(),
+        content_type="text/csv",
+    )
+    api_client.force_authenticate(user=user)
+
+    response = api_client.post(
+        reverse("ads:listings-bulk-import"),
+        {"file": upload},
+        format="multipart",
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert (response.data["imported"], response.data["failed"]) == (1, 4)
+    assert [failure["row"] for failure in response.data["errors"]] == [2, 3, 4, 5]
+    assert all(
+        set(failure["errors"]) == {"price"} for failure in response.data["errors"]
+    )
+    assert Listing.objects.get(vendor=vendor).price == Decimal("999999999999.99")
+
+
+def test_bulk_listing_changes_are_all_or_nothing(api_client, listing_dependencies):
+    user = UserFactory()
+    vendor = create_vendor(user)
+    first, second, third = (
+        create_listing(vendor, listing_dependencies, title=title)
+        for title in ["First", "Second", "Third"]
+    )
+    foreign = create_listing(create_vendor(UserFactory()), listing_dependencies)
+    api_client.force_authenticate(user=user)
+    url = reverse("ads:listings-bulk")
+
+    response = api_client.post(
+        url,
+        {"ids": [first.pk, foreign.pk], "operation": "deactivate"},
+        format="json",
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert Listing.objects.filter(active=False).count() == 0
+
+    response = api_client.post(url, {"ids": [first.pk], "operation": "set_price"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.post(
+            url,
+            {"ids": [first.pk, second.pk], "operation": "adjust_price", "percent": 10},
+            format="json",
+        )
+    assert response.data == {"operation": "adjust_price", "count": 2}
+    updates = [q for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+    assert len(updates) == 1
+    prices = dict(Listing.objects.values_list("pk", "price"))
+    assert (prices[first.pk], prices[third.pk], prices[foreign.pk]) == (
+        1320,
+        1200,
+        1200,
+    )
+
+    # doubling would overflow NUMERIC(14, 2): a 400, not a database error
+    Listing.objects.filter(pk=third.pk).update(price=600_000_000_000)
+    response = api_client.post(
+        url,
+        {"ids": [first.pk, third.pk], "operation": "adjust_price", "percent": 100},
+        format="json",
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert Listing.objects.get(pk=first.pk).price == 1320
+
+    response = api_client.post(
+        url,
+        {"ids": [second.pk, third.pk], "operation": "delete"},
+        format="json",
+    )
+    assert response.data["count"] == 2
+    assert list(Listing.objects.filter(vendor=vendor)) == [first]
+
+
+def test_listing_search_uses_full_text_ranking(api_client, listing_dependencies):
+    vendor = create_vendor(UserFactory())
+    title_match = create_listing(vendor, listing_dependencies, title="Duplex in Lekki")
+    create_listing(vendor, listing_dependencies, title="Bungalow in Ikeja")
+    description_match = create_listing(vendor, listing_dependencies, title="Terrace")
+    description_match.description = "Spacious duplex close to the beach"
+    description_match.save()
+
+    response = api_client.get(reverse("ads:listings-list"), {"search": "duplexes"})
+
+    assert response.status_code == status.HTTP_200_OK
+    ids = [item["id"] for item in response.data["results"]]
+    assert ids == [title_match.id, description_match.id]
+
+
+def test_listing_search_cursor_pages_through_tied_ranks(
+    api_client,
+    listing_dependencies,
+):
+    vendor = create_vendor(UserFactory())
+    listings = [
+        create_listing(vendor, listing_dependencies, title="Duplex in Lekki")
+        for _ in range(4)
+    ]
+    for index in range(3):
+        listing = create_listing(vendor, listing_dependencies, title=f"Home {index}")
+        listing.description = "Spacious duplex close to the beach"
+        listing.save()
+        listings.append(listing)
+
+    url = reverse("ads:listings-list")
+    params = {"search": "duplex", "pagination": "cursor", "page_size": 2}
+    response = api_client.get(url, params)
+    seen = [item["id"] for item in response.data["results"]]
+    while response.data["next"]:
+        response = api_client.get(response.data["next"])
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(item["id"] for item in response.data["results"])
+
+    assert len(seen) == len(set(seen))
+    assert sorted(seen) == sorted(listing.id for listing in listings)
+
+
+def test_autocomplete_mixes_locations_and_listing_titles(
+    api_client,
+    listing_dependencies,
+):
+    clear_location_vocabulary()
+    vendor = create_vendor(UserFactory())
+    listing = create_listing(vendor, listing_dependencies, title="Test Duplex")
+    create_listing(vendor, listing_dependencies, title="Hidden", active=False)
+
+    response = api_client.get(reverse("ads:autocomplete"), {"q": "test"})
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data["results"]
+    assert {"type": "state", "id": listing.state_id, "label": "Test State"} in results
+    assert [item["id"] for item in results if item["type"] == "listing"] == [
+        listing.id,
+    ]
+
+
+def test_autocomplete_ignores_short_queries(api_client):
+    response = api_client.get(reverse("ads:autocomplete"), {"q": "a"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["results"] == []
+
+
+def test_listing_list_query_count_is_constant(api_client, listing_dependencies):
+    vendor = create_vendor(UserFactory())
+    for index in range(6):
+        listing = create_listing(vendor, listing_dependencies, title=f"Home {index}")
+        for order in range(2):
+            image = SimpleUploadedFile(
+                f"photo{order}.jpg",
+                b"filecontent",
+                content_type="image/jpeg",
+            )
+            ListingImage.objects.create(listing=listing, image=image, order=order)
+
+    url = reverse("ads:listings-list")
+    with CaptureQueriesContext(connection) as small_page:
+        response = api_client.get(url, {"page_size": 2})
+    assert response.status_code == status.HTTP_200_OK
+    with CaptureQueriesContext(connection) as large_page:
+        response = api_client.get(url, {"page_size": 6})
+    assert response.status_code == status.HTTP_200_OK
+
+    assert len(large_page.captured_queries) == len(small_page.captured_queries)
+    assert all(item["primary_image"] for item in response.data["results"])
+
+
+def test_primary_image_path_follows_image_changes(listing_dependencies):
+    listing = create_listing(create_vendor(UserFactory()), listing_dependencies)
+    first = ListingImage.objects.create(
+        listing=listing,
+        image=SimpleUploadedFile("a.jpg", b"filecontent", content_type="image/jpeg"),
+    )
+    primary = ListingImage.objects.create(
+        listing=listing,
+        image=SimpleUploadedFile("b.jpg", b"filecontent", content_type="image/jpeg"),
+        is_primary=True,
+        order=5,
+    )
+    listing.refresh_from_db()
+    assert listing.primary_image_path == primary.image.name
+
+    primary.delete()
+    listing.refresh_from_db()
+    assert listing.primary_image_path == first.image.name
+
+
+def test_anonymous_listing_list_is_cached_per_generation(
+    api_client,
+    listing_dependencies,
+    django_capture_on_commit_callbacks,
+):
+    vendor = create_vendor(UserFactory())
+    create_listing(vendor, listing_dependencies, title="Cached")
+    url = reverse("ads:listings-list")
+    api_client.get(url, {"state": listing_dependencies[2].id})
+
+    create_listing(vendor, listing_dependencies, title="Fresh")
+    cached = api_client.get(url, {"state": listing_dependencies[2].id})
+    assert cached.data["count"] == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        bump_listing_cache_generation()
+    refreshed = api_client.get(url, {"state": listing_dependencies[2].id})
+    assert refreshed.data["count"] == 2
+
+
+def test_vendor_listing_list_bypasses_cache(api_client, listing_dependencies):
+    user = UserFactory()
+    vendor = create_vendor(user)
+    create_listing(vendor, listing_dependencies, title="Visible")
+    url = reverse("ads:listings-list")
+    api_client.get(url)
+
+    create_listing(vendor, listing_dependencies, title="Draft", active=False)
+    api_client.force_authenticate(user=user)
+    response = api_client.get(url)
+
+    assert response.data["count"] == 2
+
+
+def test_listing_detail_answers_conditional_get(api_client, listing_dependencies):
+    listing = create_listing(create_vendor(UserFactory()), listing_dependencies)
+    url = reverse("ads:listings-detail", args=[listing.pk])
+
+    response = api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    etag = response["ETag"]
+    assert response["Last-Modified"]
+
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    image = SimpleUploadedFile("photo.jpg", b"filecontent", content_type="image/jpeg")
+    ListingImage.objects.create(listing=listing, image=image)
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+
+
+def test_listing_detail_etag_follows_feature_renames(api_client, listing_dependencies):
+    listing = create_listing(create_vendor(UserFactory()), listing_dependencies)
+    feature = Feature.objects.create(name="Pool")
+    listing.features.add(feature)
+    url = reverse("ads:listings-detail", args=[listing.pk])
+    etag = api_client.get(url)["ETag"]
+
+    feature.name = "Heated pool"
+    feature.save()
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["features"][0]["name"] == "Heated pool"
+
+
+def test_lookup_list_answers_conditional_get(api_client, listing_dependencies):
+    url = reverse("ads:categories-list")
+    etag = api_client.get(url)["ETag"]
+
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    Category.objects.create(name="Duplex")
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_bootstrap_bundles_reference_data(api_client, listing_dependencies):
+    category, offer, state, lga = listing_dependencies
+    url = reverse("ads:bootstrap")
+
+    response = api_client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["states"] == [
+        {
+            "id": state.id,
+            "name": state.name,
+            "lgas": [{"id": lga.id, "name": lga.name}],
+        },
+    ]
+    assert [item["id"] for item in response.data["categories"]] == [category.id]
+    assert [item["id"] for item in response.data["offers"]] == [offer.id]
+    assert "immutable" not in response["Cache-Control"]
+
+    versioned = api_client.get(url, {"v": response.data["version"]})
+    assert "immutable" in versioned["Cache-Control"]
@@ -0,0 +1,146 @@
+import hashlib
+import math
+import uuid
+
+from django.core.cache import cache
+from django.db import connection
+from django.db import transaction
+
+from rockflint_web.ads.cache import normalized_query_string
+from rockflint_web.ads.geo import GEOGRAPHY_SRID
+from rockflint_web.ads.geo import WEB_MERCATOR_MAX_LATITUDE
+from rockflint_web.ads.geo import WEB_MERCATOR_SRID
+from rockflint_web.ads.models import Listing
+
+TILE_MAX_ZOOM = 22
+TILE_EXTENT = 4096
+# features this close to a tile edge are repeated in the neighbouring tile so
+# markers are not clipped at the seams
+TILE_BUFFER = 64
+TILE_LAYER = "listings"
+TILE_TIMEOUT = 60 * 60 * 24
+
+# only module constants are interpolated; values are query parameters
+TILE_SQL = f"""
+WITH bounds AS (
+    SELECT ST_TileEnvelope(%s, %s, %s) AS tile,
+           ST_TileEnvelope(%s, %s, %s, margin => %s) AS buffered
+),
+features AS (
+    SELECT
+        ST_AsMVTGeom(
+            ST_Transform(listing.location, {WEB_MERCATOR_SRID}),
+            bounds.tile,
+            {TILE_EXTENT},
+            {TILE_BUFFER}
+        ) AS geom,
+        listing.id,
+        listing.price::float8 AS price,
+        listing.category_id,
+        listing.bedrooms,
+        listing.promotion_rank > 0 AS promoted
+    FROM ({{listings}}) AS listing, bounds
+    WHERE listing.location && ST_Transform(bounds.buffered, {GEOGRAPHY_SRID})
+)
+SELECT ST_AsMVT(features, '{TILE_LAYER}', {TILE_EXTENT}, 'geom', 'id')
+FROM features
+"""  # noqa: S608
+
+
+def tile_exists(z, x, y):
+    return 0 <= z <= TILE_MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def _tile_position(point, zoom):
+    """Fractional XYZ tile coordinates of a (SRID 4326) point at ``zoom``."""
+    scale = 2**zoom
+    latitude = max(
+        min(point.y, WEB_MERCATOR_MAX_LATITUDE),
+        -WEB_MERCATOR_MAX_LATITUDE,
+    )
+    radians = math.radians(latitude)
+    x = (point.x + 180) / 360 * scale
+    y = (1 - math.asinh(math.tan(radians)) / math.pi) / 2 * scale
+    return min(max(x, 0), scale - 1e-9), min(max(y, 0), scale - 1e-9)
+
+
+def _axis_tiles(position, scale):
+    index = math.floor(position)
+    margin = TILE_BUFFER / TILE_EXTENT
+    tiles = {index}
+    if position - index < margin and index > 0:
+        tiles.add(index - 1)
+    if index + 1 - position < margin and index + 1 < scale:
+        tiles.add(index + 1)
+    return tiles
+
+
+def tiles_for_point(point):
+    """Every (z, x, y) tile, buffer included, that renders ``point``."""
+    for zoom in range(TILE_MAX_ZOOM + 1):
+        x, y = _tile_position(point, zoom)
+        for tile_x in _axis_tiles(x, 2**zoom):
+            for tile_y in _axis_tiles(y, 2**zoom):
+                yield zoom, tile_x, tile_y
+
+
+def _version_key(z, x, y):
+    return f"ads:tiles:version:{z}/{x}/{y}"
+
+
+def tile_version(z, x, y):
+    key = _version_key(z, x, y)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def tile_cache_key(z, x, y, query_params):
+    digest = hashlib.sha1(  # noqa: S324
+        normalized_query_string(query_params).encode(),
+    ).hexdigest()
+    return f"ads:tiles:{z}/{x}/{y}:{tile_version(z, x, y)}:{digest}"
+
+
+def invalidate_tiles(points):
+    """
+    Drop the version of every tile showing one of ``points`` once the current
+    transaction commits; cached variants of those tiles (any filters) become
+    unreachable.
+    """
+    keys = {
+        _version_key(*tile)
+        for point in points
+        if point is not None
+        for tile in tiles_for_point(point)
+    }
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(list(keys)))
+
+
+def invalidate_listing_tiles(listing_ids):
+    locations = Listing.objects.filter(
+        pk__in=listing_ids,
+        location__isnull=False,
+    ).values_list("location", flat=True)
+    invalidate_tiles(locations)
+
+
+def render_tile(queryset, z, x, y):
+    """MVT bytes for the located listings of ``queryset`` in tile z/x/y."""
+    listings = (
+        queryset.order_by()
+        .filter(location__isnull=False)
+        .values("id", "price", "category_id", "bedrooms", "promotion_rank", "location")
+    )
+    sql, params = listings.query.sql_with_params()
+    margin = TILE_BUFFER / TILE_EXTENT
+    with connection.cursor() as cursor:
+        cursor.execute(
+            TILE_SQL.format(listings=sql),
+            [z, x, y, z, x, y, margin, *params],
+        )
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] else b""
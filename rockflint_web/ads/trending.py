@@ -0,0 +1,166 @@
+"""
+Trending listings from exponentially decayed engagement scores.
+
+Every view, favorite and review adds its weight to one Redis sorted set per
+scope (everything, per state, per category, per state and category).
+``decay_trending_scores`` periodically multiplies every score by
+``exp(-elapsed / TRENDING_TIME_CONSTANT)``, so the sets always hold decayed
+scores and serving a feed is one ``ZREVRANGE``.
+"""
+
+import logging
+import math
+import time
+from datetime import datetime
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from rockflint_web.ads.models import Favorite
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import ListingViewStat
+from rockflint_web.ads.models import Review
+from rockflint_web.ads.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+VIEW_WEIGHT = 1.0
+FAVORITE_WEIGHT = 5.0
+REVIEW_WEIGHT = 8.0
+TRENDING_HALF_LIFE = timedelta(hours=24)
+TRENDING_TIME_CONSTANT = TRENDING_HALF_LIFE.total_seconds() / math.log(2)
+# members decayed below this score are dropped, and each scope keeps at most
+# TRENDING_MAX_MEMBERS of its best listings
+TRENDING_MIN_SCORE = 0.01
+TRENDING_MAX_MEMBERS = 5000
+# engagement older than this is ignored by the rebuild
+TRENDING_REBUILD_WINDOW = timedelta(days=14)
+
+TRENDING_SCOPES_KEY = "ads:trending:scopes"
+TRENDING_DECAYED_AT_KEY = "ads:trending:decayed_at"
+
+
+def trending_key(state_id=None, category_id=None):
+    return f"ads:trending:{state_id or 'all'}:{category_id or 'all'}"
+
+
+def _scope_keys(state_id, category_id):
+    return {
+        trending_key(),
+        trending_key(state_id=state_id),
+        trending_key(category_id=category_id),
+        trending_key(state_id, category_id),
+    }
+
+
+def queue_engagement(pipe, listing_id, state_id, category_id, weight):
+    """Add ``weight`` to every scope of a listing, on an open pipeline."""
+    for key in _scope_keys(state_id, category_id):
+        pipe.zincrby(key, weight, listing_id)
+        pipe.sadd(TRENDING_SCOPES_KEY, key)
+
+
+def record_engagement(listing, weight):
+    """Score a favorite or review once the current transaction commits."""
+
+    def apply():
+        try:
+            pipe = redis_client().pipeline(transaction=False)
+            queue_engagement(
+                pipe,
+                listing.pk,
+                listing.state_id,
+                listing.category_id,
+                weight,
+            )
+            pipe.execute()
+        except RedisError:
+            logger.warning("Could not score engagement on listing %s", listing.pk)
+
+    transaction.on_commit(apply)
+
+
+def trending_listing_ids(*, state_id=None, category_id=None, limit=12):
+    """Best-first listing ids of a scope; callers drop inactive ones."""
+    members = redis_client().zrevrange(
+        trending_key(state_id, category_id),
+        0,
+        limit - 1,
+    )
+    return [int(member) for member in members]
+
+
+def decay_trending_scores():
+    """
+    Decay every scope by the time elapsed since the previous run, then prune
+    negligible and surplus members. Returns the number of scopes decayed.
+    """
+    client = redis_client()
+    now = time.time()
+    previous = client.getset(TRENDING_DECAYED_AT_KEY, now)
+    if previous is None:
+        return 0
+    factor = math.exp(-max(now - float(previous), 0) / TRENDING_TIME_CONSTANT)
+    keys = client.smembers(TRENDING_SCOPES_KEY)
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.zunionstore(key, {key: factor})
+        pipe.zremrangebyscore(key, "-inf", f"({TRENDING_MIN_SCORE}")
+        pipe.zremrangebyrank(key, 0, -(TRENDING_MAX_MEMBERS + 1))
+    pipe.execute()
+    return len(keys)
+
+
+def _decayed(weight, moment, now):
+    return weight * math.exp(-(now - moment).total_seconds() / TRENDING_TIME_CONSTANT)
+
+
+def rebuild_trending_scores():
+    """
+    Recompute every scope from the engagement tables (cold start, or after
+    Redis lost its data). Views are taken from the daily ListingViewStat rows
+    at midday of their date.
+    """
+    now = timezone.now()
+    since = now - TRENDING_REBUILD_WINDOW
+    scores = {}
+
+    def add(listing_id, weight):
+        scores[listing_id] = scores.get(listing_id, 0.0) + weight
+
+    for listing_id, saved_at in Favorite.objects.filter(
+        saved_at__gte=since,
+    ).values_list("listing_id", "saved_at"):
+        add(listing_id, _decayed(FAVORITE_WEIGHT, saved_at, now))
+    for listing_id, created in Review.objects.filter(created__gte=since).values_list(
+        "listing_id",
+        "created",
+    ):
+        add(listing_id, _decayed(REVIEW_WEIGHT, created, now))
+    for listing_id, day, views in ListingViewStat.objects.filter(
+        date__gte=since.date(),
+    ).values_list("listing_id", "date", "views"):
+        midday = datetime.combine(day, datetime.min.time()) + timedelta(hours=12)
+        moment = timezone.make_aware(midday)
+        add(listing_id, _decayed(VIEW_WEIGHT * views, moment, now))
+
+    scopes = (
+        Listing.objects.active()
+        .filter(pk__in=list(scores))
+        .values_list("pk", "state_id", "category_id")
+    )
+    client = redis_client()
+    old_keys = client.smembers(TRENDING_SCOPES_KEY)
+    pipe = client.pipeline(transaction=True)
+    if old_keys:
+        pipe.delete(*old_keys)
+    pipe.delete(TRENDING_SCOPES_KEY)
+    for listing_id, state_id, category_id in scopes:
+        score = scores[listing_id]
+        if score >= TRENDING_MIN_SCORE:
+            queue_engagement(pipe, listing_id, state_id, category_id, score)
+    pipe.set(TRENDING_DECAYED_AT_KEY, time.time())
+    pipe.execute()
+    return len(scores)
@@ -2,13 +2,18 @@ from django.urls import include
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from rockflint_web.ads.api.views import AutocompleteView
+from rockflint_web.ads.api.views import BootstrapView
 from rockflint_web.ads.api.views import CategoryViewSet
 from rockflint_web.ads.api.views import FeatureViewSet
 from rockflint_web.ads.api.views import LGAViewSet
 from rockflint_web.ads.api.views import ListingImageViewSet
+from rockflint_web.ads.api.views import ListingTileView
 from rockflint_web.ads.api.views import ListingViewSet
 from rockflint_web.ads.api.views import OfferViewSet
+from rockflint_web.ads.api.views import SavedSearchViewSet
 from rockflint_web.ads.api.views import StateViewSet
+
 app_name = "ads"
 
 router = DefaultRouter()
@@ -19,7 +24,15 @@ router.register("offers", OfferViewSet, basename="offers")
 router.register("states", StateViewSet, basename="states")
 router.register("lgas", LGAViewSet, basename="lgas")
 router.register("features", FeatureViewSet, basename="features")
+router.register("saved-searches", SavedSearchViewSet, basename="saved-searches")
 
 urlpatterns = [
+    path("autocomplete/", AutocompleteView.as_view(), name="autocomplete"),
+    path("bootstrap/", BootstrapView.as_view(), name="bootstrap"),
+    path(
+        "tiles/<int:z>/<int:x>/<int:y>.mvt",
+        ListingTileView.as_view(),
+        name="listing-tile",
+    ),
     path("", include(router.urls)),
 ]
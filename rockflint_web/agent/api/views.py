@@ -1,14 +1,26 @@
+import uuid
+
+from django.core.files.storage import default_storage
 from django.db.models import Avg
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from rest_framework import permissions
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from rockflint_web.ads.models import Favorite
 from rockflint_web.ads.models import Listing
 from rockflint_web.ads.models import Review
+from rockflint_web.agent.exports import EXPORT_CONTENT_TYPES
+from rockflint_web.agent.exports import EXPORT_FORMATS
+from rockflint_web.agent.exports import export_chunks
+from rockflint_web.agent.exports import export_filename
+from rockflint_web.agent.exports import finished_export
+from rockflint_web.agent.tasks import export_vendor_listings
 from rockflint_web.users.models import Vendor
 
 from .serializers import AgentActivitySerializer
@@ -41,6 +53,11 @@ class VendorViewSet(viewsets.ModelViewSet):
             return [permissions.IsAdminUser()]
         return super().get_permissions()
 
+    def perform_content_negotiation(self, request, force=False):  # noqa: FBT002
+        # export clients may ask for text/csv; errors still render as JSON
+        force = force or self.action == "export"
+        return super().perform_content_negotiation(request, force=force)
+
     def perform_create(self, serializer):
         if not self.request.user.is_staff:
             raise PermissionDenied("Only staff can create vendors.")
@@ -135,3 +152,56 @@ class VendorViewSet(viewsets.ModelViewSet):
         vendor.save(update_fields=["verified"])
         serializer = self.get_serializer(vendor)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get", "post"])
+    def export(self, request, pk=None):
+        """
+        /api/agent/vendors/{id}/export/?type=csv|ndjson
+        GET streams every listing of the vendor with its review and favorite
+        counts. POST writes a gzipped export in Celery instead and answers
+        202 with a status URL that serves the download link once it is done.
+        """
+        vendor = self._get_vendor()
+        fmt = request.query_params.get("type", "csv")
+        if fmt not in EXPORT_FORMATS:
+            msg = f"Must be one of: {', '.join(EXPORT_FORMATS)}."
+            raise ValidationError({"type": msg})
+        if request.method == "POST":
+            export_id = uuid.uuid4().hex
+            export_vendor_listings.delay(vendor.pk, fmt, export_id)
+            status_url = request.build_absolute_uri(
+                reverse(
+                    "agent:vendors-export-status",
+                    kwargs={"pk": vendor.pk, "export_id": export_id},
+                ),
+            )
+            return Response(
+                {"export_id": export_id, "status_url": status_url},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": status_url},
+            )
+        response = StreamingHttpResponse(
+            export_chunks(vendor, fmt),
+            content_type=EXPORT_CONTENT_TYPES[fmt],
+        )
+        filename = export_filename(vendor, fmt)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"export/(?P<export_id>[0-9a-f]{32})",
+    )
+    def export_status(self, request, pk=None, export_id=None):
+        vendor = self._get_vendor()
+        export = finished_export(vendor, export_id)
+        if export is None:
+            return Response({"status": "pending"})
+        return Response(
+            {
+                "status": "ready",
+                "filename": export["filename"],
+                "url": request.build_absolute_uri(default_storage.url(export["name"])),
+            },
+        )
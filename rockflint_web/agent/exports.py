@@ -0,0 +1,191 @@
+"""
+Full inventory exports of a vendor's listings.
+
+Rows come from a server-side cursor (``.iterator(chunk_size=...)``) and are
+encoded chunk by chunk, so memory stays flat however many listings the
+vendor has. ``export_chunks`` feeds the streaming response directly;
+``write_export`` gzips the same chunks into default storage for the Celery
+mode and records the finished file in the cache for the status endpoint.
+"""
+
+import csv
+import gzip
+import io
+import tempfile
+from itertools import batched
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Avg
+from django.db.models import Count
+from django.db.models import IntegerField
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from rockflint_web.ads.models import Favorite
+from rockflint_web.ads.models import Listing
+from rockflint_web.ads.models import Review
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+EXPORT_CHUNK_SIZE = 2000
+# finished async exports stay downloadable this long
+EXPORT_RETENTION = 60 * 60 * 24
+EXPORT_DIRECTORY = "exports"
+
+EXPORT_FIELDS = (
+    "id",
+    "title",
+    "slug",
+    "active",
+    "price",
+    "rent_period",
+    "bedrooms",
+    "bathrooms",
+    "area",
+    "address",
+    "created",
+    "updated",
+)
+# exported by name rather than id
+LOOKUP_FIELDS = ("category", "offer", "state", "lga")
+COUNT_COLUMNS = ("review_count", "average_rating", "favorite_count")
+EXPORT_COLUMNS = (
+    *EXPORT_FIELDS,
+    *LOOKUP_FIELDS,
+    "latitude",
+    "longitude",
+    *COUNT_COLUMNS,
+)
+
+
+def _per_listing(queryset, aggregate):
+    # correlated subqueries: joining both reviews and favorites would
+    # multiply the counts
+    return Subquery(
+        queryset.filter(listing=OuterRef("pk"))
+        .order_by()
+        .values("listing")
+        .annotate(value=aggregate)
+        .values("value"),
+    )
+
+
+def export_queryset(vendor):
+    return (
+        Listing.objects.filter(vendor=vendor)
+        .order_by("pk")
+        .values(
+            *EXPORT_FIELDS,
+            *(f"{field}__name" for field in LOOKUP_FIELDS),
+            "location",
+            review_count=Coalesce(
+                _per_listing(Review.objects, Count("*")),
+                0,
+                output_field=IntegerField(),
+            ),
+            average_rating=_per_listing(Review.objects, Avg("rating")),
+            favorite_count=Coalesce(
+                _per_listing(Favorite.objects, Count("*")),
+                0,
+                output_field=IntegerField(),
+            ),
+        )
+    )
+
+
+def export_rows(vendor):
+    for row in export_queryset(vendor).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        for field in LOOKUP_FIELDS:
+            row[field] = row.pop(f"{field}__name")
+        location = row.pop("location")
+        row["latitude"] = location.y if location else None
+        row["longitude"] = location.x if location else None
+        if row["average_rating"] is not None:
+            row["average_rating"] = round(row["average_rating"], 2)
+        yield {column: row[column] for column in EXPORT_COLUMNS}
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for chunk in batched(rows, EXPORT_CHUNK_SIZE):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for chunk in batched(rows, EXPORT_CHUNK_SIZE):
+        yield "".join(f"{encoder.encode(row)}\n" for row in chunk)
+
+
+def export_chunks(vendor, fmt):
+    """Text chunks of the whole export, one per ``EXPORT_CHUNK_SIZE`` rows."""
+    rows = export_rows(vendor)
+    return _csv_chunks(rows) if fmt == "csv" else _ndjson_chunks(rows)
+
+
+def export_filename(vendor, fmt):
+    return f"vendor-{vendor.pk}-listings-{timezone.localdate():%Y%m%d}.{fmt}"
+
+
+def export_cache_key(vendor_id, export_id):
+    return f"agent:exports:{vendor_id}:{export_id}"
+
+
+def write_export(vendor, fmt, export_id):
+    """
+    Gzip the export into default storage and mark it finished. Returns the
+    storage name.
+    """
+    with tempfile.TemporaryFile() as spool:
+        with gzip.GzipFile(fileobj=spool, mode="wb") as compressed:
+            for chunk in export_chunks(vendor, fmt):
+                compressed.write(chunk.encode())
+        spool.seek(0)
+        name = default_storage.save(
+            f"{EXPORT_DIRECTORY}/vendor-{vendor.pk}/{export_id}.{fmt}.gz",
+            File(spool),
+        )
+    cache.set(
+        export_cache_key(vendor.pk, export_id),
+        {"name": name, "filename": f"{export_filename(vendor, fmt)}.gz"},
+        timeout=EXPORT_RETENTION,
+    )
+    return name
+
+
+def finished_export(vendor, export_id):
+    """{name, filename} of a finished export, or None while it is running."""
+    return cache.get(export_cache_key(vendor.pk, export_id))
+
+
+def purge_exports():
+    """Delete exported files older than ``EXPORT_RETENTION``."""
+    now = timezone.now()
+    deleted = 0
+    if not default_storage.exists(EXPORT_DIRECTORY):
+        return deleted
+    directories, _ = default_storage.listdir(EXPORT_DIRECTORY)
+    for directory in directories:
+        path = f"{EXPORT_DIRECTORY}/{directory}"
+        for name in default_storage.listdir(path)[1]:
+            file_name = f"{path}/{name}"
+            age = now - default_storage.get_modified_time(file_name)
+            if age.total_seconds() > EXPORT_RETENTION:
+                default_storage.delete(file_name)
+                deleted += 1
+    return deleted
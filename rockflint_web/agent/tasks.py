@@ -0,0 +1,21 @@
+from celery import shared_task
+
+from rockflint_web.users.models import Vendor
+
+from .exports import purge_exports
+from .exports import write_export
+
+
+@shared_task()
+def export_vendor_listings(vendor_id, fmt, export_id):
+    """Write a gzipped listing export for the async export mode."""
+    vendor = Vendor.objects.filter(pk=vendor_id).first()
+    if vendor is None:
+        return None
+    return write_export(vendor, fmt, export_id)
+
+
+@shared_task()
+def purge_vendor_exports():
+    """Delete expired export files."""
+    return purge_exports()
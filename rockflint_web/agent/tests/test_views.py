@@ -1,15 +1,23 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+
 import pytest
+from django.core.files.storage import default_storage
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from rockflint_web.ads.models import LGA
 from rockflint_web.ads.models import Category
 from rockflint_web.ads.models import Favorite
 from rockflint_web.ads.models import Listing
-from rockflint_web.ads.models import LGA
 from rockflint_web.ads.models import Offer
 from rockflint_web.ads.models import Review
 from rockflint_web.ads.models import State
+from rockflint_web.agent.tasks import export_vendor_listings
 from rockflint_web.users.models import Vendor
 from rockflint_web.users.tests.factories import UserFactory
 
@@ -98,3 +106,94 @@ def test_non_staff_cannot_list_vendors(api_client):
     response = api_client.get(reverse("agent:vendors-list"))
 
     assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_vendor_export_streams_inventory_with_counts(api_client, listing_dependencies):
+    vendor_user = UserFactory()
+    vendor = create_vendor(vendor_user)
+    reviewed = create_listing(vendor, listing_dependencies, title="Reviewed")
+    create_listing(vendor, listing_dependencies, title="Hidden", active=False)
+    create_listing(create_vendor(UserFactory()), listing_dependencies, title="Other")
+    for rating in [3, 4]:
+        Review.objects.create(
+            user=UserFactory(),
+            listing=reviewed,
+            rating=rating,
+            comment="Fine.",
+        )
+    Favorite.objects.create(user=UserFactory(), listing=reviewed)
+    api_client.force_authenticate(user=vendor_user)
+    url = reverse("agent:vendors-export", args=[vendor.id])
+
+    response = api_client.get(url, HTTP_ACCEPT="text/csv")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+    body = b"".join(response.streaming_content).decode()
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert [row["title"] for row in rows] == ["Reviewed", "Hidden"]
+    assert rows[0]["state"] == "Test State"
+    assert (rows[0]["review_count"], rows[0]["average_rating"]) == ("2", "3.5")
+    assert (rows[0]["favorite_count"], rows[1]["review_count"]) == ("1", "0")
+
+    response = api_client.get(url, {"type": "ndjson"})
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    assert [json.loads(line)["active"] for line in lines] == [True, False]
+
+
+def test_vendor_export_async_file_is_served_once_written(
+    api_client,
+    listing_dependencies,
+):
+    vendor_user = UserFactory()
+    vendor = create_vendor(vendor_user)
+    create_listing(vendor, listing_dependencies, title="Exported")
+    api_client.force_authenticate(user=vendor_user)
+    export_id = uuid.uuid4().hex
+    url = reverse("agent:vendors-export-status", args=[vendor.id, export_id])
+
+    assert api_client.get(url).data == {"status": "pending"}
+    name = export_vendor_listings(vendor.id, "ndjson", export_id)
+    response = api_client.get(url)
+
+    assert response.data["status"] == "ready"
+    assert response.data["filename"].endswith(".ndjson.gz")
+    with default_storage.open(name) as exported:
+        (line,) = gzip.decompress(exported.read()).decode().splitlines()
+    assert json.loads(line)["title"] == "Exported"
+
+
+def test_vendor_export_post_queues_task_for_own_vendor_only(
+    api_client,
+    listing_dependencies,
+    monkeypatch,
+):
+    vendor_user = UserFactory()
+    vendor = create_vendor(vendor_user)
+    create_listing(vendor, listing_dependencies, title="Exported")
+    other = create_vendor(UserFactory())
+    queued = []
+    monkeypatch.setattr(
+        export_vendor_listings,
+        "delay",
+        lambda *args: queued.append(args),
+    )
+    api_client.force_authenticate(user=vendor_user)
+
+    response = api_client.post(
+        f"{reverse('agent:vendors-export', args=[vendor.id])}?type=ndjson",
+    )
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    export_id = response.data["export_id"]
+    assert queued == [(vendor.id, "ndjson", export_id)]
+    status_url = response.data["status_url"]
+    assert response["Location"] == status_url
+    assert status_url.endswith(
+        reverse("agent:vendors-export-status", args=[vendor.id, export_id]),
+    )
+    export_vendor_listings(*queued[0])
+    assert api_client.get(status_url).data["status"] == "ready"
+
+    response = api_client.post(reverse("agent:vendors-export", args=[other.id]))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert len(queued) == 1
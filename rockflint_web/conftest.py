@@ -1,5 +1,7 @@
 import pytest
+from django.core.cache import cache
 
+from rockflint_web.ads.similarity import clear_similarity_vectors
 from rockflint_web.users.models import User
 from rockflint_web.users.tests.factories import UserFactory
 
@@ -9,6 +11,13 @@ def _media_storage(settings, tmpdir) -> None:
     settings.MEDIA_ROOT = tmpdir.strpath
 
 
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+    # per-process snapshots would outlive the test database rows
+    clear_similarity_vectors()
+
+
 @pytest.fixture
 def user(db) -> User:
     return UserFactory()